@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Array backend of the matching methods
+
+    "numpy": plain numpy arrays (default)
+    "umat": cv2.UMat of the OpenCV transparent API, the data stays in the UMat through the chained calls
+        (resize -> cvtColor -> matchTemplate -> minMaxLoc) and is only converted to numpy at the result.
+        OpenCV runs the calls with OpenCL if a device (GPU or a CPU OpenCL runtime) is available,
+        and with the normal CPU code otherwise.
+"""
+
+import cv2
+import numpy as np
+
+from airtest.utils.logger import get_logger
+
+LOGGING = get_logger(__name__)
+
+BACKENDS = ("numpy", "umat")
+_WARNED = set()
+
+
+def resolve_backend(backend=None):
+    """
+    Check the backend name, "umat" falls back to "numpy" if cv2.UMat is not available
+
+    Args:
+        backend: None, "numpy" or "umat"
+
+    Raises:
+        ValueError: if the backend is unknown
+
+    Returns:
+        "numpy" or "umat"
+
+    """
+    if backend in (None, "numpy"):
+        return "numpy"
+    if backend not in BACKENDS:
+        raise ValueError("unknown cv backend %r, should be one of %s" % (backend, BACKENDS))
+    if not hasattr(cv2, "UMat"):
+        if backend not in _WARNED:
+            _WARNED.add(backend)
+            LOGGING.warning("cv2.UMat is not available, use the numpy backend")
+        return "numpy"
+    if cv2.ocl.haveOpenCL() and not cv2.ocl.useOpenCL():
+        cv2.ocl.setUseOpenCL(True)
+    return backend
+
+
+def opencl_enabled():
+    """whether the umat backend runs with OpenCL, otherwise UMat calls run on the normal CPU code"""
+    return cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+
+
+def upload(img, backend):
+    """numpy array to the backend array"""
+    if backend == "umat" and isinstance(img, np.ndarray):
+        return cv2.UMat(img)
+    return img
+
+
+def download(mat):
+    """backend array to numpy array"""
+    if isinstance(mat, cv2.UMat):
+        return mat.get()
+    return mat
+
+
+def set_pixel(mat, x, y, value):
+    """set a pixel of a single channel image, UMat has no item assignment"""
+    if isinstance(mat, cv2.UMat):
+        cv2.rectangle(mat, (x, y), (x, y), value, -1)
+    else:
+        mat[y, x] = value
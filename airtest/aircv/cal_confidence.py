@@ -4,10 +4,15 @@
 """These functions calculate the similarity of two images of the same size."""
 
 
+import zlib
 import cv2
 import numpy as np
+from airtest.utils.lru import LRUCache
 from .utils import img_mat_rgb_2_gray
 
+# 模板的HSV三通道, 见prepare_rgb_search
+RGB_SEARCH_CACHE = LRUCache(maxsize=100)
+
 
 def cal_ccoeff_confidence(im_source, im_search):
     """求取两张图片的可信度，使用TM_CCOEFF_NORMED方法."""
@@ -26,12 +31,12 @@ def cal_ccoeff_confidence(im_source, im_search):
 
 def cal_rgb_confidence(img_src_rgb, img_sch_rgb):
     """同大小彩图计算相似度."""
+    # 模板部分(截断+HSV+分离通道)只计算一次
+    search = prepare_rgb_search(img_sch_rgb)
     # 减少极限值对hsv角度计算的影响
     img_src_rgb = np.clip(img_src_rgb, 10, 245)
-    img_sch_rgb = np.clip(img_sch_rgb, 10, 245)
     # 转HSV强化颜色的影响
     img_src_rgb = cv2.cvtColor(img_src_rgb, cv2.COLOR_BGR2HSV)
-    img_sch_rgb = cv2.cvtColor(img_sch_rgb, cv2.COLOR_BGR2HSV)
 
     # 扩展置信度计算区域
     img_src_rgb = cv2.copyMakeBorder(img_src_rgb, 10,10,10,10,cv2.BORDER_REPLICATE)
@@ -40,11 +45,31 @@ def cal_rgb_confidence(img_src_rgb, img_sch_rgb):
     img_src_rgb[0,1] = 255
 
     # 计算BGR三通道的confidence，存入bgr_confidence
-    src_bgr, sch_bgr = cv2.split(img_src_rgb), cv2.split(img_sch_rgb)
+    src_bgr = cv2.split(img_src_rgb)
     bgr_confidence = [0, 0, 0]
     for i in range(3):
-        res_temp = cv2.matchTemplate(src_bgr[i], sch_bgr[i], cv2.TM_CCOEFF_NORMED)
+        res_temp = cv2.matchTemplate(src_bgr[i], search.channels[i], cv2.TM_CCOEFF_NORMED)
         min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res_temp)
         bgr_confidence[i] = max_val
 
     return min(bgr_confidence)
+
+
+class RGBSearchImage(object):
+    """cal_rgb_confidence中模板部分的预计算结果: 截断极限值后的HSV三通道."""
+
+    def __init__(self, img_sch_rgb):
+        # 减少极限值对hsv角度计算的影响, 转HSV强化颜色的影响
+        hsv = cv2.cvtColor(np.clip(img_sch_rgb, 10, 245), cv2.COLOR_BGR2HSV)
+        self.shape = hsv.shape[:2]
+        self.channels = cv2.split(hsv)
+
+
+def prepare_rgb_search(img_sch_rgb):
+    """获取模板的RGBSearchImage, 同一模板(按内容)只计算一次."""
+    if isinstance(img_sch_rgb, RGBSearchImage):
+        return img_sch_rgb
+    img = np.ascontiguousarray(img_sch_rgb)
+    key = (img.shape, zlib.crc32(img))
+    return RGB_SEARCH_CACHE.get_or_create(key, lambda: RGBSearchImage(img))
+
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+import struct
+import threading
+import traceback
+import cv2
+import numpy as np
+from airtest.aircv.aircv import imwrite
+from airtest.aircv.utils import string_2_img, get_reduce_factor
+from airtest.aircv.screen_context import ScreenContext
+
+
+# standard JPEG luminance quantization table (ITU T.81 Annex K), used to estimate the quality
+STD_LUMINANCE_QUANT_TBL = (
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+)
+# SOF markers carrying the image size, except DHT(C4), JPG(C8) and DAC(CC)
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def parse_jpeg_header(data):
+    """
+    Read the resolution and estimated quality from JPEG headers, without decoding the image
+
+    Args:
+        data: jpeg data
+
+    Returns:
+        (width, height), quality; None if not found
+
+    """
+    resolution, quality = None, None
+    data = memoryview(data)
+    if data[:2] != b"\xff\xd8":
+        return resolution, quality
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            break
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # fill bytes
+            pos += 1
+            continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        segment = data[pos + 4:pos + 2 + length]
+        if marker == 0xDB and quality is None:
+            quality = _estimate_quality(segment)
+        elif marker in SOF_MARKERS and len(segment) >= 5:
+            height, width = struct.unpack(">HH", segment[1:5])
+            resolution = (width, height)
+        elif marker == 0xDA:
+            # start of scan, no more headers
+            break
+        pos += 2 + length
+    return resolution, quality
+
+
+def _estimate_quality(dqt):
+    """estimate libjpeg quality from the first quantization table in a DQT segment"""
+    if len(dqt) < 65:
+        return None
+    if dqt[0] >> 4:
+        # 16 bit table
+        if len(dqt) < 129:
+            return None
+        values = struct.unpack(">64H", dqt[1:129])
+    else:
+        values = dqt[1:65].tolist()
+    # libjpeg scales the standard table monotonically, so sorting pairs up the entries whatever the zigzag order is;
+    # entries clamped to 255 or 1 are skipped
+    pairs = [(v, std) for v, std in zip(sorted(values), sorted(STD_LUMINANCE_QUANT_TBL)) if 1 < v < 255]
+    if not pairs:
+        return 1 if max(values) >= 255 else 100
+    scale = sum(v for v, _ in pairs) * 100.0 / sum(std for _, std in pairs)
+    if scale <= 100:
+        quality = (200 - scale) / 2
+    else:
+        quality = 5000 / scale
+    return int(round(min(max(quality, 1), 100)))
+
+
+def thumbnail(img, size=64):
+    """size x size gray thumbnail (float32) of an image, used to tell whether the screen has changed"""
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def frame_diff(thumb1, thumb2):
+    """
+    Max absolute difference (0-255) of two thumbnails
+
+    The max instead of the mean, so that a small button showing up on a static screen is not missed
+    """
+    return float(cv2.norm(thumb1, thumb2, cv2.NORM_INF))
+
+
+def parse_png_header(data):
+    """read (width, height) from the IHDR chunk of a png, None if not png"""
+    data = memoryview(data)
+    if data[:8] != b"\x89PNG\r\n\x1a\n" or len(data) < 24:
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+# pixel formats of the raw screencap output: {format: (bytes per pixel, cv2 color conversion to BGR)}
+SCREENCAP_FORMATS = {
+    1: (4, cv2.COLOR_RGBA2BGR),  # RGBA_8888
+    2: (4, cv2.COLOR_RGBA2BGR),  # RGBX_8888
+    3: (3, cv2.COLOR_RGB2BGR),  # RGB_888
+    4: (2, cv2.COLOR_BGR5652BGR),  # RGB_565, red in the high bits, which is BGR565 in opencv
+    5: (4, cv2.COLOR_BGRA2BGR),  # BGRA_8888
+}
+
+
+def parse_screencap_header(data):
+    """
+    Read the header of the raw screencap output (`screencap` without -p)
+
+    The header is width, height, format (uint32 little endian), followed by colorspace on newer Android versions,
+    the header size is told from the data size
+
+    Args:
+        data: raw screencap output
+
+    Returns:
+        (width, height, format, header size), None if not raw screencap output
+
+    """
+    data = memoryview(data)
+    if len(data) < 12:
+        return None
+    width, height, fmt = struct.unpack("<III", data[:12])
+    if fmt not in SCREENCAP_FORMATS:
+        return None
+    offset = len(data) - width * height * SCREENCAP_FORMATS[fmt][0]
+    if offset not in (12, 16):
+        return None
+    return width, height, fmt, offset
+
+
+def screencap_2_img(data, reduce_factor=1):
+    """
+    Convert the raw screencap output into a cv2 image, no decoding but a color conversion
+
+    Args:
+        data: raw screencap output, bytes or memoryview
+        reduce_factor: take every reduce_factor-th pixel
+
+    Returns:
+        numpy.ndarray, None if not raw screencap output
+
+    """
+    header = parse_screencap_header(data)
+    if header is None:
+        return None
+    width, height, fmt, offset = header
+    bpp, code = SCREENCAP_FORMATS[fmt]
+    pixels = np.frombuffer(data, np.uint8, count=width * height * bpp, offset=offset).reshape(height, width, bpp)
+    if reduce_factor > 1:
+        pixels = np.ascontiguousarray(pixels[::reduce_factor, ::reduce_factor])
+    return cv2.cvtColor(pixels, code)
+
+
+class Frame(object):
+    """
+    Encoded screen frame which is decoded lazily
+
+    Holds the raw jpg/png data and metadata of a screen frame, the pixels are decoded on first access of `img`,
+    and save() writes the raw jpg data directly when possible
+
+    Examples:
+        >>> frame = Frame(jpg_data, seq=1, timestamp=time.time())
+        >>> frame.resolution  # read from jpg header, no decoding
+        (1080, 1920)
+        >>> frame.img  # decoded and cached
+        >>> frame.save("screen.jpg", quality=90)
+
+    """
+
+    def __init__(self, data=None, seq=None, timestamp=None, transform=None, img=None):
+        """
+        Args:
+            data: encoded image data, bytes or memoryview (copied, since stream buffers are reused)
+            seq: sequence number of the frame
+            timestamp: capture time of the frame
+            transform: function applied to the decoded image, e.g. rotation
+            img: decoded image, if the frame is not from an encoded stream
+
+        """
+        if isinstance(data, (memoryview, bytearray)):
+            data = bytes(data)
+        self.data = data
+        self.seq = seq
+        self.timestamp = timestamp
+        self.transform = transform
+        # decoded images, {reduce_factor: img}
+        self._imgs = {1: img} if img is not None else {}
+        # {reduce_factor: ScreenContext}
+        self._contexts = {}
+        self._lock = threading.Lock()
+        self._header = None
+        self._thumbnail = None
+
+    def __repr__(self):
+        return "<Frame seq=%s resolution=%s>" % (self.seq, self.resolution if self.transform is None else None)
+
+    def to_json(self):
+        # used by the log, do not dump the raw data
+        return repr(self)
+
+    @property
+    def img(self):
+        """decoded image (numpy.ndarray), None if failed to decode"""
+        return self.decode()
+
+    @property
+    def decoded(self):
+        return 1 in self._imgs
+
+    def decode(self, reduce_factor=1):
+        """
+        Decode the frame at 1/reduce_factor size, jpg is decoded directly in the reduced size
+
+        Args:
+            reduce_factor: 1, 2, 4 or 8
+
+        Returns:
+            numpy.ndarray, None if failed to decode
+
+        """
+        if reduce_factor not in self._imgs:
+            if reduce_factor != 1 and self.data is None:
+                # not from an encoded stream, nothing to reduce
+                return self.decode()
+            self._imgs[reduce_factor] = self._decode(reduce_factor)
+        return self._imgs[reduce_factor]
+
+    def context(self, reduce_factor=1):
+        """
+        ScreenContext of the frame decoded at 1/reduce_factor size, shared by all templates matched against this frame
+
+        Returns:
+            ScreenContext, None if failed to decode
+
+        """
+        with self._lock:
+            if reduce_factor not in self._contexts:
+                img = self.decode(reduce_factor)
+                self._contexts[reduce_factor] = ScreenContext(img) if img is not None else None
+            return self._contexts[reduce_factor]
+
+    @property
+    def thumbnail(self):
+        """gray thumbnail of the frame, decoded at the smallest size if not decoded yet; None if failed to decode"""
+        if self._thumbnail is None:
+            img = self.img if self.decoded else self.decode(self.get_reduce_factor(64))
+            if img is not None:
+                self._thumbnail = thumbnail(img)
+        return self._thumbnail
+
+    @staticmethod
+    def decode_data(data, reduce_factor=1):
+        """decode the frame data into a cv2 image"""
+        return string_2_img(data, reduce_factor)
+
+    def get_reduce_factor(self, min_size):
+        """the largest reduce_factor which keeps the longer side of the decoded image not smaller than min_size"""
+        if self.data is None or self.transform is not None:
+            # the size after transform is unknown
+            return 1
+        return get_reduce_factor(self.resolution, min_size)
+
+    def _decode(self, reduce_factor=1):
+        if self.data is None:
+            return None
+        try:
+            img = self.decode_data(self.data, reduce_factor)
+        except Exception:
+            # may be black/locked screen or other reason, print exc for debugging
+            traceback.print_exc()
+            return None
+        if img is not None and self.transform is not None:
+            img = self.transform(img)
+        return img
+
+    def _parse_header(self):
+        if self._header is None:
+            resolution, quality = None, None
+            if self.data is not None:
+                resolution, quality = parse_jpeg_header(self.data)
+                if resolution is None:
+                    resolution = parse_png_header(self.data)
+            self._header = (resolution, quality)
+        return self._header
+
+    @property
+    def is_jpeg(self):
+        return self.data is not None and self.data[:2] == b"\xff\xd8"
+
+    @property
+    def quality(self):
+        """estimated jpg quality of the raw data, None if unknown"""
+        return self._parse_header()[1]
+
+    @property
+    def resolution(self):
+        """
+        (width, height) of the frame, read from the image header if not decoded yet
+
+        Returns:
+            (width, height), None if failed
+        """
+        if self.decoded or self.transform is not None:
+            img = self.img
+            if img is None:
+                return None
+            h, w = img.shape[:2]
+            return w, h
+        return self._parse_header()[0]
+
+    def can_save_raw(self, quality=10, max_size=None):
+        """
+        Whether the raw jpg data can be written as it is
+
+        Yes if it is a jpg without transform, not larger than max_size, and its quality is not higher than `quality`
+        (re-encoding a lower quality jpg with higher quality does not bring the details back)
+
+        """
+        if not self.is_jpeg or self.transform is not None:
+            return False
+        resolution, src_quality = self._parse_header()
+        if resolution is None or src_quality is None:
+            return False
+        if max_size and max(resolution) > int(max_size):
+            return False
+        return src_quality <= quality
+
+    def save(self, filename, quality=10, max_size=None):
+        """
+        Save the frame as a jpg file, the raw data is written directly if `can_save_raw`,
+        otherwise the frame is decoded at the smallest size that still fits max_size
+
+        Args:
+            filename: file path
+            quality: The image quality, integer in range [1, 99]
+            max_size: the maximum size of the picture, e.g 1200
+
+        Returns:
+            True if saved, False if the frame cannot be decoded
+
+        """
+        if self.can_save_raw(quality, max_size):
+            with open(filename, "wb") as f:
+                f.write(self.data)
+            return True
+        if self.decoded or not max_size:
+            img = self.img
+        else:
+            img = self.decode(self.get_reduce_factor(int(max_size)))
+        if img is None:
+            return False
+        imwrite(filename, img, quality, max_size=max_size)
+        return True
+
+
+class RawFrame(Frame):
+    """
+    Frame of the screencap output, see screencap_2_img
+
+    Decoding raw output is only a color conversion, and the resolution is read from its header;
+    png output (`screencap -p`) is decoded as usual
+    """
+
+    @staticmethod
+    def decode_data(data, reduce_factor=1):
+        img = screencap_2_img(data, reduce_factor)
+        if img is None:
+            img = string_2_img(data, reduce_factor)
+        return img
+
+    def _parse_header(self):
+        if self._header is None:
+            header = parse_screencap_header(self.data) if self.data is not None else None
+            if header is None:
+                return super(RawFrame, self)._parse_header()
+            self._header = (header[:2], None)
+        return self._header
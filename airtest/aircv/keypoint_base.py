@@ -12,9 +12,55 @@ from airtest.utils.logger import get_logger
 from .error import *  # noqa
 from .utils import generate_result, check_image_valid, print_run_time
 from .cal_confidence import cal_ccoeff_confidence, cal_rgb_confidence
+from .keypoint_cache import get_keypoints, get_screen_index, get_thread_local
+from .screen_context import as_screen_context
 
 LOGGING = get_logger(__name__)
 
+# 特征点匹配器: None为init_detector中创建的匹配器, "bf"为暴力匹配,
+# "flann"为近似匹配(浮点描述符使用KD-tree, 二进制描述符使用LSH)
+MATCHER_BACKENDS = (None, "bf", "flann")
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
+
+
+def filter_good_matches(matches, kp_src, ratio):
+    """
+    比率测试, 并按截图中的整数坐标去重(不允许截图上一个点对应模板的多个点)
+
+    Args:
+        matches: knnMatch(k=2)的结果
+        kp_src: 截图的特征点
+        ratio: 最优匹配与次优匹配的距离比率阈值
+
+    Returns:
+        good点对列表(cv2.DMatch), 保持原有顺序
+
+    """
+    pairs = [pair for pair in matches if len(pair) == 2]
+    if not pairs:
+        return []
+    # distance1, distance2, trainIdx
+    info = np.array([(m.distance, n.distance, m.trainIdx) for m, n in pairs], dtype=np.float64).reshape(-1, 3)
+    keep = np.flatnonzero(info[:, 0] < ratio * info[:, 1])
+    if not len(keep):
+        return []
+    # 与int()相同, 坐标向0取整后打包为一个整数, 每个坐标只保留第一次出现的点对
+    coords = cv2.KeyPoint_convert(kp_src, keypointIndexes=info[keep, 2].astype(np.int32)).astype(np.int64)
+    packed = (coords[:, 0] << 32) | (coords[:, 1] & 0xFFFFFFFF)
+    first = np.sort(np.unique(packed, return_index=True)[1])
+    return [pairs[i][0] for i in keep[first]]
+
+
+def get_match_points(kp_sch, kp_src, good):
+    """good点对在模板和截图中的坐标, 返回两个Nx1x2的float32数组, 可直接用于findHomography."""
+    count = len(good)
+    query_idx = np.fromiter((m.queryIdx for m in good), np.int32, count)
+    train_idx = np.fromiter((m.trainIdx for m in good), np.int32, count)
+    sch_pts = cv2.KeyPoint_convert(kp_sch, keypointIndexes=query_idx)
+    src_pts = cv2.KeyPoint_convert(kp_src, keypointIndexes=train_idx)
+    return np.float32(sch_pts).reshape(-1, 1, 2), np.float32(src_pts).reshape(-1, 1, 2)
+
 
 class KeypointMatching(object):
     """基于特征点的识别基类: KAZE."""
@@ -26,12 +72,19 @@ class KeypointMatching(object):
     # 参数: SIFT识别时只找出一对相似特征点时的置信度(confidence)
     ONE_POINT_CONFI = 0.5
 
-    def __init__(self, im_search, im_source, threshold=0.8, rgb=True):
+    def __init__(self, im_search, im_source, threshold=0.8, rgb=True, cache_dir=None, matcher_backend=None):
         super(KeypointMatching, self).__init__()
-        self.im_source = im_source
+        # im_source可以是截图或ScreenContext, 同一截图的灰度图和特征点由各模板共用
+        self.screen = as_screen_context(im_source)
+        self.im_source = self.screen.img
         self.im_search = im_search
         self.threshold = threshold
         self.rgb = rgb
+        # 模板特征点的.npz缓存目录, None则只缓存在内存中
+        self.cache_dir = cache_dir
+        if matcher_backend not in MATCHER_BACKENDS:
+            raise ValueError("Invalid matcher_backend: %r, try one of %s" % (matcher_backend, MATCHER_BACKENDS))
+        self.matcher_backend = matcher_backend
 
     def mask_kaze(self):
         """基于kaze查找多个目标区域的方法."""
@@ -120,11 +173,50 @@ class KeypointMatching(object):
         # create BFMatcher object:
         self.matcher = cv2.BFMatcher(cv2.NORM_L1)  # cv2.NORM_L1 cv2.NORM_L2 cv2.NORM_HAMMING(not useable)
 
+    def _init_detector_once(self):
+        """每个线程只调用一次init_detector, 之后复用其创建的算子."""
+        attrs = get_thread_local(type(self), self._create_detector_attrs)
+        self.__dict__.update(attrs)
+
+    def _create_detector_attrs(self):
+        """调用init_detector, 返回其创建的属性(detector/matcher等)."""
+        before = dict(self.__dict__)
+        self.init_detector()
+        return {k: v for k, v in self.__dict__.items() if k not in before or before[k] is not v}
+
     def get_keypoints_and_descriptors(self, image):
         """获取图像特征点和描述符."""
         keypoints, descriptors = self.detector.detectAndCompute(image, None)
         return keypoints, descriptors
 
+    def get_template_keypoints_and_descriptors(self):
+        """获取模板图像的特征点和描述符, 结果按图像内容缓存."""
+        return get_keypoints(self.im_search, self.METHOD_NAME, self.get_keypoints_and_descriptors, self.cache_dir)
+
+    def get_screen_keypoint_index(self):
+        """
+        获取截图的特征点、描述符及匹配索引, 同一张截图只计算一次, 由所有模板共用.
+
+        截图部分在灰度图上计算(各算子内部同样先转为灰度图, 结果一致), 灰度图由ScreenContext中的各方法共用.
+        """
+        return self.screen.get(
+            ("keypoints", self.METHOD_NAME, self.matcher_backend),
+            lambda: get_screen_index(self.screen.gray, self.METHOD_NAME, self.matcher_backend,
+                                     self.get_keypoints_and_descriptors, self.create_matcher))
+
+    def create_matcher(self, descriptors):
+        """根据matcher_backend和描述符类型创建匹配器, 返回None则使用init_detector中创建的匹配器."""
+        binary = descriptors.dtype == np.uint8
+        if self.matcher_backend == "bf":
+            return cv2.BFMatcher(cv2.NORM_HAMMING if binary else cv2.NORM_L2)
+        elif self.matcher_backend == "flann":
+            if binary:
+                index_params = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+            else:
+                index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+            return cv2.FlannBasedMatcher(index_params, dict(checks=50))
+        return None
+
     def match_keypoints(self, des_sch, des_src):
         """Match descriptors (特征值匹配)."""
         # 匹配两个图片中的特征点集，k=2表示每个特征点取出2个最匹配的对应点:
@@ -132,32 +224,26 @@ class KeypointMatching(object):
 
     def _get_key_points(self):
         """根据传入图像,计算图像所有的特征点,并得到匹配特征点对."""
-        # 准备工作: 初始化算子
-        self.init_detector()
+        # 准备工作: 初始化算子(每个线程只初始化一次)
+        self._init_detector_once()
         # 第一步：获取特征点集，并匹配出特征点对: 返回值 good, pypts, kp_sch, kp_src
-        kp_sch, des_sch = self.get_keypoints_and_descriptors(self.im_search)
-        kp_src, des_src = self.get_keypoints_and_descriptors(self.im_source)
+        kp_sch, des_sch = self.get_template_keypoints_and_descriptors()
+        screen_index = self.get_screen_keypoint_index()
+        kp_src, des_src = screen_index.keypoints, screen_index.descriptors
         # When apply knnmatch , make sure that number of features in both test and
         #       query image is greater than or equal to number of nearest neighbors in knn match.
         if len(kp_sch) < 2 or len(kp_src) < 2:
             raise NoMatchPointError("Not enough feature points in input images !")
         # match descriptors (特征值匹配)
-        matches = self.match_keypoints(des_sch, des_src)
+        if screen_index.matcher is None:
+            matches = self.match_keypoints(des_sch, des_src)
+        else:
+            matches = screen_index.knn_match(des_sch, k=2)
 
         # good为特征点初选结果，剔除掉前两名匹配太接近的特征点，不是独特优秀的特征点直接筛除(多目标识别情况直接不适用)
-        good = []
-        for m, n in matches:
-            if m.distance < self.FILTER_RATIO * n.distance:
-                good.append(m)
         # good点需要去除重复的部分，（设定源图像不能有重复点）去重时将src图像中的重复点找出即可
         # 去重策略：允许搜索图像对源图像的特征点映射一对多，不允许多对一重复（即不能源图像上一个点对应搜索图像的多个点）
-        good_diff, diff_good_point = [], [[]]
-        for m in good:
-            diff_point = [int(kp_src[m.trainIdx].pt[0]), int(kp_src[m.trainIdx].pt[1])]
-            if diff_point not in diff_good_point:
-                good_diff.append(m)
-                diff_good_point.append(diff_point)
-        good = good_diff
+        good = filter_good_matches(matches, kp_src, self.FILTER_RATIO)
 
         return kp_sch, kp_src, good
 
@@ -184,17 +270,14 @@ class KeypointMatching(object):
 
     def _many_good_pts(self, kp_sch, kp_src, good):
         """特征点匹配点对数目>=4个，可使用单矩阵映射,求出识别的目标区域."""
-        sch_pts, img_pts = np.float32([kp_sch[m.queryIdx].pt for m in good]).reshape(
-            -1, 1, 2), np.float32([kp_src[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+        sch_pts, img_pts = get_match_points(kp_sch, kp_src, good)
         # M是转化矩阵
         M, mask = self._find_homography(sch_pts, img_pts)
-        matches_mask = mask.ravel().tolist()
         # 从good中间筛选出更精确的点(假设good中大部分点为正确的，由ratio=0.7保障)
-        selected = [v for k, v in enumerate(good) if matches_mask[k]]
+        selected = mask.ravel().astype(bool)
 
         # 针对所有的selected点再次计算出更精确的转化矩阵M来
-        sch_pts, img_pts = np.float32([kp_sch[m.queryIdx].pt for m in selected]).reshape(
-            -1, 1, 2), np.float32([kp_src[m.trainIdx].pt for m in selected]).reshape(-1, 1, 2)
+        sch_pts, img_pts = sch_pts[selected], img_pts[selected]
         M, mask = self._find_homography(sch_pts, img_pts)
         # 计算四个角矩阵变换后的坐标，也就是在大图中的目标区域的顶点坐标:
         h, w = self.im_search.shape[:2]
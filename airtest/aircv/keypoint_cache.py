@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cache of keypoints and descriptors:
+    template side: in memory and optionally in .npz files
+    screen side: keypoints and the matcher index of the latest screens, shared by all templates
+"""
+
+import os
+import zlib
+import threading
+import cv2
+import numpy as np
+
+from airtest.utils.logger import get_logger
+from airtest.utils.lru import LRUCache
+
+LOGGING = get_logger(__name__)
+
+# {(image key, method): (keypoints, descriptors)}
+KEYPOINT_CACHE = LRUCache(maxsize=500)
+# {(image key, method, matcher backend): KeypointIndex}, only the latest few screens are kept
+SCREEN_INDEX_CACHE = LRUCache(maxsize=8)
+# directory name of the .npz files, created in the cache_dir, e.g. the .air script directory
+CACHE_DIRNAME = "__keypoint_cache__"
+_LOCAL = threading.local()
+
+
+def image_key(img):
+    """content hash of an image, so that the same (resized) template hits the same cache"""
+    img = np.ascontiguousarray(img)
+    return "%08x_%s" % (zlib.crc32(img) & 0xffffffff, "x".join(str(i) for i in img.shape))
+
+
+def get_thread_local(key, factory):
+    """
+    Get an object created by `factory` for the current thread, e.g. a detector or matcher
+
+    OpenCV detectors/matchers are not thread safe, so they are reused per thread
+
+    """
+    objs = getattr(_LOCAL, "objs", None)
+    if objs is None:
+        objs = _LOCAL.objs = {}
+    if key not in objs:
+        objs[key] = factory()
+    return objs[key]
+
+
+def _npz_path(cache_dir, key):
+    return os.path.join(cache_dir, CACHE_DIRNAME, "%s_%s.npz" % (key[1].lower(), key[0]))
+
+
+def save_npz(path, keypoints, descriptors):
+    """save keypoints and descriptors into a compressed .npz file"""
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    kp = np.array([(k.pt[0], k.pt[1], k.size, k.angle, k.response, k.octave, k.class_id) for k in keypoints],
+                  dtype=np.float64).reshape(-1, 7)
+    des = descriptors if descriptors is not None else np.zeros((0, 0), np.uint8)
+    # write to a temp file first, other processes may be reading it
+    tmp_path = path + ".%s.tmp.npz" % os.getpid()
+    np.savez_compressed(tmp_path, keypoints=kp, descriptors=des)
+    os.replace(tmp_path, path)
+
+
+def load_npz(path):
+    """load keypoints and descriptors saved by save_npz"""
+    with np.load(path) as data:
+        kp, des = data["keypoints"], data["descriptors"]
+    keypoints = tuple(cv2.KeyPoint(x, y, size, angle, response, int(octave), int(class_id))
+                      for x, y, size, angle, response, octave, class_id in kp.tolist())
+    if des.size == 0:
+        des = None
+    return keypoints, des
+
+
+def get_keypoints(img, method, compute_func, cache_dir=None):
+    """
+    Get keypoints and descriptors of a template image from cache, or compute and cache them
+
+    Args:
+        img: template image
+        method: method name, e.g. "SIFT"
+        compute_func: function(img) -> (keypoints, descriptors)
+        cache_dir: directory to save the .npz files, e.g. the .air script directory, None to cache in memory only
+
+    Returns:
+        keypoints, descriptors
+
+    """
+    key = (image_key(img), method)
+    ret = KEYPOINT_CACHE.get(key)
+    if ret is not None:
+        return ret
+    path = _npz_path(cache_dir, key) if cache_dir else None
+    if path and os.path.isfile(path):
+        try:
+            ret = load_npz(path)
+        except Exception as e:
+            LOGGING.warning("failed to load keypoint cache %s: %r" % (path, e))
+    if ret is None:
+        keypoints, descriptors = compute_func(img)
+        ret = tuple(keypoints), descriptors
+        if path:
+            try:
+                save_npz(path, *ret)
+            except Exception as e:
+                LOGGING.warning("failed to save keypoint cache %s: %r" % (path, e))
+    if ret[1] is not None:
+        ret[1].flags.writeable = False
+    KEYPOINT_CACHE.put(key, ret)
+    return ret
+
+
+class KeypointIndex(object):
+    """
+    Keypoints and descriptors of a screen, with a matcher trained on the descriptors
+
+    The index is built once and queried by the descriptors of every template matched against this screen
+
+    """
+
+    def __init__(self, keypoints, descriptors, matcher=None):
+        self.keypoints = tuple(keypoints)
+        self.descriptors = descriptors
+        self.matcher = matcher
+        self._lock = threading.Lock()
+        if matcher is not None and descriptors is not None and len(descriptors):
+            matcher.add([descriptors])
+            matcher.train()
+
+    def knn_match(self, descriptors, k=2):
+        """query the index, the matcher is not thread safe"""
+        with self._lock:
+            return self.matcher.knnMatch(descriptors, k=k)
+
+
+def get_screen_index(img, method, backend, compute_func, matcher_factory):
+    """
+    Get the KeypointIndex of a screen image from cache, or build it
+
+    Args:
+        img: screen image
+        method: method name, e.g. "SIFT"
+        backend: matcher backend name, part of the cache key
+        compute_func: function(img) -> (keypoints, descriptors)
+        matcher_factory: function(descriptors) -> matcher to be trained, or None to skip building the index
+
+    Returns:
+        KeypointIndex
+
+    """
+    def build():
+        keypoints, descriptors = compute_func(img)
+        matcher = matcher_factory(descriptors) if descriptors is not None else None
+        return KeypointIndex(keypoints, descriptors, matcher)
+
+    return SCREEN_INDEX_CACHE.get_or_create((image_key(img), method, backend), build)
@@ -8,18 +8,25 @@
     2. rgb: 彩色三通道,进行彩色权识别.
     3. scale_max: 多尺度模板匹配最大范围，增大可适应更小UI
     4. scale_step: 多尺度模板匹配搜索比例步长，减小可适应更小UI
+    5. backend: "numpy"或"umat", umat时各比例的缩放/匹配都在cv2.UMat上进行, 见backend.py
 """
 from __future__ import division
 from __future__ import print_function
 
 import cv2
 import time
+import zlib
+import numpy as np
 
 from airtest.utils.logger import get_logger
+from airtest.utils.lru import LRUCache
+from airtest.utils.snippet import get_executor
 from airtest.aircv.error import TemplateInputError
 from airtest import aircv
 from .utils import generate_result, check_source_larger_than_search, img_mat_rgb_2_gray, print_run_time
 from .cal_confidence import cal_rgb_confidence, cal_ccoeff_confidence
+from .screen_context import as_screen_context
+from .backend import resolve_backend, upload, set_pixel
 
 LOGGING = get_logger(__name__)
 
@@ -28,9 +35,20 @@ class MultiScaleTemplateMatching(object):
     """多尺度模板匹配."""
 
     METHOD_NAME = "MSTemplate"
+    # scale sweep step before refining
+    COARSE_STEP = 0.02
+    # number of best coarse scales to refine
+    REFINE_COUNT = 3
+    # evaluate scales in a thread pool if > 1
+    MAX_WORKERS = 1
+    # resized templates shared by all instances, {(template key, screen size, ratio): (template, ratio, (h, w))}
+    TEMPLATE_SCALE_CACHE = LRUCache(maxsize=1000)
 
-    def __init__(self, im_search, im_source, threshold=0.8, rgb=True, record_pos=None, resolution=(), scale_max=800, scale_step=0.005):
-        self.im_source = im_source
+    def __init__(self, im_search, im_source, threshold=0.8, rgb=True, record_pos=None, resolution=(), scale_max=800, scale_step=0.005,
+                 backend=None):
+        # im_source可以是截图或ScreenContext
+        self.screen = as_screen_context(im_source)
+        self.im_source = self.screen.img
         self.im_search = im_search
         self.threshold = threshold
         self.rgb = rgb
@@ -38,6 +56,7 @@ class MultiScaleTemplateMatching(object):
         self.resolution = resolution
         self.scale_max = scale_max
         self.scale_step = scale_step
+        self.backend = resolve_backend(backend)
 
     def find_all_results(self):
         raise NotImplementedError
@@ -49,8 +68,7 @@ class MultiScaleTemplateMatching(object):
         check_source_larger_than_search(self.im_source, self.im_search)
 
         # 第二步：计算模板匹配的结果矩阵res
-        s_gray, i_gray = img_mat_rgb_2_gray(
-            self.im_search), img_mat_rgb_2_gray(self.im_source)
+        s_gray, i_gray = img_mat_rgb_2_gray(self.im_search), self.screen.gray
         confidence, max_loc, w, h, _ = self.multi_scale_search(
             i_gray, s_gray, ratio_min=0.01, ratio_max=0.99, src_max=self.scale_max, step=self.scale_step, threshold=self.threshold)
 
@@ -95,20 +113,46 @@ class MultiScaleTemplateMatching(object):
         return middle_point, rectangle
 
     @staticmethod
-    def _resize_by_ratio(src, templ, ratio=1.0, templ_min=10, src_max=800):
-        """根据模板相对屏幕的长边 按比例缩放屏幕"""
-        # 截屏最大尺寸限制
-        sr = min(src_max/max(src.shape),1.0)
+    def _resize_source(src, src_max=800):
+        """截屏最大尺寸限制, 只需缩放一次"""
+        sr = min(src_max/max(src.shape), 1.0)
         src = cv2.resize(src, (int(src.shape[1]*sr), int(src.shape[0]*sr)))
-        # 截图尺寸缩放
-        h, w = src.shape[0], src.shape[1]
-        th, tw = templ.shape[0], templ.shape[1]
+        # 避免纯色图像导致TM_CCOEFF_NORMED结果无效
+        src[0, 0], src[0, 1] = 0, 255
+        return src, sr
+
+    def _resize_template(self, templ, templ_key, src_shape, ratio, templ_shape=None):
+        """
+        按比例缩放模板, 结果按(模板, 屏幕尺寸, 比例)缓存, loop_find重试时可以直接复用
+
+        Args:
+            templ: template, numpy array or cv2.UMat
+            templ_shape: shape of the template, required if templ is a cv2.UMat
+
+        Returns:
+            resized template (the same type as templ), ratio, (h, w) of the resized template
+
+        """
+        key = (templ_key, src_shape, round(ratio, 6))
+        cached = self.TEMPLATE_SCALE_CACHE.get(key)
+        if cached is not None:
+            return cached
+        h, w = src_shape
+        th, tw = (templ_shape or templ.shape)[:2]
         if th/h >= tw/w:
             tr = (h*ratio)/th
         else:
             tr = (w*ratio)/tw
-        templ = cv2.resize(templ, (max(int(tw*tr), 1), max(int(th*tr), 1)))
-        return src, templ, tr, sr
+        size = (max(int(tw*tr), 1), max(int(th*tr), 1))
+        resized = cv2.resize(templ, size)
+        set_pixel(resized, 0, 0, 0)
+        if size[0] > 1:
+            set_pixel(resized, 1, 0, 255)
+        if isinstance(resized, np.ndarray):
+            resized.flags.writeable = False
+        ret = (resized, tr, (size[1], size[0]))
+        self.TEMPLATE_SCALE_CACHE.put(key, ret)
+        return ret
 
     @staticmethod
     def _org_size(max_loc, w, h, tr, sr):
@@ -117,33 +161,72 @@ class MultiScaleTemplateMatching(object):
         w, h = int((w/sr)), int((h/sr))
         return max_loc, w, h
 
-    def multi_scale_search(self, org_src, org_templ, templ_min=10, src_max=800, ratio_min=0.01, 
+    def _map(self, func, items):
+        """MAX_WORKERS > 1时, 用线程池并行计算(opencv计算时会释放GIL), 线程池随MAX_WORKERS的修改重建"""
+        if self.MAX_WORKERS > 1 and len(items) > 1:
+            return list(get_executor(self.MAX_WORKERS, "mstpl").map(func, items))
+        return [func(item) for item in items]
+
+    def multi_scale_search(self, org_src, org_templ, templ_min=10, src_max=800, ratio_min=0.01,
                             ratio_max=0.99, step=0.01, threshold=0.8, time_out=3.0):
-        """多尺度模板匹配"""
-        mmax_val = 0
-        max_info = None
-        r = ratio_min
+        """多尺度模板匹配: 先以COARSE_STEP粗略扫描所有比例, 再在最优的几个比例附近用黄金分割搜索细化到step"""
         t = time.time()
-        while r <= ratio_max:
-            src, templ, tr, sr = self._resize_by_ratio(
-                org_src.copy(), org_templ.copy(), r, src_max=src_max)
-            if min(templ.shape) > templ_min:
-                src[0,0] = templ[0,0] = 0
-                src[0,1] = templ[0,1] = 255
-                result = cv2.matchTemplate(src, templ, cv2.TM_CCOEFF_NORMED)
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                h, w = templ.shape
-                if mmax_val < max_val:
-                    mmax_val = max_val
-                    max_info = (r, max_val, max_loc, w, h, tr, sr)
-                # print((r, max_val, max_loc, w, h, tr, sr))
-                time_cost = time.time() - t
-                if time_cost>time_out and max_val >= threshold:
-                    omax_loc, ow, oh = self._org_size(max_loc, w, h, tr, sr)
-                    confidence = self._get_confidence_from_matrix(omax_loc, ow, oh)
-                    if confidence >= threshold:
-                        return confidence, omax_loc, ow, oh, r
-            r += step
+        src, sr = self._resize_source(org_src, src_max)
+        src_shape = src.shape[:2]
+        templ = np.ascontiguousarray(org_templ)
+        templ_key = (templ.shape, zlib.crc32(templ), self.backend)
+        # umat: uploaded once, the resized templates and the matching results stay in UMat, only the
+        # values/locations of minMaxLoc come back
+        src, templ_mat = upload(src, self.backend), upload(templ, self.backend)
+        results = {}
+
+        def match(r):
+            templ_r, tr, (h, w) = self._resize_template(templ_mat, templ_key, src_shape, r, templ.shape)
+            if min(h, w) <= templ_min or h > src_shape[0] or w > src_shape[1]:
+                return r, None
+            result = cv2.matchTemplate(src, templ_r, cv2.TM_CCOEFF_NORMED)
+            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            return r, (r, max_val, max_loc, w, h, tr, sr)
+
+        def evaluate(ratios):
+            ratios = [r for r in ratios if round(r, 6) not in results]
+            for r, info in self._map(match, ratios):
+                results[round(r, 6)] = info
+
+        def best(candidates=None):
+            infos = [info for info in (candidates or results.values()) if info is not None]
+            return max(infos, key=lambda info: info[1]) if infos else None
+
+        def confirm(max_info):
+            # 超时后, 只要找到满足阈值的结果就直接返回
+            if time.time() - t > time_out and max_info and max_info[1] >= threshold:
+                max_r, max_val, max_loc, w, h, tr, sr_ = max_info
+                omax_loc, ow, oh = self._org_size(max_loc, w, h, tr, sr_)
+                confidence = self._get_confidence_from_matrix(omax_loc, ow, oh)
+                if confidence >= threshold:
+                    return confidence, omax_loc, ow, oh, max_r
+            return None
+
+        # 第一步: 粗略扫描
+        coarse_step = max(step, self.COARSE_STEP)
+        count = int((ratio_max - ratio_min) / coarse_step + 1e-9)
+        coarse = [ratio_min + i * coarse_step for i in range(count + 1)]
+        if ratio_max - coarse[-1] > step:
+            coarse.append(ratio_max)
+        evaluate(coarse)
+
+        # 第二步: 在最优的几个粗略比例附近细化
+        if coarse_step > step:
+            coarse_infos = sorted((results[round(r, 6)] for r in coarse if results[round(r, 6)] is not None),
+                                  key=lambda info: -info[1])
+            for info in coarse_infos[:self.REFINE_COUNT]:
+                ret = confirm(best())
+                if ret:
+                    return ret
+                self._golden_section(evaluate, results, max(ratio_min, info[0] - coarse_step),
+                                     min(ratio_max, info[0] + coarse_step), step)
+
+        max_info = best()
         if max_info is None:
             return 0, (0, 0), 0, 0, 0
         max_r, max_val, max_loc, w, h, tr, sr = max_info
@@ -151,6 +234,28 @@ class MultiScaleTemplateMatching(object):
         confidence = self._get_confidence_from_matrix(omax_loc, ow, oh)
         return confidence, omax_loc, ow, oh, max_r
 
+    @staticmethod
+    def _golden_section(evaluate, results, lo, hi, step):
+        """在[lo, hi]内用黄金分割搜索匹配值最大的比例, 直到区间小于step"""
+        def value(r):
+            evaluate([r])
+            info = results[round(r, 6)]
+            return info[1] if info is not None else -1
+
+        invphi = (5 ** 0.5 - 1) / 2
+        a, b = lo, hi
+        c, d = b - invphi * (b - a), a + invphi * (b - a)
+        fc, fd = value(c), value(d)
+        while b - a > step:
+            if fc >= fd:
+                b, d, fd = d, c, fc
+                c = b - invphi * (b - a)
+                fc = value(c)
+            else:
+                a, c, fc = c, d, fd
+                d = a + invphi * (b - a)
+                fd = value(d)
+
 
 class MultiScaleTemplateMatchingPre(MultiScaleTemplateMatching):
     """基于截图预设条件的多尺度模板匹配."""
@@ -173,7 +278,9 @@ class MultiScaleTemplateMatchingPre(MultiScaleTemplateMatching):
                 check_source_larger_than_search(self.im_source, self.im_search)
             r_min, r_max = self._get_ratio_scope(
                 self.im_source, self.im_search, self.resolution)
-            s_gray, i_gray = img_mat_rgb_2_gray(self.im_search), img_mat_rgb_2_gray(self.im_source)
+            s_gray, i_gray = img_mat_rgb_2_gray(self.im_search), self.screen.gray
+            if not self.record_pos is None:
+                i_gray = aircv.crop_image(i_gray, area)
             confidence, max_loc, w, h, _ = self.multi_scale_search(
                     i_gray, s_gray, ratio_min=r_min, ratio_max=r_max, step=self.scale_step, 
                     threshold=self.threshold, time_out=1.0)
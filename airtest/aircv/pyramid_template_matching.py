@@ -0,0 +1,115 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""金字塔模板匹配: 先在低分辨率层级中找候选位置, 再逐层在小区域内精确定位.
+
+对用户提供的调节参数:
+    1. threshod: 筛选阈值，默认为0.8
+    2. rgb: 彩色三通道,进行彩色权识别.
+"""
+
+import cv2
+
+from airtest.utils.logger import get_logger
+from .template_matching import TemplateMatching
+from .utils import generate_result, check_source_larger_than_search, img_mat_rgb_2_gray, print_run_time
+
+LOGGING = get_logger(__name__)
+
+
+class PyramidTemplateMatching(TemplateMatching):
+    """Coarse-to-fine template matching on gaussian pyramids."""
+
+    METHOD_NAME = "PyramidTemplate"
+    # the shorter side of the template at the coarsest level is not smaller than this
+    MIN_TEMPLATE_SIZE = 10
+    MAX_LEVELS = 3
+    # number of candidates found at the coarsest level to be refined
+    CANDIDATE_COUNT = 5
+    # extra pixels around the candidate searched at each finer level
+    ROI_PADDING = 4
+    # use the exact full-resolution matching if the confidence is in threshold +/- BORDERLINE
+    BORDERLINE = 0.05
+
+    @print_run_time
+    def find_best_result(self):
+        """函数功能：找到最优结果."""
+        # 第一步：校验图像输入
+        check_source_larger_than_search(self.im_source, self.im_search)
+        levels = self._get_levels()
+        if levels == 0:
+            # 模板太小, 直接使用原图精确匹配
+            return super(PyramidTemplateMatching, self).find_best_result()
+
+        # 第二步：构建金字塔, 在最粗糙的层级中找候选位置, 然后逐层精确定位
+        s_gray = img_mat_rgb_2_gray(self.im_search)
+        search_pyramid, source_pyramid = self._build_pyramid(s_gray, levels), self.screen.gray_pyramid(levels)
+        best_val, best_loc = -1, None
+        for loc in self._get_candidates(source_pyramid[-1], search_pyramid[-1]):
+            max_val, max_loc = self._refine(source_pyramid, search_pyramid, loc)
+            if max_val > best_val:
+                best_val, best_loc = max_val, max_loc
+        if best_loc is None:
+            return None
+
+        # 第三步：求取可信度, 可信度处于阈值附近时, 使用原图精确匹配确认
+        h, w = self.im_search.shape[:2]
+        confidence = self._get_confidence_from_matrix(best_loc, best_val, w, h)
+        if abs(confidence - self.threshold) < self.BORDERLINE:
+            LOGGING.debug("[%s] borderline confidence %s, fall back to exact matching" % (self.METHOD_NAME, confidence))
+            return super(PyramidTemplateMatching, self).find_best_result()
+
+        # 求取识别位置: 目标中心 + 目标区域:
+        middle_point, rectangle = self._get_target_rectangle(best_loc, w, h)
+        best_match = generate_result(middle_point, rectangle, confidence)
+        LOGGING.debug("[%s] threshold=%s, levels=%s, result=%s" % (self.METHOD_NAME, self.threshold, levels, best_match))
+
+        return best_match if confidence >= self.threshold else None
+
+    def _get_levels(self):
+        """金字塔层数, 保证最粗糙层级的模板不小于MIN_TEMPLATE_SIZE."""
+        size = min(self.im_search.shape[:2])
+        levels = 0
+        while levels < self.MAX_LEVELS and size // 2 >= self.MIN_TEMPLATE_SIZE:
+            size //= 2
+            levels += 1
+        return levels
+
+    @staticmethod
+    def _build_pyramid(img, levels):
+        """Returns [img, img/2, img/4 ...]."""
+        pyramid = [img]
+        for _ in range(levels):
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+        return pyramid
+
+    def _get_candidates(self, source, search):
+        """在最粗糙的层级中取出若干个互不重叠的候选位置."""
+        res = cv2.matchTemplate(source, search, cv2.TM_CCOEFF_NORMED)
+        h, w = search.shape[:2]
+        candidates = []
+        for _ in range(self.CANDIDATE_COUNT):
+            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+            if candidates and max_val < self.threshold - 0.3:
+                break
+            candidates.append(max_loc)
+            cv2.rectangle(res, (max_loc[0] - w // 2, max_loc[1] - h // 2), (max_loc[0] + w // 2, max_loc[1] + h // 2), -1, -1)
+        return candidates
+
+    def _refine(self, source_pyramid, search_pyramid, loc):
+        """从粗糙层级的候选位置开始, 逐层在候选位置附近的小区域内匹配."""
+        max_val = -1
+        x, y = loc
+        for level in range(len(source_pyramid) - 2, -1, -1):
+            source, search = source_pyramid[level], search_pyramid[level]
+            h, w = search.shape[:2]
+            src_h, src_w = source.shape[:2]
+            pad = self.ROI_PADDING
+            x0, y0 = max(0, x * 2 - pad), max(0, y * 2 - pad)
+            x1, y1 = min(src_w, x * 2 + w + pad), min(src_h, y * 2 + h + pad)
+            # 区域需要不小于模板
+            x0, y0 = max(0, min(x0, x1 - w)), max(0, min(y0, y1 - h))
+            res = cv2.matchTemplate(source[y0:y1, x0:x1], search, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+            x, y = x0 + max_loc[0], y0 + max_loc[1]
+        return max_val, (x, y)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Views of one screenshot shared by all matching methods."""
+
+import threading
+import cv2
+
+from .utils import img_mat_rgb_2_gray
+
+
+class ScreenContext(object):
+    """
+    Screenshot and its derived views (gray, gray pyramid, keypoints ...), computed lazily and cached
+
+    One context is created for each frame and passed to every matching method in the strategy chain
+    (and for every template matched against the frame), so that the same screen is converted only once.
+    The matching methods accept either an image or a ScreenContext as im_source.
+
+    Examples:
+        >>> screen = ScreenContext(img)
+        >>> TemplateMatching(im_search, screen).find_best_result()
+        >>> KAZEMatching(im_search, screen).find_best_result()  # reuses screen.gray
+
+    """
+
+    def __init__(self, img):
+        self.img = img
+        # position of the image in the full screen, see crop()
+        self.offset = (0, 0)
+        self._views = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<ScreenContext shape=%s views=%s>" % (getattr(self.img, "shape", None), list(self._views))
+
+    def get(self, key, factory):
+        """
+        Get the cached view `key`, or create it with `factory()`
+
+        Different views can be created in parallel, the same view is created only once
+
+        """
+        try:
+            return self._views[key]
+        except KeyError:
+            pass
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._views:
+                self._views[key] = factory()
+            return self._views[key]
+
+    @property
+    def gray(self):
+        """gray scale image"""
+        return self.get("gray", lambda: img_mat_rgb_2_gray(self.img))
+
+    def gray_pyramid(self, levels):
+        """gaussian pyramid of the gray image, [gray, gray/2, gray/4 ...] with levels + 1 images"""
+        if levels == 0:
+            return [self.gray]
+        lower = self.gray_pyramid(levels - 1)
+        return lower + [self.get(("gray_pyramid", levels), lambda: cv2.pyrDown(lower[-1]))]
+
+    def crop(self, rect):
+        """
+        Sub-screen of rect, cached, e.g. the predicted area of a template shared by all methods
+
+        The views are slices of this screen's views if they are computed already
+
+        Args:
+            rect: (x_min, y_min, x_max, y_max), clipped to the screen
+
+        Returns:
+            ScreenContext of the area, its `offset` is (x_min, y_min)
+
+        """
+        h, w = self.img.shape[:2]
+        x0, y0, x1, y1 = [int(i) for i in rect]
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, w), min(y1, h)
+
+        def create():
+            sub = ScreenContext(self.img[y0:y1, x0:x1])
+            sub.offset = (x0, y0)
+            if "gray" in self._views:
+                sub._views["gray"] = self._views["gray"][y0:y1, x0:x1]
+            return sub
+
+        return self.get(("crop", x0, y0, x1, y1), create)
+
+
+def as_screen_context(im_source):
+    """wrap an image into a ScreenContext, a ScreenContext is returned as it is"""
+    if isinstance(im_source, ScreenContext):
+        return im_source
+    return ScreenContext(im_source)
@@ -9,6 +9,7 @@ import threading
 import time
 import numpy as np
 import subprocess
+from airtest.aircv.frame import Frame
 
 
 RECORDER_ORI = {
@@ -27,6 +28,13 @@ def resize_by_max(img, max_size=800):
     return img
 
 
+def frame_to_img(frame):
+    """get the image of a Frame (decoded lazily) or numpy.ndarray"""
+    if isinstance(frame, Frame):
+        return frame.img
+    return frame
+
+
 def get_max_size(max_size):
     try:
         max_size = int(max_size)
@@ -110,12 +118,16 @@ class FfmpegVidWriter:
 class ScreenRecorder:
     def __init__(self, outfile, get_frame_func, fps=10, snapshot_sleep=0.001, orientation=0):
         self.get_frame_func = get_frame_func
-        self.tmp_frame = self.get_frame_func()
+        # get_frame_func may return a Frame, which is only decoded when it is going to be written
+        self.latest_frame = self.get_frame_func()
         self.snapshot_sleep = snapshot_sleep
 
-        width, height = self.tmp_frame.shape[1], self.tmp_frame.shape[0]
+        img = frame_to_img(self.latest_frame)
+        if img is None:
+            img = resize_by_max(img)
+        width, height = img.shape[1], img.shape[0]
         self.writer = FfmpegVidWriter(outfile, width, height, fps, orientation)
-        self.tmp_frame = self.writer.process_frame(self.tmp_frame)
+        self.tmp_frame = self.writer.process_frame(img)
 
         self._is_running = False
         self._stop_flag = False
@@ -165,8 +177,7 @@ class ScreenRecorder:
         # 单独一个线程持续截图
         try:
             while True:
-                tmp_frame = self.get_frame_func()
-                self.tmp_frame = self.writer.process_frame(tmp_frame)
+                self.latest_frame = self.get_frame_func()
                 time.sleep(self.snapshot_sleep)
                 if self.is_stop():
                     break
@@ -182,9 +193,17 @@ class ScreenRecorder:
             duration = 1.0/self.writer.fps
             last_time = time.time()
             self._stop_flag = False
+            processed_frame = self.latest_frame
             while True:
                 if time.time()-last_time >= duration:
                     last_time += duration
+                    frame = self.latest_frame
+                    if frame is not processed_frame:
+                        # only frames which are written get decoded and processed
+                        processed_frame = frame
+                        img = frame_to_img(frame)
+                        if img is not None:
+                            self.tmp_frame = self.writer.process_frame(img)
                     self.writer.write(self.tmp_frame)
                 if self.is_stop():
                     break
@@ -7,10 +7,11 @@ import numpy as np
 from .error import *  # noqa
 from .utils import generate_result, check_image_valid
 from .cal_confidence import cal_ccoeff_confidence, cal_rgb_confidence
+from .keypoint_cache import get_keypoints, get_thread_local
+from .keypoint_base import filter_good_matches, get_match_points
 
 # SIFT识别特征点匹配，参数设置:
 FLANN_INDEX_KDTREE = 0
-FLANN = cv2.FlannBasedMatcher({'algorithm': FLANN_INDEX_KDTREE, 'trees': 5}, dict(checks=50))
 # SIFT参数: FILTER_RATIO为SIFT优秀特征点过滤比例值(0-1范围，建议值0.4-0.6)
 FILTER_RATIO = 0.59
 # SIFT参数: SIFT识别时只找出一对相似特征点时的置信度(confidence)
@@ -78,19 +79,28 @@ def find_all_sift(im_source, im_search, threshold=0.8, rgb=True, good_ratio=FILT
 
 
 def _init_sift():
-    """Make sure that there is SIFT module in OpenCV."""
-    if cv2.__version__.startswith("3."):
+    """Make sure that there is SIFT module in OpenCV, the SIFT object is reused in the current thread."""
+    return get_thread_local("sift", _create_sift)
+
+
+def _create_sift():
+    if hasattr(cv2, "SIFT_create"):
+        # opencv3 >= 3.4.12 or opencv4 >= 4.5.0, sift is in main repository
+        return cv2.SIFT_create(edgeThreshold=10)
+    if cv2.__version__.startswith("3.") or cv2.__version__.startswith("4."):
         # OpenCV3.x, sift is in contrib module, you need to compile it seperately.
         try:
-            sift = cv2.xfeatures2d.SIFT_create(edgeThreshold=10)
+            return cv2.xfeatures2d.SIFT_create(edgeThreshold=10)
         except:
             print("to use SIFT, you should build contrib with opencv3.0")
             raise NoSIFTModuleError("There is no SIFT module in your OpenCV environment !")
-    else:
-        # OpenCV2.x, just use it.
-        sift = cv2.SIFT(edgeThreshold=10)
+    # OpenCV2.x, just use it.
+    return cv2.SIFT(edgeThreshold=10)
+
 
-    return sift
+def _init_flann():
+    """FlannBasedMatcher is not thread safe, create one for each thread."""
+    return get_thread_local("sift_flann", lambda: cv2.FlannBasedMatcher({'algorithm': FLANN_INDEX_KDTREE, 'trees': 5}, dict(checks=50)))
 
 
 def _get_key_points(im_source, im_search, good_ratio):
@@ -98,7 +108,7 @@ def _get_key_points(im_source, im_search, good_ratio):
     # 准备工作: 初始化sift算子
     sift = _init_sift()
     # 第一步：获取特征点集，并匹配出特征点对: 返回值 good, pypts, kp_sch, kp_src
-    kp_sch, des_sch = sift.detectAndCompute(im_search, None)
+    kp_sch, des_sch = get_keypoints(im_search, "SIFT", lambda img: sift.detectAndCompute(img, None))
     kp_src, des_src = sift.detectAndCompute(im_source, None)
     # When apply knnmatch , make sure that number of features in both test and
     #       query image is greater than or equal to number of nearest neighbors in knn match.
@@ -106,21 +116,11 @@ def _get_key_points(im_source, im_search, good_ratio):
         raise NoSiftMatchPointError("Not enough feature points in input images !")
 
     # 匹配两个图片中的特征点集，k=2表示每个特征点取出2个最匹配的对应点:
-    matches = FLANN.knnMatch(des_sch, des_src, k=2)
-    good = []
+    matches = _init_flann().knnMatch(des_sch, des_src, k=2)
     # good为特征点初选结果，剔除掉前两名匹配太接近的特征点，不是独特优秀的特征点直接筛除(多目标识别情况直接不适用)
-    for m, n in matches:
-        if m.distance < good_ratio * n.distance:
-            good.append(m)
     # good点需要去除重复的部分，（设定源图像不能有重复点）去重时将src图像中的重复点找出即可
     # 去重策略：允许搜索图像对源图像的特征点映射一对多，不允许多对一重复（即不能源图像上一个点对应搜索图像的多个点）
-    good_diff, diff_good_point = [], [[]]
-    for m in good:
-        diff_point = [int(kp_src[m.trainIdx].pt[0]), int(kp_src[m.trainIdx].pt[1])]
-        if diff_point not in diff_good_point:
-            good_diff.append(m)
-            diff_good_point.append(diff_point)
-    good = good_diff
+    good = filter_good_matches(matches, kp_src, good_ratio)
 
     return kp_sch, kp_src, good
 
@@ -162,17 +162,14 @@ def _handle_three_good_points(im_source, im_search, kp_src, kp_sch, good):
 
 def _many_good_pts(im_source, im_search, kp_sch, kp_src, good):
     """特征点匹配点对数目>=4个，可使用单矩阵映射,求出识别的目标区域."""
-    sch_pts, img_pts = np.float32([kp_sch[m.queryIdx].pt for m in good]).reshape(
-        -1, 1, 2), np.float32([kp_src[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+    sch_pts, img_pts = get_match_points(kp_sch, kp_src, good)
     # M是转化矩阵
     M, mask = _find_homography(sch_pts, img_pts)
-    matches_mask = mask.ravel().tolist()
     # 从good中间筛选出更精确的点(假设good中大部分点为正确的，由ratio=0.7保障)
-    selected = [v for k, v in enumerate(good) if matches_mask[k]]
+    selected = mask.ravel().astype(bool)
 
     # 针对所有的selected点再次计算出更精确的转化矩阵M来
-    sch_pts, img_pts = np.float32([kp_sch[m.queryIdx].pt for m in selected]).reshape(
-        -1, 1, 2), np.float32([kp_src[m.trainIdx].pt for m in selected]).reshape(-1, 1, 2)
+    sch_pts, img_pts = sch_pts[selected], img_pts[selected]
     M, mask = _find_homography(sch_pts, img_pts)
     # 计算四个角矩阵变换后的坐标，也就是在大图中的目标区域的顶点坐标:
     h, w = im_search.shape[:2]
@@ -6,14 +6,17 @@
 对用户提供的调节参数:
     1. threshod: 筛选阈值，默认为0.8
     2. rgb: 彩色三通道,进行彩色权识别.
+    3. prefilter: 先用积分图计算各窗口的均值/方差, 只对统计量与模板相近的窗口做模板匹配.
 """
 
 import cv2
 import time
+import numpy as np
 
 from airtest.utils.logger import get_logger
 from .utils import generate_result, check_source_larger_than_search, img_mat_rgb_2_gray, print_run_time
-from .cal_confidence import cal_rgb_confidence
+from .cal_confidence import cal_rgb_confidence, prepare_rgb_search
+from .screen_context import as_screen_context
 
 LOGGING = get_logger(__name__)
 
@@ -23,45 +26,54 @@ class TemplateMatching(object):
 
     METHOD_NAME = "Template"
     MAX_RESULT_COUNT = 10
+    # prefilter: the std of a window should be in [template std * PREFILTER_STD_RATIO, template std / PREFILTER_STD_RATIO]
+    PREFILTER_STD_RATIO = 0.5
+    # prefilter: max difference between the mean of a window and of the template, for each channel if rgb
+    PREFILTER_MEAN_DIFF = 40
+    # prefilter: the statistics are computed on the screen and template shrunk PREFILTER_SCALE times, as long as
+    # the template is not smaller than PREFILTER_MIN_SIZE
+    PREFILTER_SCALE = 4
+    PREFILTER_MIN_SIZE = 8
+    # prefilter: match the full screen if the windows left cover more than this fraction of it
+    PREFILTER_MAX_AREA = 0.6
 
-    def __init__(self, im_search, im_source, threshold=0.8, rgb=True):
+    def __init__(self, im_search, im_source, threshold=0.8, rgb=True, prefilter=False):
         super(TemplateMatching, self).__init__()
-        self.im_source = im_source
+        # im_source可以是截图或ScreenContext, 同一截图的灰度图等由各方法共用
+        self.screen = as_screen_context(im_source)
+        self.im_source = self.screen.img
         self.im_search = im_search
         self.threshold = threshold
         self.rgb = rgb
+        self.prefilter = prefilter
 
     @print_run_time
-    def find_all_results(self):
-        """基于模板匹配查找多个目标区域的方法."""
+    def find_all_results(self, prefilter=None, max_count=None):
+        """
+        基于模板匹配查找多个目标区域的方法.
+
+        Args:
+            prefilter: whether to skip the windows whose mean/std do not fit the template, default is self.prefilter
+            max_count: max number of results, default is MAX_RESULT_COUNT, 0 for no limit
+
+        Returns:
+            results sorted by the matching value, None if not found
+
+        """
         # 第一步：校验图像输入
         check_source_larger_than_search(self.im_source, self.im_search)
 
         # 第二步：计算模板匹配的结果矩阵res
-        res = self._get_template_result_matrix()
+        res = self._get_template_result_matrix(prefilter)
 
-        # 第三步：依次获取匹配结果
-        result = []
+        # 第三步：按匹配值依次取出结果矩阵中不重叠的局部最大值, 求取可信度
         h, w = self.im_search.shape[:2]
-
-        while True:
-            # 本次循环中,取出当前结果矩阵中的最优值
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
-            # 求取可信度:
-            confidence = self._get_confidence_from_matrix(max_loc, max_val, w, h)
-
-            if confidence < self.threshold or len(result) > self.MAX_RESULT_COUNT:
-                break
-
+        max_count = self.MAX_RESULT_COUNT if max_count is None else max_count
+        result = []
+        for x, y, confidence in find_peaks(res, self.im_source, self.im_search, self.threshold, self.rgb, max_count):
             # 求取识别位置: 目标中心 + 目标区域:
-            middle_point, rectangle = self._get_target_rectangle(max_loc, w, h)
-            one_good_match = generate_result(middle_point, rectangle, confidence)
-
-            result.append(one_good_match)
-
-            # 屏蔽已经取出的最优结果,进入下轮循环继续寻找:
-            # cv2.floodFill(res, None, max_loc, (-1000,), max(max_val, 0), flags=cv2.FLOODFILL_FIXED_RANGE)
-            cv2.rectangle(res, (int(max_loc[0] - w / 2), int(max_loc[1] - h / 2)), (int(max_loc[0] + w / 2), int(max_loc[1] + h / 2)), (0, 0, 0), -1)
+            middle_point, rectangle = self._get_target_rectangle((x, y), w, h)
+            result.append(generate_result(middle_point, rectangle, confidence))
 
         return result if result else None
 
@@ -97,12 +109,81 @@ class TemplateMatching(object):
 
         return confidence
 
-    def _get_template_result_matrix(self):
+    def _get_template_result_matrix(self, prefilter=None):
         """求取模板匹配的结果矩阵."""
         # 灰度识别: cv2.matchTemplate( )只能处理灰度图片参数
-        s_gray, i_gray = img_mat_rgb_2_gray(self.im_search), img_mat_rgb_2_gray(self.im_source)
+        s_gray, i_gray = img_mat_rgb_2_gray(self.im_search), self.screen.gray
+        if self.prefilter if prefilter is None else prefilter:
+            prefilter_mask = self._get_prefilter_mask(s_gray)
+            if prefilter_mask is not None:
+                return self._match_in_mask(i_gray, s_gray, *prefilter_mask)
         return cv2.matchTemplate(i_gray, s_gray, cv2.TM_CCOEFF_NORMED)
 
+    def _get_prefilter_mask(self, s_gray):
+        """
+        Windows whose mean/std (and channel means if rgb) fit the template, computed with integral images
+        on the screen and template shrunk PREFILTER_SCALE times
+
+        Returns:
+            (bool matrix of the shrunk windows, scale), None if the template is too small or uniform
+
+        """
+        h, w = s_gray.shape[:2]
+        scale = self.PREFILTER_SCALE
+        while scale > 1 and min(h, w) // scale < self.PREFILTER_MIN_SIZE:
+            scale //= 2
+        use_color = self.rgb and self.im_source.ndim == 3 and self.im_search.ndim == 3
+        src = self.im_source if use_color else self.screen.gray
+        sch = self.im_search if use_color else s_gray
+        if scale > 1:
+            # shared by all templates matched against the screen
+            src = self.screen.get(("prefilter", use_color, scale), lambda: cv2.resize(
+                src, None, fx=1.0 / scale, fy=1.0 / scale, interpolation=cv2.INTER_AREA))
+            sch = cv2.resize(sch, (w // scale, h // scale), interpolation=cv2.INTER_AREA)
+        src_gray, sch_gray = (img_mat_rgb_2_gray(src), img_mat_rgb_2_gray(sch)) if use_color else (src, sch)
+        mean_t, std_t = cv2.meanStdDev(sch_gray)
+        mean_t, std_t = mean_t[0, 0], std_t[0, 0]
+        if std_t < 1:
+            # a uniform template, the statistics tell nothing
+            return None
+        hs, ws = sch_gray.shape[:2]
+        n = float(ws * hs)
+        sums, sqsums = cv2.integral2(src_gray, sdepth=cv2.CV_64F)
+        mean = _window_sum(sums, ws, hs) / n
+        std = np.sqrt(np.maximum(_window_sum(sqsums, ws, hs) / n - mean * mean, 0))
+        ratio = self.PREFILTER_STD_RATIO
+        mask = (std >= std_t * ratio) & (std <= std_t / ratio) & (np.abs(mean - mean_t) <= self.PREFILTER_MEAN_DIFF)
+        if use_color:
+            color_means = _window_sum(cv2.integral(src, sdepth=cv2.CV_64F), ws, hs) / n
+            for channel, mean_c in enumerate(cv2.mean(sch)[:3]):
+                mask &= np.abs(color_means[..., channel] - mean_c) <= self.PREFILTER_MEAN_DIFF
+        return mask, scale
+
+    def _match_in_mask(self, i_gray, s_gray, mask, scale):
+        """
+        matchTemplate only in the bounding boxes of the connected windows in the (shrunk) mask,
+        the windows outside the boxes are set to -1
+
+        If the boxes cover most of the screen, match the full screen instead.
+        """
+        h, w = s_gray.shape[:2]
+        res_h, res_w = i_gray.shape[0] - h + 1, i_gray.shape[1] - w + 1
+        # one more window around, for the rounding of the shrunk image
+        mask = cv2.dilate(mask.astype(np.uint8), np.ones((3, 3), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        boxes = []
+        for x, y, bw, bh, _ in stats[1:]:
+            x0, y0 = max((x - 1) * scale, 0), max((y - 1) * scale, 0)
+            x1, y1 = min((x + bw + 1) * scale, res_w), min((y + bh + 1) * scale, res_h)
+            if x0 < x1 and y0 < y1:
+                boxes.append((x0, y0, x1, y1))
+        if sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boxes) > self.PREFILTER_MAX_AREA * res_w * res_h:
+            return cv2.matchTemplate(i_gray, s_gray, cv2.TM_CCOEFF_NORMED)
+        res = np.full((res_h, res_w), -1, dtype=np.float32)
+        for x0, y0, x1, y1 in boxes:
+            res[y0:y1, x0:x1] = cv2.matchTemplate(i_gray[y0:y1 + h - 1, x0:x1 + w - 1], s_gray, cv2.TM_CCOEFF_NORMED)
+        return res
+
     def _get_target_rectangle(self, left_top_pos, w, h):
         """根据左上角点和宽高求出目标区域."""
         x_min, y_min = left_top_pos
@@ -117,3 +198,92 @@ class TemplateMatching(object):
         rectangle = (left_top_pos, left_bottom_pos, right_bottom_pos, right_top_pos)
 
         return middle_point, rectangle
+
+
+def _window_sum(integral, w, h):
+    """sums of all w x h windows from an integral image, in the shape of the result of matchTemplate"""
+    return integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+
+
+def iter_peaks(res, w, h, threshold, below_threshold=False):
+    """
+    Non-overlapping local maxima of a matchTemplate result, from high to low
+
+    A maximum suppresses the lower ones within w/2, h/2 of it, the same as masking a w x h box around each result.
+    Each plateau of equal maxima counts as one, and the maxima are checked lazily, so that a repetitive screen
+    with countless maxima costs no more than the results taken from the generator.
+
+    Args:
+        res: result matrix of matchTemplate
+        w, h: size of the template
+        threshold: min value of the maxima
+        below_threshold: then also yield the maxima lower than threshold
+
+    Yields:
+        (x, y, value)
+
+    """
+    # local maxima: equal to the max of its 3x3 neighborhood
+    peaks = res >= cv2.dilate(res, np.ones((3, 3), np.uint8))
+    high = res >= threshold
+    # the maxima lower than threshold are only found if the higher ones are used up
+    tiers = [high, ~high] if below_threshold else [high]
+    # left top of the yielded maxima
+    taken_xs, taken_ys, taken = np.empty(64, dtype=np.int64), np.empty(64, dtype=np.int64), 0
+    for tier in tiers:
+        xs, ys = _plateau_points(peaks & tier)
+        values = res[ys, xs]
+        for i in np.argsort(-values, kind="stable"):
+            x, y = xs[i], ys[i]
+            if taken and np.any((np.abs(taken_xs[:taken] - x) <= w / 2) & (np.abs(taken_ys[:taken] - y) <= h / 2)):
+                continue
+            if taken == len(taken_xs):
+                taken_xs, taken_ys = np.resize(taken_xs, taken * 2), np.resize(taken_ys, taken * 2)
+            taken_xs[taken], taken_ys[taken] = x, y
+            taken += 1
+            yield int(x), int(y), float(values[i])
+
+
+def _plateau_points(mask):
+    """one point (the first in row-major order) of each 8-connected area of the mask, as (xs, ys)"""
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        return xs, ys
+    _, labels = cv2.connectedComponents(mask.astype(np.uint8), connectivity=8)
+    _, first = np.unique(labels[ys, xs], return_index=True)
+    return xs[first], ys[first]
+
+
+def find_peaks(res, im_source, im_search, threshold, rgb=False, max_count=0):
+    """
+    Non-overlapping matches in a matchTemplate result, see iter_peaks
+
+    With rgb, the confidence of a match is its rgb confidence, computed lazily from the highest maximum.
+    A maximum lower than threshold in res may still have a high rgb confidence, the search then stops at the first
+    one which does not, the same as before; a maximum not lower than threshold which fails is skipped.
+
+    Args:
+        res: result matrix of matchTemplate
+        im_source: the screen
+        im_search: the template
+        threshold: min confidence
+        rgb: use the rgb confidence
+        max_count: max number of matches, 0 for no limit
+
+    Returns:
+        [(x, y, confidence), ...], the left top of the matches, sorted by the value in res from high to low
+
+    """
+    h, w = im_search.shape[:2]
+    search = prepare_rgb_search(im_search) if rgb else None
+    result = []
+    for x, y, value in iter_peaks(res, w, h, threshold, below_threshold=rgb):
+        confidence = cal_rgb_confidence(im_source[y:y + h, x:x + w], search) if rgb else value
+        if confidence < threshold:
+            if value < threshold:
+                break
+            continue
+        result.append((x, y, confidence))
+        if max_count and len(result) >= max_count:
+            break
+    return result
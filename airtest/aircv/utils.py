@@ -57,7 +57,7 @@ def img_mat_rgb_2_gray(img_mat):
     Turn img_mat into gray_scale, so that template match can figure the img data.
     "print(type(im_search[0][0])")  can check the pixel type.
     """
-    assert isinstance(img_mat[0][0], np.ndarray), "input must be instance of np.ndarray"
+    assert isinstance(img_mat, np.ndarray) and img_mat.ndim == 3, "input must be a color image of np.ndarray"
     return cv2.cvtColor(img_mat, cv2.COLOR_BGR2GRAY)
 
 
@@ -66,12 +66,54 @@ def img_2_string(img):
     return png.tostring()
 
 
-def string_2_img(pngstr):
+# imdecode flags to decode images at 1/N size, jpg is decoded directly in the reduced size (DCT scaling)
+REDUCED_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def string_2_img(pngstr, reduce_factor=1):
+    """
+    Decode image data into a cv2 image
+
+    Args:
+        pngstr: image data, can be bytes, bytearray or memoryview, np.frombuffer reads it without copying
+        reduce_factor: 1, 2, 4 or 8, decode the image at 1/reduce_factor size
+
+    Returns:
+        numpy.ndarray
+
+    """
     nparr = np.frombuffer(pngstr, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    img = cv2.imdecode(nparr, REDUCED_COLOR_FLAGS[reduce_factor])
     return img
 
 
+def get_reduce_factor(resolution, min_size):
+    """
+    The largest factor in REDUCED_COLOR_FLAGS which keeps the image not smaller than min_size
+
+    Args:
+        resolution: (width, height) of the image
+        min_size: the longer side of the reduced image should be >= min_size
+
+    Returns:
+        1, 2, 4 or 8
+
+    """
+    if not resolution or not min_size:
+        return 1
+    longer = max(resolution)
+    for factor in sorted(REDUCED_COLOR_FLAGS, reverse=True):
+        # opencv rounds up the reduced size
+        if -(-longer // factor) >= min_size:
+            return factor
+    return 1
+
+
 def pil_2_cv2(pil_image):
     open_cv_image = np.array(pil_image)
     # Convert RGB to BGR (method-1):
@@ -4,17 +4,22 @@ import re
 import sys
 import time
 import random
+import socket
 import platform
 import psutil
 import warnings
 import subprocess
 import threading
+import uuid
+import numpy as np
 from copy import copy
-from six import PY3, text_type, binary_type
+from collections import OrderedDict
+from six import PY3, text_type, binary_type, string_types
 from six.moves import reduce
 
+from airtest.core.android.adb_client import AdbClient, AdbServerUnavailable
 from airtest.core.android.constant import (DEFAULT_ADB_PATH, IP_PATTERN,
-                                           SDK_VERISON_ANDROID7)
+                                           SDK_VERISON_ANDROID5, SDK_VERISON_ANDROID7)
 from airtest.core.error import (AdbError, AdbShellError, AirtestError,
                                 DeviceConnectionError)
 from airtest.utils.compat import decode_path, raisefrom, proc_communicate_timeout, SUBPROCESS_FLAG
@@ -34,6 +39,12 @@ class ADB(object):
     status_device = "device"
     status_offline = "offline"
     SHELL_ENCODING = "utf-8"
+    # send the commands supported by the in-process client to the adb server directly, instead of an adb subprocess
+    NATIVE_CLIENT = True
+    # getprop: ro.* properties are immutable and cached until invalidate(include_ro=True) or disconnect;
+    # other properties are queried each time, unless this is > 0, then read from a snapshot of all properties
+    # which is kept for so many seconds
+    PROP_CACHE_TTL = 0
 
     def __init__(self, serialno=None, adb_path=None, server_addr=None, display_id=None, input_event=None):
         self.serialno = serialno
@@ -43,6 +54,17 @@ class ADB(object):
         self._set_cmd_options(server_addr)
         self.connect()
         self._sdk_version = None
+        # {key: value} of all properties and the time of the snapshot, and the ro.* properties
+        self._props = {}
+        self._props_time = 0
+        self._ro_props = {}
+        # properties invalidated one by one, queried again by getprop
+        self._stale_props = set()
+        # whether the ro.* properties have been read from a dump of all properties
+        self._ro_dumped = False
+        # the property cache is used by the frame pump and racing threads too,
+        # a dump holds it so that invalidate() is not overwritten by the old values being dumped
+        self._props_lock = threading.RLock()
         self._line_breaker = None
         self._display_info = {}
         self._display_info_lock = threading.Lock()
@@ -199,7 +221,10 @@ class ADB(object):
 
     def cmd(self, cmds, device=True, ensure_unicode=True, timeout=None):
         """
-        Run the adb command(s) in subprocess and return the standard output
+        Run the adb command(s) and return the standard output
+
+        The commands supported by the in-process adb client (shell, exec-out, forward, push, pull, devices) are sent to
+        the adb server directly, others are run in the adb subprocess, see `_native_cmd`
 
         Args:
             cmds: command(s) to be run
@@ -215,17 +240,22 @@ class ADB(object):
             command(s) standard output (stdout)
 
         """
-        proc = self.start_cmd(cmds, device)
-        if timeout:
-            stdout, stderr = proc_communicate_timeout(proc, timeout)
+        result = self._native_cmd(cmds, device, timeout)
+        if result is not None:
+            stdout, stderr, returncode = result
         else:
-            stdout, stderr = proc.communicate()
+            proc = self.start_cmd(cmds, device)
+            if timeout:
+                stdout, stderr = proc_communicate_timeout(proc, timeout)
+            else:
+                stdout, stderr = proc.communicate()
+            returncode = proc.returncode
 
         if ensure_unicode:
             stdout = stdout.decode(get_std_encoding(sys.stdout))
             stderr = stderr.decode(get_std_encoding(sys.stderr))
 
-        if proc.returncode > 0:
+        if returncode > 0:
             # adb connection error
             pattern = DeviceConnectionError.DEVICE_CONNECTION_ERROR
             if isinstance(stderr, binary_type):
@@ -236,6 +266,66 @@ class ADB(object):
                 raise AdbError(stdout, stderr)
         return stdout
 
+    @property
+    def client(self):
+        """in-process client of the adb server, see :py:class:`airtest.core.android.adb_client.AdbClient`"""
+        return AdbClient.get(self.host, self.port)
+
+    def _native_cmd(self, cmds, device=True, timeout=None):
+        """
+        Run the adb command(s) with the in-process adb client, with the same output as the adb executable
+
+        Args:
+            cmds: command(s) to be run
+            device: whether the command is run on the device of self.serialno
+            timeout: timeout in seconds
+
+        Raises:
+            RuntimeError: if timeout
+
+        Returns:
+            (stdout, stderr, returncode), None if the command is not supported or the adb server is not running,
+            the adb executable should be used then
+
+        """
+        cmds = split_cmd(cmds)
+        if not self.NATIVE_CLIENT or not cmds or (device and not self.serialno):
+            return None
+        serial = self.serialno if device else None
+        name, args = cmds[0], cmds[1:]
+        client = self.client
+        try:
+            if name == "shell" and args:
+                return client.shell(serial, " ".join(args), timeout)
+            elif name == "exec-out" and args:
+                return client.exec_out(serial, " ".join(args), timeout), b"", 0
+            elif name == "forward" and args == ["--list"]:
+                return client.list_forward(serial), b"", 0
+            elif name == "forward" and args[:1] == ["--remove"] and len(args) == 2:
+                client.remove_forward(serial, args[1])
+            elif name == "forward" and args == ["--remove-all"]:
+                client.remove_forward(serial)
+            elif name == "forward" and len(args) in (2, 3) and args[0] in ("--no-rebind", args[-2]):
+                client.forward(serial, args[-2], args[-1], no_rebind=args[0] == "--no-rebind")
+            elif name == "push" and len(args) == 2 and os.path.isfile(args[0]):
+                client.push(serial, args[0], args[1], timeout)
+            elif name == "pull" and len(args) == 2:
+                if not client.pull(serial, args[0], args[1], timeout):
+                    # directory or not found
+                    return None
+            elif name == "devices" and not args:
+                return b"List of devices attached\n" + client.host_query("devices") + b"\n", b"", 0
+            else:
+                return None
+        except AdbServerUnavailable as e:
+            LOGGING.debug("%s, use adb executable instead" % e)
+            return None
+        except AdbError as e:
+            return b"", e.stderr.encode("utf-8"), 1
+        except socket.timeout:
+            raise RuntimeError("Command {cmd} timed out after {timeout} seconds".format(cmd=cmds, timeout=timeout))
+        return b"", b"", 0
+
     def close_proc_pipe(self, proc):
         """close stdin/stdout/stderr of subprocess.Popen."""
 
@@ -297,6 +387,7 @@ class ADB(object):
         """
         if ":" in self.serialno:
             self.cmd("disconnect %s" % self.serialno)
+        self.invalidate(include_ro=True)
 
     def get_status(self):
         """
@@ -309,6 +400,15 @@ class ADB(object):
             None if status is `not found`, otherwise return the standard output from `adb get-state` command
 
         """
+        if self.NATIVE_CLIENT and self.serialno:
+            try:
+                return self.client.host_query("get-state", self.serialno).decode("utf-8").strip()
+            except AdbServerUnavailable:
+                pass
+            except AdbError as e:
+                if "not found" in e.stderr:
+                    return None
+                raise
         proc = self.start_cmd("get-state")
         stdout, stderr = proc.communicate()
 
@@ -416,6 +516,45 @@ class ADB(object):
             else:
                 return out
 
+    def shell_batch(self, cmds, timeout=None):
+        """
+        Run several shell commands in one `adb shell`, the output is split back per command
+
+        Each command runs in a subshell followed by a line of a unique delimiter and its exit code
+
+        Args:
+            cmds: list of shell commands, each can be a string or a list
+            timeout: timeout in seconds of the whole batch
+
+        Raises:
+            AdbError: if the adb command failed
+            RuntimeError: if timeout
+
+        Returns:
+            list of the output of each command, None if the command failed (non-zero exit code)
+
+        Examples:
+            >>> adb.shell_batch(["getprop ro.product.model", "wm size", "ls /not_exist"])
+            ['MI 6\n', 'Physical size: 1080x1920\n', None]
+
+        """
+        if not cmds:
+            return []
+        delimiter = "--airtest-batch-%s--" % uuid.uuid4().hex
+        script = "; ".join("(%s); r=$?; echo; echo %s $r" % (
+            cmd if isinstance(cmd, string_types) else " ".join(cmd), delimiter) for cmd in cmds)
+        out = self.cmd(["shell", script], ensure_unicode=False, timeout=timeout)
+        out = out.decode(self.SHELL_ENCODING, "replace")
+        # the echo before the delimiter adds a line break, and a pty (before Android 7.0) adds \r
+        parts = re.split(r"\r*\n%s (\d+)\r*\n" % delimiter, out)
+        results = []
+        for i in range(len(cmds)):
+            if 2 * i + 1 < len(parts) and parts[2 * i + 1] == "0":
+                results.append(parts[2 * i])
+            else:
+                results.append(None)
+        return results
+
     def keyevent(self, keyname):
         """
         Perform `adb shell input keyevent` command on the device
@@ -433,29 +572,99 @@ class ADB(object):
         """
         Perform `adb shell getprop` on the device
 
+        ro.* properties are read from the cache, which is filled by one dump of all properties (see getprops)
+        and kept until the device is disconnected; other properties are queried each time, or read from the
+        snapshot of getprops if PROP_CACHE_TTL is set
+
         Args:
             key: key value for property
-            strip: True or False to strip the return carriage and line break from returned string
+            strip: True or False to strip the return carriage and line break from returned string,
+                the raw output is not cached, so `strip=False` always runs getprop
 
         Returns:
             propery value
 
         """
-        prop = self.raw_shell(['getprop', key])
-        if strip:
-            if "\r\r\n" in prop:
-                # Some mobile phones will output multiple lines of extra log
-                prop = prop.split("\r\r\n")
-                if len(prop) > 1:
-                    prop = prop[-2]
+        if not strip:
+            return self.raw_shell(['getprop', key])
+        is_ro = key.startswith("ro.")
+        with self._props_lock:
+            if key in self._ro_props:
+                return self._ro_props[key]
+            if key not in self._stale_props and (self.PROP_CACHE_TTL or (is_ro and not self._ro_dumped)):
+                try:
+                    props = self.getprops(refresh=not self.PROP_CACHE_TTL)
+                except AdbError as e:
+                    LOGGING.debug("failed to dump properties: %r" % e)
                 else:
-                    prop = prop[-1]
-            else:
-                prop = prop.strip("\r\n")
+                    if self.PROP_CACHE_TTL or key in self._ro_props:
+                        # getprop outputs nothing for the properties not set
+                        return props.get(key, "")
+        prop = _strip_prop(self.raw_shell(['getprop', key]))
+        with self._props_lock:
+            if is_ro and prop:
+                self._ro_props[key] = prop
+            if key in self._stale_props:
+                self._props[key] = prop
+                self._stale_props.discard(key)
         return prop
 
+    def getprops(self, refresh=False):
+        """
+        All properties of the device, by one `adb shell getprop`
+
+        Args:
+            refresh: dump the properties even if the snapshot is not older than PROP_CACHE_TTL
+
+        Returns:
+            {key: value}
+
+        """
+        with self._props_lock:
+            if refresh or not self._props or time.time() - self._props_time > (self.PROP_CACHE_TTL or 0):
+                self._update_props(self.raw_shell(['getprop']))
+            return self._props
+
+    def _update_props(self, output):
+        """update the property snapshot from the output of `getprop` without key"""
+        # a value may have several lines, it ends with "]" at the end of a line followed by the next "[key]: ["
+        props = {k: re.sub(r"\r+\n", "\n", v) for k, v in re.findall(
+            r"^\[([^\]\r\n]+)\]: \[(.*?)\][ \t\r]*$(?=\n\[[^\]\r\n]+\]: \[|\s*\Z)", output, re.M | re.S)}
+        with self._props_lock:
+            self._ro_dumped = True
+            for k, v in props.items():
+                # ro.* properties are set once per boot, keep them until invalidate(include_ro=True)
+                if k.startswith("ro.") and v:
+                    self._ro_props.setdefault(k, v)
+            self._props, self._props_time = props, time.time()
+            self._stale_props = set()
+
+    def invalidate(self, key=None, include_ro=False):
+        """
+        Drop the cached properties, e.g. after `setprop`
+
+        Args:
+            key: drop this property only, default is all the mutable properties
+            include_ro: also drop the ro.* properties, e.g. after the device is rebooted or reconnected
+
+        Returns:
+            None
+
+        """
+        with self._props_lock:
+            if key is not None:
+                self._ro_props.pop(key, None)
+                self._props.pop(key, None)
+                self._stale_props.add(key)
+                return
+            if include_ro:
+                self._ro_props = {}
+                self._ro_dumped = False
+                self._sdk_version = None
+            self._props, self._props_time = {}, 0
+            self._stale_props = set()
+
     @property
-    @retries(max_tries=3)
     def sdk_version(self):
         """
         Get the SDK version from the device
@@ -463,11 +672,19 @@ class ADB(object):
         Returns:
             SDK version
         """
+        # called by every shell(), keep the cached path short
         if self._sdk_version is None:
-            keyname = 'ro.build.version.sdk'
-            self._sdk_version = int(self.getprop(keyname))
+            self._sdk_version = self._get_sdk_version()
         return self._sdk_version
 
+    @retries(max_tries=3)
+    def _get_sdk_version(self):
+        sdk = self.getprop('ro.build.version.sdk')
+        if not sdk:
+            # not set yet, e.g. while booting, dump the properties again in the next try
+            self.invalidate()
+        return int(sdk)
+
     def push(self, local, remote):
         """
         Perform `adb push` command
@@ -825,12 +1042,53 @@ class ADB(object):
             command output (stdout)
 
         """
-        if self.display_id:
-            raw = self.cmd('shell screencap -d {0} -p'.format(self.display_id), ensure_unicode=False)
-        else:
-            raw = self.cmd('shell screencap -p', ensure_unicode=False)
+        cmd = 'screencap -d {0} -p'.format(self.display_id) if self.display_id else 'screencap -p'
+        if self.sdk_version >= SDK_VERISON_ANDROID5:
+            # exec-out does not convert the line breaks, the png is returned as it is
+            return self.cmd('exec-out ' + cmd, ensure_unicode=False)
+        raw = self.cmd('shell ' + cmd, ensure_unicode=False)
         return raw.replace(self.line_breaker, b"\n")
 
+    def screencap_raw(self, buffer=None):
+        """
+        Take the screenshot of the device display with `adb exec-out screencap` without `-p`,
+        the raw pixels are read without png encoding on the device and decoding on the host
+
+        Args:
+            buffer: writable buffer (e.g. numpy.uint8 array) to read the output into,
+                replaced by a larger one if it is too small
+
+        Raises:
+            AdbError: if the command fails or outputs nothing
+
+        Returns:
+            (buffer, size): the buffer holding the output and the size of the output,
+            the output is a header (width, height, format[, colorspace]) followed by the pixels
+
+        """
+        cmd = "screencap -d %s" % self.display_id if self.display_id else "screencap"
+        if buffer is None:
+            buffer = np.empty(4 * 1024 * 1024, dtype=np.uint8)
+        if self.NATIVE_CLIENT and self.serialno:
+            try:
+                with self.client.open_exec(self.serialno, cmd) as sock:
+                    buffer, size = _read_into_buffer(sock.recv_into, buffer)
+                if not size:
+                    raise AdbError(b"", b"")
+                return buffer, size
+            except AdbServerUnavailable:
+                pass
+        proc = self.start_cmd("exec-out " + cmd)
+        try:
+            buffer, size = _read_into_buffer(proc.stdout.readinto, buffer)
+            stderr = proc.stderr.read()
+            proc.wait()
+        finally:
+            self.close_proc_pipe(proc)
+        if proc.returncode or not size:
+            raise AdbError(b"", stderr)
+        return buffer, size
+
     # PEP 3113 -- Removal of Tuple Parameter Unpacking
     # https://www.python.org/dev/peps/pep-3113/
     def touch(self, tuple_xy):
@@ -1017,9 +1275,21 @@ class ADB(object):
             }
 
         """
-        display_info = self.getPhysicalDisplayInfo()
-        orientation = self.getDisplayOrientation()
-        max_x, max_y = self.getMaxXY()
+        # one adb shell for the common case, each part falls back to its own commands if not found
+        try:
+            wm_size, props, surface_flinger, getevent = self.shell_batch(
+                ["wm size", "getprop", "dumpsys SurfaceFlinger", "getevent -p"], timeout=10)
+        except (AdbError, RuntimeError) as e:
+            LOGGING.error(e)
+            wm_size = props = surface_flinger = getevent = None
+        if props is not None:
+            self._update_props(props)
+        densities = [self._props.get("ro.sf.lcd_density"), self._props.get("qemu.sf.lcd_density")]
+        display_info = self._parse_wm_size(wm_size, densities) or self.getPhysicalDisplayInfo()
+        orientation = self._parse_orientation(surface_flinger)
+        if orientation is None:
+            orientation = self.getDisplayOrientation()
+        max_x, max_y = self._parse_max_xy(getevent) if getevent is not None else self.getMaxXY()
         display_info.update({
             "orientation": orientation,
             "rotation": orientation * 90,
@@ -1036,7 +1306,12 @@ class ADB(object):
             max x and max y coordinates
 
         """
-        ret = self.shell('getevent -p').split('\n')
+        return self._parse_max_xy(self.shell('getevent -p'))
+
+    @staticmethod
+    def _parse_max_xy(output):
+        """max x and max y coordinates from the output of `getevent -p`"""
+        ret = output.split('\n')
         max_x, max_y = None, None
         for i in ret:
             if i.find("0035") != -1:
@@ -1084,14 +1359,12 @@ class ADB(object):
         # use adb shell wm size
         displayInfo = {}
         try:
-            wm_size = re.search(r'(?P<width>\d+)x(?P<height>\d+)\s*$', self.cmd('shell wm size', timeout=5))
+            wm_size = self.cmd('shell wm size', timeout=5)
         except (AdbError, RuntimeError) as e:
             LOGGING.error(e)
         else:
-            if wm_size:
-                displayInfo = dict((k, int(v)) for k, v in wm_size.groupdict().items())
-                displayInfo['density'] = self._getDisplayDensity(strip=True)
-                return displayInfo
+            if re.search(r'(?P<width>\d+)x(?P<height>\d+)\s*$', wm_size):
+                return self._parse_wm_size(wm_size, [self._getDisplayDensity(strip=True)])
 
         phyDispRE = re.compile('.*PhysicalDisplayInfo{(?P<width>\d+) x (?P<height>\d+), .*, density (?P<density>[\d.]+).*')
         out = self.raw_shell('dumpsys display')
@@ -1148,15 +1421,32 @@ class ADB(object):
             display density
 
         """
-        BASE_DPI = 160.0
-        d = self.getprop('ro.sf.lcd_density', strip)
-        if d:
-            return float(d) / BASE_DPI
-        d = self.getprop('qemu.sf.lcd_density', strip)
-        if d:
-            return float(d) / BASE_DPI
+        for key in ('ro.sf.lcd_density', 'qemu.sf.lcd_density'):
+            d = self.getprop(key, strip)
+            if d:
+                return _parse_density([d])
         return -1.0
 
+    @staticmethod
+    def _parse_wm_size(wm_size, densities):
+        """
+        Display info from the output of `wm size` and the density
+
+        Args:
+            wm_size: output of `wm size`
+            densities: density factor, or getprop output of ro.sf.lcd_density / qemu.sf.lcd_density
+
+        Returns:
+            {"width": width, "height": height, "density": density}, None if the size is not found
+
+        """
+        m = re.search(r'(?P<width>\d+)x(?P<height>\d+)\s*$', wm_size or "")
+        if not m:
+            return None
+        displayInfo = dict((k, int(v)) for k, v in m.groupdict().items())
+        displayInfo['density'] = _parse_density(densities)
+        return displayInfo
+
     def getDisplayOrientation(self):
         """
         Another way to get the display orientation, this works well for older devices (SDK version 15)
@@ -1166,11 +1456,9 @@ class ADB(object):
 
         """
         # another way to get orientation, for old sumsung device(sdk version 15) from xiaoma
-        SurfaceFlingerRE = re.compile('orientation=(\d+)')
-        output = self.shell('dumpsys SurfaceFlinger')
-        m = SurfaceFlingerRE.search(output)
-        if m:
-            return int(m.group(1))
+        orientation = self._parse_orientation(self.shell('dumpsys SurfaceFlinger'))
+        if orientation is not None:
+            return orientation
 
         # Fallback method to obtain the orientation
         # See https://github.com/dtmilano/AndroidViewClient/issues/128
@@ -1190,6 +1478,12 @@ class ADB(object):
         warnings.warn("Could not obtain the orientation, return 0")
         return 0
 
+    @staticmethod
+    def _parse_orientation(output):
+        """orientation from the output of `dumpsys SurfaceFlinger`, None if not found"""
+        m = re.search(r'orientation=(\d+)', output or "")
+        return int(m.group(1)) if m else None
+
     def update_cur_display(self, display_info):
         """
         Some phones support resolution modification, try to get the modified resolution from dumpsys
@@ -1618,7 +1912,10 @@ class ADB(object):
         return 17
 
     def get_memory(self):
-        res = self.shell("dumpsys meminfo")
+        return self._parse_memory(self.shell("dumpsys meminfo"))
+
+    @staticmethod
+    def _parse_memory(res):
         pat = re.compile(r".*Total RAM:\s+(\S+)\s+", re.DOTALL)
         _str = pat.match(res).group(1)
         if ',' in _str:
@@ -1631,7 +1928,10 @@ class ADB(object):
         return res
 
     def get_storage(self):
-        res = self.shell("df /data")
+        return self._parse_storage(self.shell("df /data"))
+
+    @staticmethod
+    def _parse_storage(res):
         pat = re.compile(r".*\/data\s+(\S+)", re.DOTALL)
         if pat.match(res):
             _str = pat.match(res).group(1)
@@ -1657,7 +1957,11 @@ class ADB(object):
         return res
 
     def get_cpuinfo(self):
-        res = self.shell("cat /proc/cpuinfo").strip()
+        return self._parse_cpuinfo(self.shell("cat /proc/cpuinfo"))
+
+    @staticmethod
+    def _parse_cpuinfo(res):
+        res = res.strip()
         cpuNum = res.count("processor")
         pat = re.compile(r'Hardware\s+:\s+(\w+.*)')
         m = pat.search(res)
@@ -1668,17 +1972,22 @@ class ADB(object):
         return dict(cpuNum=cpuNum, cpuName=cpuName)
 
     def get_cpufreq(self):
-        res = self.shell("cat /sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq")
+        return self._parse_cpufreq(self.shell("cat /sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq"))
+
+    @staticmethod
+    def _parse_cpufreq(res):
         num = round(float(res) / 1000 / 1000, 1)
         res = str(num) + 'GHz'
         return res.strip()
 
     def get_cpuabi(self):
-        res = self.shell("getprop ro.product.cpu.abi")
-        return res.strip()
+        return self.getprop("ro.product.cpu.abi")
 
     def get_gpu(self):
-        res = self.shell("dumpsys SurfaceFlinger")
+        return self._parse_gpu(self.shell("dumpsys SurfaceFlinger"))
+
+    @staticmethod
+    def _parse_gpu(res):
         pat = re.compile(r'GLES:\s+(.*)')
         m = pat.search(res)
         if not m:
@@ -1708,7 +2017,52 @@ class ADB(object):
             Dict of info
 
         """
+        # {key: (shell command, parser of the output)}, run in one adb shell
+        batch = OrderedDict([
+            ("memory", ("dumpsys meminfo", self._parse_memory)),
+            ("storage", ("df /data", self._parse_storage)),
+            ("display", ("wm size", lambda out: self._parse_wm_size(out, [density]))),
+            ("cpuinfo", ("cat /proc/cpuinfo", self._parse_cpuinfo)),
+            ("cpufreq", ("cat /sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq", self._parse_cpufreq)),
+            ("gpu", ("dumpsys SurfaceFlinger", self._parse_gpu)),
+        ])
+        try:
+            # plus all the properties, for cpuabi/sdkversion/model/manufacturer and the density
+            outputs = self.shell_batch([cmd for cmd, _ in batch.values()] + ["getprop"])
+        except (AdbError, RuntimeError) as e:
+            LOGGING.error(e)
+            return self._get_device_info_one_by_one()
+        props = outputs.pop()
+        if props is not None:
+            self._update_props(props)
+        outputs = dict(zip(batch.keys(), outputs))
+        density = self._props.get("ro.sf.lcd_density") or self._props.get("qemu.sf.lcd_density")
+
+        values = {}
+        for key, output in outputs.items():
+            try:
+                values[key] = batch[key][1](output) if output is not None else None
+            except Exception:
+                values[key] = None
         handlers = {
+            "platform": "Android",
+            "serialno": self.serialno,
+            "display": values["display"] or self.getPhysicalDisplayInfo,
+            "cpuabi": self.get_cpuabi,
+            "sdkversion": lambda: self.sdk_version,
+            "model": self.get_model,
+            "manufacturer": self.get_manufacturer,
+        }
+        handlers.update((key, values[key]) for key in ("memory", "storage", "cpuinfo", "cpufreq", "gpu"))
+        # the properties are read from the cache filled above
+        ret = self._get_device_info_one_by_one(handlers)
+        return OrderedDict((key, ret[key]) for key in (
+            "platform", "serialno", "memory", "storage", "display", "cpuinfo", "cpufreq", "cpuabi", "sdkversion",
+            "gpu", "model", "manufacturer"))
+
+    def _get_device_info_one_by_one(self, handlers=None):
+        """get_device_info with one adb shell for each item"""
+        handlers = handlers or {
             "platform": "Android",
             "serialno": self.serialno,
             "memory": self.get_memory,
@@ -1717,7 +2071,7 @@ class ADB(object):
             "cpuinfo": self.get_cpuinfo,
             "cpufreq": self.get_cpufreq,
             "cpuabi": self.get_cpuabi,
-            "sdkversion": self.sdk_version,
+            "sdkversion": lambda: self.sdk_version,
             "gpu": self.get_gpu,
             "model": self.get_model,
             "manufacturer": self.get_manufacturer,
@@ -1787,6 +2141,45 @@ class ADB(object):
         return ""
 
 
+def _parse_density(densities):
+    """the first valid density: a float factor, or a getprop output of dpi; -1.0 if none"""
+    BASE_DPI = 160.0
+    for d in densities:
+        if isinstance(d, float):
+            return d
+        if d and d.strip():
+            return float(d) / BASE_DPI
+    return -1.0
+
+
+def _strip_prop(prop):
+    """strip the line break of the getprop output"""
+    if "\r\r\n" in prop:
+        # Some mobile phones will output multiple lines of extra log
+        prop = prop.split("\r\r\n")
+        if len(prop) > 1:
+            prop = prop[-2]
+        else:
+            prop = prop[-1]
+    else:
+        prop = prop.strip("\r\n")
+    return prop
+
+
+def _read_into_buffer(readinto, buffer):
+    """read a stream into the buffer until EOF, the buffer is replaced by a larger one if it is too small"""
+    size = 0
+    while True:
+        if size == len(buffer):
+            larger = np.empty(len(buffer) * 2, dtype=np.uint8)
+            larger[:size] = buffer[:size]
+            buffer = larger
+        n = readinto(memoryview(buffer)[size:])
+        if not n:
+            return buffer, size
+        size += n
+
+
 def cleanup_adb_forward():
     for adb in ADB._instances:
         adb._cleanup_forwards()
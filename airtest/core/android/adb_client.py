@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+In-process client of the adb server, so that adb commands do not start an adb process each time
+
+The smart socket protocol on the adb server port (5037 by default):
+
+    request: 4 hex digits of the payload length + payload
+    response: "OKAY", or "FAIL" + 4 hex digits of the message length + message
+
+    host:devices, host-serial:<serial>:<request>    handled by the adb server
+    host:transport:<serial>                         switch the connection to the device, then one of:
+        shell,v2,raw:<cmd>  shell protocol (Android 7.0+), packets of stdout/stderr/exit code
+        shell:<cmd>         legacy shell, output only
+        exec:<cmd>          raw output
+        sync:               file transfer
+
+The adb server closes the connection after a device service, so a connection serves one command.
+"""
+import os
+import stat
+import socket
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from airtest.core.error import AdbError
+
+# shell protocol packet ids
+SHELL_STDOUT = 1
+SHELL_STDERR = 2
+SHELL_EXIT = 3
+# max size of a DATA packet of the sync protocol
+SYNC_DATA_MAX = 64 * 1024
+
+
+class AdbServerUnavailable(IOError):
+    """
+    The adb server cannot be connected, the adb executable should be used instead, which starts the server
+    """
+    pass
+
+
+class DeadlineSocket(object):
+    """
+    Socket of a command with a timeout, which applies to the whole command instead of each socket operation
+
+    Raises:
+        socket.timeout: if the deadline has passed
+
+    """
+
+    def __init__(self, sock, deadline):
+        self._sock = sock
+        self.deadline = deadline
+
+    def _settimeout(self):
+        remaining = self.deadline - time.time()
+        if remaining <= 0:
+            raise socket.timeout("timed out")
+        self._sock.settimeout(remaining)
+
+    def recv(self, n):
+        self._settimeout()
+        return self._sock.recv(n)
+
+    def recv_into(self, buffer, n=0):
+        self._settimeout()
+        return self._sock.recv_into(buffer, n)
+
+    def sendall(self, data):
+        self._settimeout()
+        return self._sock.sendall(data)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class AdbClient(object):
+    """
+    Client of one adb server, shared by all ADB objects of the same server address
+
+    Each serial number has a small pool bounding the connections to the device at the same time.
+
+    Examples:
+        >>> client = AdbClient.get("127.0.0.1", 5037)
+        >>> client.shell("emulator-5554", "getprop ro.build.version.sdk")
+        (b'30\\n', b'', 0)
+
+    """
+    # max connections to one device at the same time
+    POOL_SIZE = 4
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, host="127.0.0.1", port=5037):
+        self.host = host
+        self.port = port
+        self._pools = {}
+        self._features = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, host, port):
+        """the client of the adb server at host:port"""
+        with cls._instances_lock:
+            if (host, port) not in cls._instances:
+                cls._instances[(host, port)] = cls(host, port)
+            return cls._instances[(host, port)]
+
+    def _connect(self, timeout=None):
+        try:
+            return socket.create_connection((self.host, self.port), timeout=timeout or 5)
+        except (socket.error, OSError) as e:
+            raise AdbServerUnavailable("cannot connect to adb server %s:%s: %r" % (self.host, self.port, e))
+
+    @contextmanager
+    def connection(self, serial=None, timeout=None):
+        """
+        A connection to the adb server, switched to the device if serial is given
+
+        Args:
+            serial: serial number of the device
+            timeout: timeout in seconds of everything done on the connection, None for blocking
+
+        Raises:
+            AdbServerUnavailable: if the adb server cannot be connected
+            AdbError: if the device cannot be switched to
+
+        """
+        pool = None
+        deadline = time.time() + timeout if timeout else None
+        if serial:
+            with self._lock:
+                pool = self._pools.setdefault(serial, threading.BoundedSemaphore(self.POOL_SIZE))
+            pool.acquire()
+        try:
+            sock = self._connect(deadline and max(deadline - time.time(), 0.001))
+            try:
+                if deadline:
+                    sock = DeadlineSocket(sock, deadline)
+                else:
+                    sock.settimeout(None)
+                if serial:
+                    self.request(sock, "host:transport:%s" % serial)
+                yield sock
+            finally:
+                sock.close()
+        finally:
+            if pool is not None:
+                pool.release()
+
+    def request(self, sock, payload):
+        """send a request and check the response status"""
+        payload = payload.encode("utf-8")
+        sock.sendall(("%04x" % len(payload)).encode("ascii") + payload)
+        self._check_status(sock)
+
+    def _check_status(self, sock):
+        status = read_exact(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError("", "error: %s" % self._read_string(sock).decode("utf-8", "replace"))
+        raise AdbError("", "error: unexpected response %r" % status)
+
+    def _read_string(self, sock):
+        length = int(read_exact(sock, 4), 16)
+        return read_exact(sock, length)
+
+    def host_query(self, request, serial=None, timeout=None):
+        """
+        Query the adb server, e.g. "devices", "get-state"
+
+        Returns:
+            response data (bytes)
+
+        """
+        with self.connection(timeout=timeout) as sock:
+            self.request(sock, host_prefix(serial) + request)
+            return self._read_string(sock)
+
+    def host_command(self, request, serial=None, timeout=None):
+        """run a command on the adb server which replies a second status, e.g. "forward", "killforward" """
+        with self.connection(timeout=timeout) as sock:
+            self.request(sock, host_prefix(serial) + request)
+            self._check_status(sock)
+
+    def features(self, serial):
+        """features supported by both the device and the adb server, e.g. "shell_v2" """
+        if serial not in self._features:
+            data = self.host_query("features", serial)
+            self._features[serial] = set(data.decode("utf-8").strip().split(","))
+        return self._features[serial]
+
+    def shell(self, serial, cmd, timeout=None):
+        """
+        Run a shell command on the device
+
+        Returns:
+            (stdout, stderr, exit code), the exit code is always 0 and stderr is in stdout before Android 7.0
+
+        """
+        if "shell_v2" not in self.features(serial):
+            return self.exec_out(serial, cmd, timeout, service="shell"), b"", 0
+        stdout, stderr, exit_code = [], [], 0
+        with self.connection(serial, timeout) as sock:
+            self.request(sock, "shell,v2,raw:%s" % cmd)
+            while True:
+                header = read_exact(sock, 5, allow_eof=True)
+                if not header:
+                    break
+                packet_id, length = struct.unpack("<BI", header)
+                data = read_exact(sock, length)
+                if packet_id == SHELL_STDOUT:
+                    stdout.append(data)
+                elif packet_id == SHELL_STDERR:
+                    stderr.append(data)
+                elif packet_id == SHELL_EXIT:
+                    exit_code = data[0] if data else 0
+                    break
+        return b"".join(stdout), b"".join(stderr), exit_code
+
+    @contextmanager
+    def open_exec(self, serial, cmd, timeout=None, service="exec"):
+        """a connection streaming the raw output of `cmd`, read it until EOF"""
+        with self.connection(serial, timeout) as sock:
+            self.request(sock, "%s:%s" % (service, cmd))
+            yield sock
+
+    def exec_out(self, serial, cmd, timeout=None, service="exec"):
+        """raw output of `cmd`, the same as `adb exec-out cmd`"""
+        with self.open_exec(serial, cmd, timeout, service) as sock:
+            return read_all(sock)
+
+    def forward(self, serial, local, remote, no_rebind=False):
+        request = "forward:norebind:%s;%s" if no_rebind else "forward:%s;%s"
+        self.host_command(request % (local, remote), serial)
+
+    def remove_forward(self, serial, local=None):
+        if local:
+            self.host_command("killforward:%s" % local, serial)
+        else:
+            self.host_command("killforward-all", serial)
+
+    def list_forward(self, serial=None):
+        """the same output as `adb forward --list`"""
+        return self.host_query("list-forward", serial)
+
+    @contextmanager
+    def sync(self, serial, timeout=None):
+        """a connection in the sync mode"""
+        with self.connection(serial, timeout) as sock:
+            self.request(sock, "sync:")
+            yield sock
+            sock.sendall(b"QUIT" + struct.pack("<I", 0))
+
+    def stat(self, serial, remote, timeout=None):
+        """
+        Stat a file on the device
+
+        Returns:
+            (mode, size, mtime), mode is 0 if the file does not exist
+
+        """
+        with self.sync(serial, timeout) as sock:
+            return self._stat(sock, remote)
+
+    def _stat(self, sock, remote):
+        _sync_request(sock, b"STAT", remote)
+        response = read_exact(sock, 16)
+        if response[:4] != b"STAT":
+            raise AdbError("", "error: unexpected sync response %r" % response[:4])
+        return struct.unpack("<III", response[4:])
+
+    def push(self, serial, local, remote, timeout=None):
+        """
+        Push a file to the device, into the directory if remote is a directory
+
+        Raises:
+            AdbError: if failed, including errors reading the local file
+
+        """
+        st = _local_io(os.stat, local)
+        with self.sync(serial, timeout) as sock:
+            if stat.S_ISDIR(self._stat(sock, remote)[0]):
+                remote = "%s/%s" % (remote.rstrip("/"), os.path.basename(local))
+            _sync_request(sock, b"SEND", "%s,%d" % (remote, stat.S_IFREG | stat.S_IMODE(st.st_mode)))
+            with _local_io(open, local, "rb") as f:
+                while True:
+                    chunk = _local_io(f.read, SYNC_DATA_MAX)
+                    if not chunk:
+                        break
+                    sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+            sock.sendall(b"DONE" + struct.pack("<I", int(st.st_mtime)))
+            response = read_exact(sock, 8)
+            if response[:4] != b"OKAY":
+                self._sync_fail(sock, response)
+
+    def pull(self, serial, remote, local, timeout=None):
+        """
+        Pull a file from the device, into the directory if local is a directory
+
+        Raises:
+            AdbError: if failed, including errors writing the local file
+
+        Returns:
+            False if remote is not a regular file (directory or not found), nothing is pulled then
+
+        """
+        if os.path.isdir(local):
+            local = os.path.join(local, os.path.basename(remote.rstrip("/")))
+        with self.sync(serial, timeout) as sock:
+            if not stat.S_ISREG(self._stat(sock, remote)[0]):
+                return False
+            _sync_request(sock, b"RECV", remote)
+            tmp_path = "%s.%s.tmp" % (local, os.getpid())
+            try:
+                with _local_io(open, tmp_path, "wb") as f:
+                    while True:
+                        response = read_exact(sock, 8)
+                        if response[:4] == b"DONE":
+                            break
+                        if response[:4] != b"DATA":
+                            self._sync_fail(sock, response)
+                        _local_io(f.write, read_exact(sock, struct.unpack("<I", response[4:])[0]))
+                _local_io(os.replace, tmp_path, local)
+            finally:
+                if os.path.exists(tmp_path):
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+        return True
+
+    def _sync_fail(self, sock, response):
+        if response[:4] == b"FAIL":
+            message = read_exact(sock, struct.unpack("<I", response[4:])[0]).decode("utf-8", "replace")
+            raise AdbError("", "adb: error: %s" % message)
+        raise AdbError("", "adb: error: unexpected sync response %r" % response[:4])
+
+
+def host_prefix(serial=None):
+    return "host-serial:%s:" % serial if serial else "host:"
+
+
+def _local_io(func, *args):
+    """call func on a local file, the same error as the adb executable if it fails"""
+    try:
+        return func(*args)
+    except (IOError, OSError) as e:
+        raise AdbError("", "adb: error: %s" % e)
+
+
+def _sync_request(sock, request_id, path):
+    path = path.encode("utf-8")
+    sock.sendall(request_id + struct.pack("<I", len(path)) + path)
+
+
+def read_exact(sock, n, allow_eof=False):
+    """
+    Read n bytes from the socket
+
+    Raises:
+        AdbError: if the connection is closed before n bytes, unless allow_eof and nothing is read
+
+    """
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            if allow_eof and not data:
+                return b""
+            raise AdbError("", "error: connection closed by adb server")
+        data += chunk
+    return bytes(data)
+
+
+def read_all(sock):
+    """read the socket until EOF"""
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
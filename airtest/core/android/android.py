@@ -5,6 +5,7 @@ import os
 import shutil
 import warnings
 from copy import copy
+from functools import partial
 from airtest import aircv
 from airtest.core.device import Device
 from airtest.core.android.ime import YosemiteIme
@@ -237,6 +238,8 @@ class Android(Device):
                                                     rotation_watcher=self.rotation_watcher,
                                                     display_id=self.display_id,
                                                     ori_function=lambda: self.display_info)
+        if ST.SCREEN_FRAME_PUMP:
+            self._screen_proxy.start_frame_pump()
         return self._screen_proxy
 
     @screen_proxy.setter
@@ -267,6 +270,8 @@ class Android(Device):
         if self._screen_proxy:
             self._screen_proxy.teardown_stream()
         self._screen_proxy = ScreenProxy.auto_setup(self.adb, default_method=cap_method)
+        if ST.SCREEN_FRAME_PUMP:
+            self._screen_proxy.start_frame_pump()
 
     def get_deprecated_var(self, old_name, new_name):
         """
@@ -490,6 +495,41 @@ class Android(Device):
             aircv.imwrite(filename, screen, quality, max_size=max_size)
         return screen
 
+    def snapshot_frame(self, filename=None, ensure_orientation=True, quality=10, max_size=None):
+        """
+        Take the screenshot as :py:class:`airtest.aircv.frame.Frame`, the image is decoded when its pixels are read
+
+        Args:
+            filename: name of the file where to store the screenshot, default is None
+            ensure_orientation: True or False whether to keep the orientation same as display
+            quality: The image quality, integer in range [1, 99]
+            max_size: the maximum size of the picture, e.g 1200
+
+        Returns:
+            Frame, None if failed
+
+        """
+        frame = self.screen_proxy.snapshot_frame(ensure_orientation=ensure_orientation)
+        if frame is not None and filename:
+            frame.save(filename, quality, max_size=max_size)
+        return frame
+
+    def wait_frame(self, newer_than, timeout):
+        """
+        Wait for a frame newer than `newer_than` from the frame pump (ST.SCREEN_FRAME_PUMP)
+
+        Args:
+            newer_than: sequence number of the last frame, see Frame.seq
+            timeout: seconds to wait
+
+        Returns:
+            True if a new frame arrived, False if timeout, None if the frame pump is not running
+
+        """
+        if self._screen_proxy is None or not self._screen_proxy.frame_seq:
+            return None
+        return self._screen_proxy.get_latest_frame(newer_than=newer_than, timeout=timeout) is not None
+
     def shell(self, *args, **kwargs):
         """
         Return `adb shell` interpreter
@@ -966,12 +1006,10 @@ class Android(Device):
 
         max_size = get_max_size(max_size)
         def get_frame():
+            # decoded by the recorder only when the frame is written
             data = self.screen_proxy.get_frame_from_stream()
-            frame = aircv.utils.string_2_img(data)
-
-            if max_size is not None:
-                frame = resize_by_max(frame, max_size)
-            return frame
+            transform = partial(resize_by_max, max_size=max_size) if max_size is not None else None
+            return self.screen_proxy.frame_class(data, transform=transform)
 
         self.recorder = ScreenRecorder(
             save_path, get_frame, fps=fps,
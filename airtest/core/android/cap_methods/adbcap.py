@@ -1,17 +1,204 @@
 # -*- coding: utf-8 -*-
+import struct
+import threading
 import warnings
+from functools import partial
+import numpy as np
 from airtest.core.android.cap_methods.base_cap import BaseCap
-from airtest.core.android.constant import SDK_VERISON_ANDROID7
+from airtest.core.android.constant import SDK_VERISON_ANDROID5, SDK_VERISON_ANDROID7
+from airtest.core.error import ScreenError
+from airtest.aircv.frame import RawFrame, SCREENCAP_FORMATS, screencap_2_img
+from airtest.aircv.utils import img_2_string
 from airtest import aircv
 
 
+class ScreencapShell(object):
+    """
+    A long-lived `adb shell sh` session which runs `screencap` (raw output, without -p) for each capture
+
+    Each capture is written as "screencap; echo END_MARK", the output is framed by the size in the raw header
+    and checked by the end mark, so no adb process is started per screenshot.
+    The session needs the shell protocol of Android 7.0+, whose output is not mangled by a pty.
+
+    Examples:
+        >>> shell = ScreencapShell(adb)
+        >>> buffer, size = shell.capture()
+        >>> img = aircv.frame.screencap_2_img(memoryview(buffer)[:size])
+        >>> shell.close()
+
+    """
+    END_MARK = b"--airtest-screencap-end--\n"
+
+    def __init__(self, adb):
+        self.adb = adb
+        self.proc = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.proc is None or self.proc.poll() is not None:
+            self.close()
+            self.proc = self.adb.start_cmd(["shell", "sh"])
+
+    def close(self):
+        if self.proc is not None:
+            proc, self.proc = self.proc, None
+            try:
+                proc.kill()
+                proc.wait()
+            except OSError:
+                pass
+            self.adb.close_proc_pipe(proc)
+
+    def capture(self, buffer=None):
+        """
+        Take a screenshot over the session, restarted if it was closed
+
+        Args:
+            buffer: writable buffer (e.g. numpy.uint8 array) to read the output into,
+                replaced by a larger one if it is too small
+
+        Raises:
+            ScreenError: if screencap fails or the session is broken, the session is closed
+
+        Returns:
+            (buffer, size), the raw screencap output, the same as ADB.screencap_raw
+
+        """
+        with self._lock:
+            self.start()
+            try:
+                return self._capture(buffer)
+            except ScreenError:
+                # the output may be out of sync, start over next time
+                self.close()
+                raise
+            except (IOError, OSError, ValueError) as e:
+                self.close()
+                raise ScreenError("screencap shell is broken: %r" % e)
+
+    def _capture(self, buffer):
+        cmd = "screencap -d %s" % self.adb.display_id if self.adb.display_id else "screencap"
+        self.proc.stdin.write(("%s; echo '%s'\n" % (cmd, self.END_MARK.decode().strip())).encode())
+        self.proc.stdin.flush()
+
+        header = self._read(12)
+        if self.END_MARK.startswith(header):
+            # screencap wrote nothing to stdout
+            self._read(len(self.END_MARK) - len(header))
+            raise ScreenError("screencap failed")
+        width, height, fmt = struct.unpack("<III", header)
+        if fmt not in SCREENCAP_FORMATS:
+            raise ScreenError("unknown screencap format %s" % fmt)
+        size = width * height * SCREENCAP_FORMATS[fmt][0]
+        # newer Android versions add one more field (colorspace) to the header
+        if buffer is None or len(buffer) < size + 16:
+            buffer = np.empty(size + 16, dtype=np.uint8)
+        view = memoryview(buffer)
+        view[:12] = header
+        self._read_into(view[12:12 + size])
+
+        tail = self._read(len(self.END_MARK))
+        if tail == self.END_MARK:
+            return buffer, 12 + size
+        # the header has the colorspace, so the first 4 bytes read as pixels were the colorspace,
+        # and the last 4 bytes of the pixels were read as the end mark
+        tail += self._read(4)
+        if tail[4:] != self.END_MARK:
+            raise ScreenError("bad screencap output")
+        view[12 + size:16 + size] = tail[:4]
+        return buffer, 16 + size
+
+    def _read(self, n):
+        data = bytearray(n)
+        self._read_into(memoryview(data))
+        return bytes(data)
+
+    def _read_into(self, view):
+        pos = 0
+        while pos < len(view):
+            n = self.proc.stdout.readinto(view[pos:])
+            if not n:
+                raise ScreenError("screencap shell closed: %r" % self.proc.stderr.read())
+            pos += n
+
+
 class AdbCap(BaseCap):
+    """
+    Screenshot by adb screencap
+
+    get_frame_from_stream() returns the png of `screencap -p`. snapshot(), snapshot_frame() and the frame pump read the raw
+    screencap output over a long-lived shell session (ScreencapShell) with Android 7.0+ instead,
+    otherwise a `screencap -p` process is started for each screenshot
+    """
+    frame_class = RawFrame
+
+    def __init__(self, adb, *args, **kwargs):
+        super(AdbCap, self).__init__(adb, *args, **kwargs)
+        self._shell = None
+        self._buffer = None
+
     def get_frame_from_stream(self):
+        """
+        Returns: png data
+        """
         warnings.warn("Currently using ADB screenshots, the efficiency may be very low.")
         return self.adb.snapshot()
 
+    def _get_frame_data(self):
+        """memoryview of the reused buffer holding the raw screencap output, or png data before Android 7.0"""
+        if self.adb.sdk_version >= SDK_VERISON_ANDROID7:
+            return self._capture_shell()
+        return self.get_frame_from_stream()
+
+    def _to_stream_data(self, data):
+        """png data of the raw screencap output from _get_frame_data"""
+        img = screencap_2_img(data)
+        # png data before Android 7.0
+        return img_2_string(img) if img is not None else data
+
+    def _capture_shell(self):
+        if self._shell is None:
+            self._shell = ScreencapShell(self.adb)
+        self._buffer, size = self._shell.capture(self._buffer)
+        return memoryview(self._buffer)[:size]
+
     def snapshot(self, ensure_orientation=True):
-        screen = super(AdbCap, self).snapshot()
+        return super(AdbCap, self).snapshot(ensure_orientation)
+
+    def frame_transform(self, ensure_orientation=True):
         if ensure_orientation and self.adb.sdk_version <= SDK_VERISON_ANDROID7:
-            screen = aircv.rotate(screen, self.adb.display_info["orientation"] * 90, clockwise=False)
-        return screen
+            return partial(aircv.rotate, angle=self.adb.display_info["orientation"] * 90, clockwise=False)
+        return None
+
+    def teardown_stream(self):
+        if self._shell is not None:
+            self._shell.close()
+            self._shell = None
+
+
+class RawCap(AdbCap):
+    """
+    Screenshot by the raw output of screencap (without -p), over the shell session of AdbCap,
+    or `adb exec-out screencap` before Android 7.0
+
+    The RGBA/RGB565 pixels are read into a reused buffer and converted to BGR, no png/jpg codec on either side,
+    which costs more bandwidth but much less cpu, suitable for devices connected by USB
+    """
+
+    def get_frame_from_stream(self):
+        """
+        Returns: the raw screencap output (header + pixels), see aircv.frame.screencap_2_img
+        """
+        return bytes(self._get_frame_data())
+
+    def _to_stream_data(self, data):
+        return bytes(data)
+
+    def _get_frame_data(self):
+        """memoryview of the reused buffer holding the raw screencap output"""
+        if self.adb.sdk_version >= SDK_VERISON_ANDROID7:
+            return self._capture_shell()
+        if self.adb.sdk_version < SDK_VERISON_ANDROID5:
+            raise ScreenError("RAWCAP needs `adb exec-out`, which is not supported before Android 5.0")
+        self._buffer, size = self.adb.screencap_raw(self._buffer)
+        return memoryview(self._buffer)[:size]
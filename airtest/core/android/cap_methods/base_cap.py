@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import traceback
-from airtest import aircv
+from airtest.aircv.frame import Frame
 
 
 class BaseCap(object):
@@ -8,6 +8,11 @@ class BaseCap(object):
     Base class for all screenshot methods
     所有屏幕截图方法的基类
     """
+    # class of the frames from get_frame_from_stream, which decodes the frame data
+    frame_class = Frame
+    # min seconds between two captures of the frame pump (ScreenProxy.start_frame_pump),
+    # each get_frame_from_stream() captures a new frame unless the method streams frames as the screen changes
+    FRAME_PUMP_INTERVAL = 0.2
 
     def __init__(self, adb, *args, **kwargs):
         self.adb = adb
@@ -23,6 +28,20 @@ class BaseCap(object):
         """
         raise NotImplementedError
 
+    def _get_frame_data(self):
+        """
+        Frame data to be decoded right away, may be a memoryview reusing the stream buffer,
+        which is overwritten by later frames
+        """
+        return self.get_frame_from_stream()
+
+    def _to_stream_data(self, data):
+        """
+        Convert the (copied) data of _get_frame_data into the format of get_frame_from_stream,
+        e.g. the frames of ScreenProxy.start_frame_pump
+        """
+        return data
+
     def get_frame(self):
         # 获得单张屏幕截图
         return self.get_frame_from_stream()
@@ -39,11 +58,52 @@ class BaseCap(object):
         Returns: numpy.ndarray
 
         """
-        screen = self.get_frame_from_stream()
+        screen = self._get_frame_data()
+        return self.frame_to_img(screen, ensure_orientation)
+
+    def snapshot_frame(self, ensure_orientation=True):
+        """
+        Take a screenshot without decoding it
+
+        获取一张未解码的屏幕截图，在读取像素时才会解码
+
+        Returns: :py:class:`airtest.aircv.frame.Frame`, None if failed
+
+        """
+        data = self._get_frame_data()
+        if data is None:
+            return None
+        return self.frame_class(data, transform=self.frame_transform(ensure_orientation))
+
+    def frame_transform(self, ensure_orientation=True):
+        """
+        Function applied to the decoded frame before returning it, e.g. rotation
+
+        Returns: function or None
+
+        """
+        return None
+
+    def frame_to_img(self, frame, ensure_orientation=True):
+        """
+        Convert the frame data from the stream into a cv2 image object
+
+        将画面流中的一帧数据转化成cv2的图像对象
+
+        Args:
+            frame: frame data returned by get_frame_from_stream
+            ensure_orientation: True or False whether to keep the orientation same as display
+
+        Returns: numpy.ndarray, None if failed
+
+        """
         try:
-            screen = aircv.utils.string_2_img(screen)
+            screen = self.frame_class.decode_data(frame)
         except Exception:
             # may be black/locked screen or other reason, print exc for debugging
             traceback.print_exc()
             return None
+        transform = self.frame_transform(ensure_orientation)
+        if screen is not None and transform is not None:
+            screen = transform(screen)
         return screen
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import time
+import threading
+from collections import namedtuple
+from airtest.utils.logger import get_logger
+
+
+LOGGING = get_logger(__name__)
+
+# data: raw frame data (bytes), seq: monotonic sequence number starting from 1, timestamp: capture time
+LatestFrame = namedtuple("LatestFrame", ["data", "seq", "timestamp"])
+
+
+class FramePump(object):
+    """
+    Keep draining the screen stream in a daemon thread, only the latest frame is kept
+
+    在后台线程中持续读取屏幕画面流，只保留最新的一帧，使截图无需等待一次完整的读取
+
+    Examples:
+        >>> pump = FramePump(minicap.get_frame_from_stream)
+        >>> pump.start()
+        >>> frame = pump.get_latest()
+        >>> newer = pump.get_latest(newer_than=frame.seq)
+        >>> pump.stop()
+
+    """
+    # seconds to wait for a frame in get_latest
+    TIMEOUT = 10
+    # seconds to sleep after a failed capture
+    ERROR_INTERVAL = 0.5
+    # stop pumping after so many consecutive failures
+    MAX_ERRORS = 10
+
+    def __init__(self, get_frame_func, name="frame_pump", interval=0):
+        """
+        Args:
+            get_frame_func: function returning the next frame of the stream, which is only called by the pump thread
+            name: name of the thread
+            interval: min seconds between two captures, for methods capturing a frame on each call (e.g. screencap)
+                instead of streams pushing frames as the screen changes
+
+        """
+        self.get_frame_func = get_frame_func
+        self.name = name
+        self.interval = interval
+        self._latest = None
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def seq(self):
+        """sequence number of the latest frame, 0 if no frame has been received"""
+        latest = self._latest
+        return latest.seq if latest else 0
+
+    def start(self):
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._pump, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """
+        Stop the pump thread
+
+        Returns:
+            True if the thread has exited, False if it is still reading a frame after timeout
+
+        """
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                LOGGING.warning("%s is still running after %ss" % (self.name, timeout))
+                return False
+        self._thread = None
+        return True
+
+    def _pump(self):
+        errors = 0
+        seq = self.seq
+        while not self._stop_event.is_set():
+            start = time.time()
+            try:
+                data = self.get_frame_func()
+            except Exception as e:
+                errors += 1
+                LOGGING.error("%s capture failed: %r" % (self.name, e))
+                if errors >= self.MAX_ERRORS:
+                    LOGGING.error("%s stopped after %s errors" % (self.name, errors))
+                    break
+                self._stop_event.wait(self.ERROR_INTERVAL)
+                continue
+            errors = 0
+            if data is not None:
+                if isinstance(data, memoryview):
+                    # the stream reuses its buffer for later frames
+                    data = data.tobytes()
+                seq += 1
+                with self._cond:
+                    self._latest = LatestFrame(data, seq, time.time())
+                    self._cond.notify_all()
+            # else: stream timeout, the screen may be locked
+            if self.interval:
+                self._stop_event.wait(self.interval - (time.time() - start))
+        with self._cond:
+            self._cond.notify_all()
+
+    def get_latest(self, newer_than=None, timeout=None):
+        """
+        Get the latest frame
+
+        Args:
+            newer_than: wait until the sequence number of the frame is greater than this one
+            timeout: seconds to wait, default is FramePump.TIMEOUT
+
+        Returns:
+            LatestFrame, or None if timeout or the pump is stopped
+
+        """
+        min_seq = newer_than or 0
+        timeout = self.TIMEOUT if timeout is None else timeout
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._latest is None or self._latest.seq <= min_seq:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self.running:
+                    return None
+                self._cond.wait(remaining)
+            return self._latest
@@ -96,7 +96,8 @@ class Javacap(Yosemite, BaseCap):
                 stopping = yield None
             else:
                 frame_size = struct.unpack("<I", header)[0]
-                frame_data = s.recv(frame_size)
+                # frame_data is a memoryview of the socket buffer, it is overwritten by later frames
+                frame_data = s.recv_view(frame_size)
                 stopping = yield frame_data
 
         LOGGING.debug("javacap stream ends")
@@ -110,6 +111,11 @@ class Javacap(Yosemite, BaseCap):
             frame
 
         """
+        frame = self._get_frame_data()
+        return bytes(frame) if frame is not None else None
+
+    def _get_frame_data(self):
+        """one frame from the stream, a memoryview reusing the stream buffer"""
         if self.frame_gen is None:
             self.frame_gen = self.get_frames()
         return self.frame_gen.send(None)
@@ -39,6 +39,8 @@ class Minicap(BaseCap):
 
     VERSION = 5
     RECVTIMEOUT = 3  # default value is None, but the version above 1.2.7 is changed to 3s
+    # minicap pushes frames as the screen changes, the frame pump just waits for them
+    FRAME_PUMP_INTERVAL = 0
     CMD = "LD_LIBRARY_PATH=/data/local/tmp /data/local/tmp/minicap"
 
     def __init__(self, adb, projection=None, rotation_watcher=None, display_id=None, ori_function=None):
@@ -278,10 +280,11 @@ class Minicap(BaseCap):
                 stopping = yield None
             else:
                 frame_size = struct.unpack("<I", header)[0]
+                # frame_data is a memoryview of the socket buffer, it is overwritten by later frames
                 if self.RECVTIMEOUT is not None:
-                    frame_data = s.recv_with_timeout(frame_size, self.RECVTIMEOUT)
+                    frame_data = s.recv_with_timeout(frame_size, self.RECVTIMEOUT, as_view=True)
                 else:
-                    frame_data = s.recv(frame_size)
+                    frame_data = s.recv_view(frame_size)
                 stopping = yield frame_data
 
         LOGGING.debug("minicap stream ends")
@@ -332,7 +335,6 @@ class Minicap(BaseCap):
         self._stream_rotation = int(display_info["rotation"])
         return proc, nbsp, localport
 
-    @retry_when_socket_error
     def get_frame_from_stream(self):
         """
         Get one frame from minicap stream
@@ -341,6 +343,12 @@ class Minicap(BaseCap):
             frame
 
         """
+        frame = self._get_frame_data()
+        return bytes(frame) if frame is not None else None
+
+    @retry_when_socket_error
+    def _get_frame_data(self):
+        """one frame from minicap stream, a memoryview reusing the stream buffer"""
         if self._update_rotation_event.is_set():
             LOGGING.debug("do update rotation")
             self.teardown_stream()
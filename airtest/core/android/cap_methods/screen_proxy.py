@@ -2,6 +2,7 @@
 from collections import OrderedDict
 from airtest.core.error import AdbError, ScreenError
 from airtest.core.android.cap_methods.base_cap import BaseCap
+from airtest.core.android.cap_methods.frame_pump import FramePump
 from airtest.utils.logger import get_logger
 
 
@@ -13,6 +14,10 @@ class ScreenProxy(object):
     Perform screen operation according to the specified method
     """
     SCREEN_METHODS = OrderedDict()
+    # methods that auto_setup only uses as default_method, never as a fallback
+    OPT_IN_METHODS = {"RAWCAP"}
+    # set by start_frame_pump
+    frame_pump = None
 
     def __init__(self, screen_method):
         self.screen_method = screen_method
@@ -27,11 +32,135 @@ class ScreenProxy(object):
                                       (getattr(self.screen_method, "METHOD_NAME", ""), name))
 
     def __setattr__(self, name, value):
-        if name == "screen_method":
+        if name in ("screen_method", "frame_pump"):
             object.__setattr__(self, name, value)
         else:
             object.__setattr__(self.screen_method, name, value)
 
+    def start_frame_pump(self):
+        """
+        Keep reading the screen stream in a background thread, snapshot() then returns the latest frame immediately
+
+        在后台线程中持续读取屏幕画面流，之后snapshot()会立即返回最新的一帧画面
+
+        Returns:
+            FramePump object
+
+        Examples:
+            >>> screen_proxy.start_frame_pump()
+            >>> seq = screen_proxy.frame_seq
+            >>> dev.touch((100, 100))
+            >>> img = screen_proxy.snapshot(newer_than=seq)  # wait for a frame captured after touch
+
+        """
+        if self.frame_pump is None:
+            # e.g. the raw screencap of ADBCAP rather than its png, see get_frame_from_stream
+            self.frame_pump = FramePump(self.screen_method._get_frame_data,
+                                        name="%s_frame_pump" % self.method_name.lower(),
+                                        interval=getattr(self.screen_method, "FRAME_PUMP_INTERVAL", 0))
+        self.frame_pump.start()
+        return self.frame_pump
+
+    def stop_frame_pump(self):
+        if self.frame_pump is not None:
+            self.frame_pump.stop()
+            self.frame_pump = None
+
+    @property
+    def frame_seq(self):
+        """sequence number of the latest frame from the frame pump, 0 if the frame pump is not running"""
+        return self.frame_pump.seq if self.frame_pump is not None else 0
+
+    def _pumping(self):
+        return self.frame_pump is not None and self.frame_pump.running
+
+    def _without_pump(self, func, *args, **kwargs):
+        """
+        Call func of the screen method with the frame pump paused, since only the pump thread may read the stream
+        """
+        if not self.frame_pump.stop():
+            raise ScreenError("the frame pump is still reading the screen stream")
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.frame_pump.start()
+
+    def get_latest_frame(self, newer_than=None, timeout=None):
+        """
+        Get the latest frame from the frame pump
+
+        Args:
+            newer_than: wait for a frame whose sequence number is greater than this one
+            timeout: seconds to wait
+
+        Returns:
+            LatestFrame(data, seq, timestamp), None if timeout or the frame pump is not running
+
+        """
+        if not self._pumping():
+            return None
+        return self.frame_pump.get_latest(newer_than=newer_than, timeout=timeout)
+
+    def get_frame_from_stream(self):
+        """
+        Get a frame of the current screen, the latest frame if the frame pump is running
+
+        Returns: frame_data, None if the frame pump gets no frame in time
+
+        """
+        if self._pumping():
+            frame = self.frame_pump.get_latest()
+            return self.screen_method._to_stream_data(frame.data) if frame is not None else None
+        return self.screen_method.get_frame_from_stream()
+
+    def get_frame(self, *args, **kwargs):
+        if self._pumping():
+            if args or kwargs:
+                return self._without_pump(self.screen_method.get_frame, *args, **kwargs)
+            return self.get_frame_from_stream()
+        return self.screen_method.get_frame(*args, **kwargs)
+
+    def snapshot(self, ensure_orientation=True, newer_than=None, timeout=None, *args, **kwargs):
+        """
+        Take a screenshot, the latest frame is used directly if the frame pump is running
+
+        Args:
+            ensure_orientation: True or False whether to keep the orientation same as display
+            newer_than: frame pump only, wait for a frame whose sequence number is greater than this one
+            timeout: frame pump only, seconds to wait for the frame
+
+        Returns: numpy.ndarray, None if failed, or the frame pump gets no frame in time
+
+        """
+        if self._pumping():
+            if args or kwargs:
+                # e.g. minicap projection, which the pumped frames cannot serve
+                return self._without_pump(self.screen_method.snapshot, ensure_orientation, *args, **kwargs)
+            frame = self.frame_pump.get_latest(newer_than=newer_than, timeout=timeout)
+            if frame is None:
+                return None
+            return self.screen_method.frame_to_img(frame.data, ensure_orientation)
+        return self.screen_method.snapshot(ensure_orientation, *args, **kwargs)
+
+    def snapshot_frame(self, ensure_orientation=True, newer_than=None, timeout=None):
+        """
+        Take a screenshot as a lazily decoded Frame, see snapshot()
+
+        Returns: :py:class:`airtest.aircv.frame.Frame`, None if failed, or the frame pump gets no frame in time
+
+        """
+        if self._pumping():
+            frame = self.frame_pump.get_latest(newer_than=newer_than, timeout=timeout)
+            if frame is None:
+                return None
+            return self.screen_method.frame_class(frame.data, seq=frame.seq, timestamp=frame.timestamp,
+                                                  transform=self.screen_method.frame_transform(ensure_orientation))
+        return self.screen_method.snapshot_frame(ensure_orientation)
+
+    def teardown_stream(self):
+        self.stop_frame_pump()
+        self.screen_method.teardown_stream()
+
     @classmethod
     def register_method(cls, name, method_class):
         cls.SCREEN_METHODS[name] = method_class
@@ -72,6 +201,9 @@ class ScreenProxy(object):
 
         Custom method 自定义方法 > MINICAP > JAVACAP > ADBCAP
 
+        RAWCAP (raw pixels of `screencap`, no png/jpg encoding) is only used if it is the default_method (see OPT_IN_METHODS),
+        it costs more bandwidth but less cpu, suitable for devices connected by USB
+
         Args:
             adb: :py:mod:`airtest.core.android.adb.ADB`
             default_method: String such as "MINICAP", or :py:mod:`airtest.core.android.cap_methods.minicap.Minicap` object
@@ -86,20 +218,25 @@ class ScreenProxy(object):
 
         """
         screen = None
+        default_name = default_method.upper() if isinstance(default_method, str) else None
         if default_method:
-            if isinstance(default_method, str) and default_method.upper() in cls.SCREEN_METHODS:
-                screen = cls.SCREEN_METHODS[default_method.upper()](adb, *args, **kwargs)
+            if default_name in cls.SCREEN_METHODS:
+                screen = cls.SCREEN_METHODS[default_name](adb, *args, **kwargs)
             elif isinstance(default_method, BaseCap):
                 screen = default_method
-            if screen and cls.check_frame(screen):
-                return ScreenProxy(screen)
+            if screen:
+                if cls.check_frame(screen):
+                    return ScreenProxy(screen)
+                # e.g. the shell session of ADBCAP/RAWCAP
+                screen.teardown_stream()
         # 从self.SCREEN_METHODS中，逆序取出可用的方法
         for name, screen_class in reversed(cls.SCREEN_METHODS.items()):
-            if name == default_method:
+            if name == default_name or name in cls.OPT_IN_METHODS:
                 continue
             screen = screen_class(adb, *args, **kwargs)
             if cls.check_frame(screen):
                 return ScreenProxy(screen)
+            screen.teardown_stream()
         # 如果没有找到任何可用方法，抛出异常（但是至少adbcap是可用的）
         raise ScreenError("No available screen capture method found")
 
@@ -108,7 +245,8 @@ def register_screen():
     # 按优先级逆序注册默认的屏幕截图方法
     from airtest.core.android.cap_methods.minicap import Minicap
     from airtest.core.android.cap_methods.javacap import Javacap
-    from airtest.core.android.cap_methods.adbcap import AdbCap
+    from airtest.core.android.cap_methods.adbcap import AdbCap, RawCap
+    ScreenProxy.SCREEN_METHODS["RAWCAP"] = RawCap
     ScreenProxy.SCREEN_METHODS["ADBCAP"] = AdbCap
     ScreenProxy.SCREEN_METHODS["JAVACAP"] = Javacap
     ScreenProxy.SCREEN_METHODS["MINICAP"] = Minicap
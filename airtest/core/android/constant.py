@@ -15,6 +15,8 @@ DEFAULT_ADB_PATH = {
     "Linux-armv7l": os.path.join(STATICPATH, "adb", "linux_arm", "adb"),
 }
 DEFAULT_ADB_SERVER = ('127.0.0.1', 5037)
+# Android 5.0 SDK version, `adb exec-out` is available since it
+SDK_VERISON_ANDROID5 = 21
 SDK_VERISON_ANDROID7 = 24
 # Android 10 SDK version
 SDK_VERISON_ANDROID10 = 29
@@ -34,6 +36,7 @@ class CAP_METHOD(object):
     MINICAP = "MINICAP"
     ADBCAP = "ADBCAP"
     JAVACAP = "JAVACAP"
+    RAWCAP = "RAWCAP"
 
 
 class TOUCH_METHOD(object):
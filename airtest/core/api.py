@@ -5,7 +5,7 @@ This module contains the Airtest Core APIs.
 import os
 import time
 
-from airtest.core.cv import Template, loop_find, try_log_screen
+from airtest.core.cv import Template, loop_find, loop_find_any, try_log_screen
 from airtest.core.error import TargetNotFoundError
 from airtest.core.settings import Settings as ST
 from airtest.utils.compat import script_log_dir
@@ -646,6 +646,39 @@ def exists(v):
         return pos
 
 
+@logwrap
+def find_any(v_list, timeout=None, best=False):
+    """
+    Check which of the given targets exists on device screen, all targets are matched against the same screenshot
+
+    :param v_list: list of targets to be checked
+    :param timeout: time interval to look for the targets, default is None which is ``ST.FIND_TIMEOUT_TMP``
+    :param best: False to return the first target in ``v_list`` which is found, True to return the one with the highest confidence
+    :return: False if none of the targets is found, otherwise returns (index of the target in ``v_list``, coordinates of the target)
+    :platforms: Android, Windows, iOS
+    :Example:
+
+        Instead of ``if exists(A): ... elif exists(B): ...``, which takes a screenshot for each target::
+
+        >>> ret = find_any([Template(r"tpl1606822430589.png"), Template(r"tpl1606822430590.png")])
+        >>> if ret:
+        >>>     index, pos = ret
+        >>>     touch(pos)
+
+        The templates can be matched in a thread pool::
+
+        >>> ST.FIND_ANY_WORKERS = 4
+
+    """
+    timeout = timeout or ST.FIND_TIMEOUT_TMP
+    try:
+        ret = loop_find_any(v_list, timeout=timeout, best=best)
+    except TargetNotFoundError:
+        return False
+    else:
+        return ret
+
+
 @logwrap
 def find_all(v):
     """
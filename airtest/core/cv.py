@@ -9,6 +9,7 @@ import time
 import types
 from six import PY3
 from copy import deepcopy
+from concurrent.futures import wait, FIRST_COMPLETED
 
 from airtest import aircv
 from airtest.aircv import cv2
@@ -16,14 +17,22 @@ from airtest.core.helper import G, logwrap
 from airtest.core.settings import Settings as ST  # noqa
 from airtest.core.error import TargetNotFoundError, InvalidMatchingMethodError
 from airtest.utils.transform import TargetPos
+from airtest.utils.lru import LRUCache
+from airtest.utils.snippet import get_executor
+from airtest.aircv.frame import Frame, frame_diff
+from airtest.aircv.screen_context import ScreenContext, as_screen_context
+from airtest.core.match_stats import MATCH_STATS
 
 from airtest.aircv.template_matching import TemplateMatching
+from airtest.aircv.pyramid_template_matching import PyramidTemplateMatching
 from airtest.aircv.multiscale_template_matching import MultiScaleTemplateMatching,MultiScaleTemplateMatchingPre
+from airtest.aircv.keypoint_base import KeypointMatching
 from airtest.aircv.keypoint_matching import KAZEMatching, BRISKMatching, AKAZEMatching, ORBMatching
 from airtest.aircv.keypoint_matching_contrib import SIFTMatching, SURFMatching, BRIEFMatching
 
 MATCHING_METHODS = {
     "tpl": TemplateMatching,
+    "ptpl": PyramidTemplateMatching,
     "mstpl": MultiScaleTemplateMatchingPre,
     "gmstpl": MultiScaleTemplateMatching,
     "kaze": KAZEMatching,
@@ -35,6 +44,9 @@ MATCHING_METHODS = {
     "brief": BRIEFMatching,
 }
 
+# decoded and resized template images shared by all Template objects, see Template._get_template_image
+TEMPLATE_CACHE = LRUCache(maxsize=ST.TEMPLATE_CACHE_SIZE)
+
 
 @logwrap
 def loop_find(query, timeout=ST.FIND_TIMEOUT, threshold=None, interval=0.5, intervalfunc=None):
@@ -45,7 +57,8 @@ def loop_find(query, timeout=ST.FIND_TIMEOUT, threshold=None, interval=0.5, inte
         query: image template to be found in screenshot
         timeout: time interval how long to look for the image template
         threshold: default is None
-        interval: sleep interval before next attempt to find the image template
+        interval: sleep interval before next attempt to find the image template, adjusted by AdaptivePoller
+            if ST.ADAPTIVE_POLL is True
         intervalfunc: function that is executed after unsuccessful attempt to find the image template
 
     Raises:
@@ -58,11 +71,16 @@ def loop_find(query, timeout=ST.FIND_TIMEOUT, threshold=None, interval=0.5, inte
     """
     G.LOGGING.info("Try finding: %s", query)
     start_time = time.time()
+    poller = AdaptivePoller(interval) if ST.ADAPTIVE_POLL else None
     while True:
-        screen = G.DEVICE.snapshot(filename=None, quality=ST.SNAPSHOT_QUALITY)
+        # the frame is decoded once for matching, and its raw jpg may be logged without re-encoding
+        screen = G.DEVICE.snapshot_frame(filename=None, quality=ST.SNAPSHOT_QUALITY)
 
         if screen is None:
             G.LOGGING.warning("Screen is None, may be locked")
+        elif poller and not poller.changed(screen):
+            # the same screen as the last attempt, it cannot match either
+            pass
         else:
             if threshold:
                 query.threshold = threshold
@@ -78,17 +96,197 @@ def loop_find(query, timeout=ST.FIND_TIMEOUT, threshold=None, interval=0.5, inte
         if (time.time() - start_time) > timeout:
             try_log_screen(screen)
             raise TargetNotFoundError('Picture %s not found in screen' % query)
+        elif poller:
+            poller.wait(start_time + timeout - time.time())
+        else:
+            time.sleep(interval)
+
+
+@logwrap
+def loop_find_any(queries, timeout=ST.FIND_TIMEOUT, threshold=None, interval=0.5, intervalfunc=None, best=False):
+    """
+    Search for any of the image templates in the screen until timeout
+
+    One screenshot is taken for each attempt and all templates are matched against it
+
+    Args:
+        queries: list of image templates to be found in screenshot
+        timeout: time interval how long to look for the image templates
+        threshold: default is None
+        interval: sleep interval before next attempt to find the image templates, see loop_find
+        intervalfunc: function that is executed after unsuccessful attempt to find the image templates
+        best: False to return the first template in `queries` which is found, True to return the one with the highest confidence
+
+    Raises:
+        TargetNotFoundError: when none of the image templates is found in screenshot
+
+    Returns:
+        (index of the found template in `queries`, position where the image template has been found in screenshot)
+
+    """
+    G.LOGGING.info("Try finding any of: %s", queries)
+    start_time = time.time()
+    poller = AdaptivePoller(interval) if ST.ADAPTIVE_POLL else None
+    while True:
+        screen = G.DEVICE.snapshot_frame(filename=None, quality=ST.SNAPSHOT_QUALITY)
+
+        if screen is None:
+            G.LOGGING.warning("Screen is None, may be locked")
+        elif poller and not poller.changed(screen):
+            pass
+        else:
+            if threshold:
+                for query in queries:
+                    query.threshold = threshold
+            ret = match_many(queries, screen, best=best)
+            if ret:
+                try_log_screen(screen)
+                return ret
+
+        if intervalfunc is not None:
+            intervalfunc()
+
+        # 超时则raise，未超时则进行下次循环:
+        if (time.time() - start_time) > timeout:
+            try_log_screen(screen)
+            raise TargetNotFoundError('None of the pictures %s found in screen' % queries)
+        elif poller:
+            poller.wait(start_time + timeout - time.time())
         else:
             time.sleep(interval)
 
 
+def match_many(queries, screen, best=False, max_workers=None):
+    """
+    Match several image templates against one screenshot
+
+    The screenshot is decoded and converted (gray, keypoints ...) once and shared by all templates
+
+    Args:
+        queries: list of image templates
+        screen: screenshot, numpy.ndarray or :py:class:`airtest.aircv.frame.Frame`
+        best: False to return the first template in `queries` which is found, True to return the one with the highest confidence
+        max_workers: match the templates in a thread pool if > 1, default is ST.FIND_ANY_WORKERS
+
+    Returns:
+        (index of the found template in `queries`, focus position), None if none of the templates is found
+
+    """
+    if not isinstance(screen, (Frame, ScreenContext)):
+        screen = ScreenContext(screen)
+    if max_workers is None:
+        max_workers = ST.FIND_ANY_WORKERS
+
+    if max_workers > 1 and len(queries) > 1:
+        futures = [get_executor(max_workers, "match_many").submit(query._cv_match, screen) for query in queries]
+        results = (future.result() for future in futures)
+    else:
+        futures = []
+        results = (query._cv_match(screen) for query in queries)
+
+    found = None
+    for index, ret in enumerate(results):
+        if not ret:
+            continue
+        if found is None or ret.get("confidence", 0) > found[1].get("confidence", 0):
+            found = (index, ret)
+        if not best:
+            break
+    for future in futures:
+        future.cancel()
+    if found is None:
+        return None
+    index, ret = found
+    G.LOGGING.debug("match result of %s: %s", queries[index], ret)
+    return index, TargetPos().getXY(ret, queries[index].target_pos)
+
+
+class AdaptivePoller(object):
+    """
+    Polling policy of loop_find
+
+    - a screen which is the same as the last matched one (same frame seq, or thumbnails differ by less than
+      ST.FRAME_DIFF_THRESHOLD) is not matched again
+    - poll every ST.POLL_FAST_INTERVAL seconds within ST.POLL_FAST_WINDOW seconds after a touch/swipe/keyevent/text
+    - the interval doubles while the screen stays static, up to ST.POLL_MAX_INTERVAL, and is reset when it changes
+    - if the device has a frame pump, wait for the next frame instead of sleeping
+
+    Examples:
+        >>> poller = AdaptivePoller(0.5)
+        >>> while True:
+        >>>     frame = G.DEVICE.snapshot_frame()
+        >>>     if poller.changed(frame) and query.match_in(frame):
+        >>>         break
+        >>>     poller.wait(remaining_time)
+
+    """
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.delay = interval
+        # seq of the last changed frame and of the last frame seen
+        self._seq = None
+        self._last_seq = None
+        self._thumbnail = None
+
+    def changed(self, frame):
+        """
+        Whether the frame differs from the last changed frame, and adjust the polling interval
+
+        Args:
+            frame: :py:class:`airtest.aircv.frame.Frame`
+
+        Returns:
+            True if the frame should be matched
+
+        """
+        self._last_seq = frame.seq
+        if frame.seq is not None and frame.seq == self._seq:
+            changed = False
+        else:
+            thumbnail = frame.thumbnail
+            changed = (thumbnail is None or self._thumbnail is None or
+                       frame_diff(thumbnail, self._thumbnail) >= ST.FRAME_DIFF_THRESHOLD)
+            if changed:
+                # compare with the last changed frame, so that a slow transition is still noticed
+                self._seq, self._thumbnail = frame.seq, thumbnail
+        if changed:
+            self.delay = self.interval
+        else:
+            self.delay = min(self.delay * 2, max(ST.POLL_MAX_INTERVAL, self.interval))
+        return changed
+
+    def next_delay(self):
+        """seconds to wait before the next attempt"""
+        if time.time() - G.LAST_INPUT_TIME < ST.POLL_FAST_WINDOW:
+            return min(self.delay, ST.POLL_FAST_INTERVAL)
+        return self.delay
+
+    def wait(self, remaining=None):
+        """
+        Wait for the next attempt, return early if the device has a frame pump and a new frame arrives
+
+        Args:
+            remaining: seconds until timeout, do not wait longer than it
+
+        """
+        delay = self.next_delay()
+        if remaining is not None:
+            delay = max(min(delay, remaining), 0)
+        start = time.time()
+        if self._last_seq is not None and G.DEVICE.wait_frame(self._last_seq, delay):
+            # a new frame arrived, but do not poll faster than POLL_FAST_INTERVAL on animated screens
+            delay = min(delay, ST.POLL_FAST_INTERVAL)
+        time.sleep(max(delay - (time.time() - start), 0))
+
+
 @logwrap
 def try_log_screen(screen=None, quality=None, max_size=None):
     """
     Save screenshot to file
 
     Args:
-        screen: screenshot to be saved
+        screen: screenshot to be saved, numpy.ndarray or :py:class:`airtest.aircv.frame.Frame`
         quality: The image quality, default is ST.SNAPSHOT_QUALITY
         max_size: the maximum size of the picture, e.g 1200
 
@@ -106,7 +304,10 @@ def try_log_screen(screen=None, quality=None, max_size=None):
         screen = G.DEVICE.snapshot(quality=quality)
     filename = "%(time)d.jpg" % {'time': time.time() * 1000}
     filepath = os.path.join(ST.LOG_DIR, filename)
-    if screen is not None:
+    if isinstance(screen, Frame):
+        if screen.save(filepath, quality, max_size=max_size):
+            return {"screen": filename, "resolution": screen.resolution}
+    elif screen is not None:
         aircv.imwrite(filepath, screen, quality, max_size=max_size)
         return {"screen": filename, "resolution": aircv.get_resolution(screen)}
     return None
@@ -122,9 +323,11 @@ class Template(object):
     rgb: 识别结果是否使用rgb三通道进行校验.
     scale_max: 多尺度模板匹配最大范围.
     scale_step: 多尺度模板匹配搜索步长.
+    predict_roi: 是否先在record_pos预测的区域内查找, None则使用ST.PREDICT_ROI.
     """
 
-    def __init__(self, filename, threshold=None, target_pos=TargetPos.MID, record_pos=None, resolution=(), rgb=False, scale_max=800, scale_step=0.005):
+    def __init__(self, filename, threshold=None, target_pos=TargetPos.MID, record_pos=None, resolution=(), rgb=False, scale_max=800, scale_step=0.005,
+                 predict_roi=None):
         self.filename = filename
         self._filepath = None
         self.threshold = threshold or ST.THRESHOLD
@@ -134,6 +337,7 @@ class Template(object):
         self.rgb = rgb
         self.scale_max = scale_max
         self.scale_step = scale_step
+        self.predict_roi = predict_roi
 
     @property
     def filepath(self):
@@ -159,31 +363,185 @@ class Template(object):
         return focus_pos
 
     def match_all_in(self, screen):
-        image = self._imread()
-        image = self._resize_image(image, screen, ST.RESIZE_METHOD)
+        if isinstance(screen, Frame):
+            screen = screen.img
+        image = self._get_template_image(screen).resized
         return self._find_all_template(image, screen)
 
     @logwrap
     def _cv_match(self, screen):
+        # screen can be a Frame, which may be decoded in reduced size, see ST.MATCH_REDUCE_FACTOR
+        screen, ratio = self._get_match_screen(screen)
+        if screen is None:
+            return None
+        ret = self._cv_match_in(screen, reduce_factor=ratio[2])
+        if ret and ratio[:2] != (1, 1):
+            ret = self._map_result(ret, ratio[0], ratio[1])
+        return ret
+
+    @staticmethod
+    def _get_match_screen(screen):
+        """
+        Get the screen image for matching
+
+        Returns:
+            screen image or ScreenContext shared by all templates matched against the frame,
+            (x ratio, y ratio, reduce_factor) of the full screen to the image
+
+        """
+        if not isinstance(screen, Frame):
+            return screen, (1, 1, 1)
+        reduce_factor = ST.MATCH_REDUCE_FACTOR
+        if reduce_factor == 1 or screen.decoded or screen.data is None or screen.transform is not None:
+            return screen.context(), (1, 1, 1)
+        resolution = screen.resolution
+        context = screen.context(reduce_factor)
+        if context is None or resolution is None:
+            return context, (1, 1, 1)
+        w, h = aircv.get_resolution(context.img)
+        return context, (resolution[0] / w, resolution[1] / h, reduce_factor)
+
+    @staticmethod
+    def _map_result(ret, x_ratio, y_ratio):
+        """map the match result in the reduced screen back to the full screen"""
+        ret = deepcopy(ret)
+        ret["result"] = (ret["result"][0] * x_ratio, ret["result"][1] * y_ratio)
+        if "rectangle" in ret:
+            ret["rectangle"] = [(x * x_ratio, y * y_ratio) for x, y in ret["rectangle"]]
+        return ret
+
+    def _cv_match_in(self, screen, reduce_factor=1):
+        # the gray/keypoints of the screen are computed once and shared by all methods in CVSTRATEGY
+        screen = as_screen_context(screen)
         # in case image file not exist in current directory:
-        ori_image = self._imread()
-        image = self._resize_image(ori_image, screen, ST.RESIZE_METHOD)
-        ret = None
-        for method in ST.CVSTRATEGY:
-            # get function definition and execute:
-            func = MATCHING_METHODS.get(method, None)
-            if func is None:
-                raise InvalidMatchingMethodError("Undefined method in CVSTRATEGY: '%s', try 'kaze'/'brisk'/'akaze'/'orb'/'surf'/'sift'/'brief' instead." % method)
+        template_image = self._get_template_image(screen.img, reduce_factor)
+        # with record_pos, search the predicted area, then the expanded area, then the full screen
+        areas = self._get_search_areas(screen, template_image.resized)
+        stats, methods = None, ST.CVSTRATEGY
+        if ST.LEARN_STRATEGY:
+            # try the methods which found the template before first, around the position of the last hit
+            stats = MATCH_STATS.get(template_image.image)
+            methods = stats.sort_methods(methods)
+            last_hit_area = stats.last_hit_area(aircv.get_resolution(screen.img), aircv.get_resolution(template_image.resized),
+                                                Predictor.DEVIATION)
+            if last_hit_area and last_hit_area not in areas:
+                areas = [last_hit_area] + areas
+        for area in areas:
+            if area is None:
+                ret = self._match_strategies(screen, template_image, self.record_pos, self.resolution, methods, stats)
             else:
-                if method in ["mstpl", "gmstpl"]:
-                    ret = self._try_match(func, ori_image, screen, threshold=self.threshold, rgb=self.rgb, record_pos=self.record_pos,
-                                            resolution=self.resolution, scale_max=self.scale_max, scale_step=self.scale_step)
-                else:
-                    ret = self._try_match(func, image, screen, threshold=self.threshold, rgb=self.rgb)
+                ret = self._match_in_area(screen, template_image, area, methods, stats)
+            if ret:
+                if stats:
+                    stats.record_hit(ret["result"], aircv.get_resolution(screen.img))
+                return ret
+        return None
+
+    def _match_strategies(self, screen, template_image, record_pos=None, resolution=(), methods=None, stats=None,
+                          record_misses=True):
+        """
+        Try the methods one by one, until one of them finds the template
+
+        If ST.CV_RACE_WORKERS > 1, the methods are raced in a thread pool instead, see _race_strategies
+
+        Args:
+            screen: ScreenContext
+            template_image: TemplateImage
+            record_pos, resolution: arguments of multi-scale matching
+            methods: names of the methods, default is ST.CVSTRATEGY
+            stats: TemplateStats to record the attempts in, see ST.LEARN_STRATEGY
+            record_misses: whether to record the methods which did not find the template in stats
+
+        Returns:
+            match result, None if not found
+
+        """
+        methods = list(methods or ST.CVSTRATEGY)
+        if ST.CV_RACE_WORKERS > 1 and len(methods) > 1:
+            top_n = ST.CV_RACE_TOP_N or len(methods)
+            ret = self._race_strategies(screen, template_image, record_pos, resolution, methods[:top_n], stats,
+                                        record_misses)
+            if ret:
+                return ret
+            methods = methods[top_n:]
+        ret = None
+        for method in methods:
+            start = time.time()
+            ret = self._match_method(method, screen, template_image, record_pos, resolution)
+            if stats and (ret or record_misses):
+                stats.record(method, bool(ret), time.time() - start)
             if ret:
                 break
         return ret
 
+    def _race_strategies(self, screen, template_image, record_pos, resolution, methods, stats=None, record_misses=True):
+        """
+        Run the methods concurrently in a thread pool of ST.CV_RACE_WORKERS threads, and return the first result found
+
+        The methods still queued are cancelled when one of them finds the template, the running ones are ignored.
+        A method is given up if it does not finish in ST.CV_METHOD_DEADLINE seconds since it started.
+
+        Returns:
+            match result, None if none of the methods finds the template in time
+
+        """
+        executor = get_executor(ST.CV_RACE_WORKERS, "cv_race")
+        deadline = ST.CV_METHOD_DEADLINE
+        starts = {}
+
+        def run(method):
+            starts[method] = time.time()
+            return self._match_method(method, screen, template_image, record_pos, resolution)
+
+        futures = {executor.submit(run, method): method for method in methods}
+        pending = set(futures)
+        try:
+            while pending:
+                timeout = None
+                if deadline:
+                    now = time.time()
+                    running = [starts[futures[f]] + deadline - now for f in pending if futures[f] in starts]
+                    timeout = max(min(running), 0) if running else deadline
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    method = futures[future]
+                    ret = future.result()
+                    if stats and (ret or record_misses):
+                        stats.record(method, bool(ret), time.time() - starts[method])
+                    if ret:
+                        G.LOGGING.debug("%s wins the race of %s" % (method, methods))
+                        return ret
+                if deadline:
+                    now = time.time()
+                    expired = set(f for f in pending if futures[f] in starts and now - starts[futures[f]] >= deadline)
+                    if expired:
+                        G.LOGGING.debug("give up %s after %ss" % ([futures[f] for f in expired], deadline))
+                        pending -= expired
+            return None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _match_method(self, method, screen, template_image, record_pos=None, resolution=()):
+        """match the template with one method of MATCHING_METHODS"""
+        ori_image, image = template_image.image, template_image.resized
+        # get function definition and execute:
+        func = MATCHING_METHODS.get(method, None)
+        if func is None:
+            raise InvalidMatchingMethodError("Undefined method in CVSTRATEGY: '%s', try 'kaze'/'brisk'/'akaze'/'orb'/'surf'/'sift'/'brief' instead." % method)
+        if method in ["mstpl", "gmstpl"]:
+            return self._try_match(func, ori_image, screen, threshold=self.threshold, rgb=self.rgb, record_pos=record_pos,
+                                   resolution=resolution, scale_max=self.scale_max, scale_step=self.scale_step,
+                                   backend=ST.CV_BACKEND)
+        elif isinstance(func, type) and issubclass(func, KeypointMatching):
+            cache_dir = os.path.dirname(os.path.abspath(self.filepath)) if ST.KEYPOINT_DISK_CACHE else None
+            return self._try_match(func, image, screen, threshold=self.threshold, rgb=self.rgb,
+                                   cache_dir=cache_dir, matcher_backend=ST.KEYPOINT_MATCHER)
+        elif isinstance(func, type) and issubclass(func, TemplateMatching):
+            return self._try_match(func, image, screen, threshold=self.threshold, rgb=self.rgb, prefilter=ST.TEMPLATE_PREFILTER)
+        else:
+            return self._try_match(func, image, screen, threshold=self.threshold, rgb=self.rgb)
+
     @staticmethod
     def _try_match(func, *args, **kwargs):
         G.LOGGING.debug("try match with %s" % func.__name__)
@@ -201,29 +559,103 @@ class Template(object):
     def _imread(self):
         return aircv.imread(self.filepath)
 
-    def _find_all_template(self, image, screen):
-        return TemplateMatching(image, screen, threshold=self.threshold, rgb=self.rgb).find_all_results()
+    def _get_template_image(self, screen, reduce_factor=1):
+        """
+        Read the template and resize it to fit the screen, the result is cached in TEMPLATE_CACHE
 
-    def _find_keypoint_result_in_predict_area(self, func, image, screen):
-        if not self.record_pos:
-            return None
-        # calc predict area in screen
-        image_wh, screen_resolution = aircv.get_resolution(image), aircv.get_resolution(screen)
-        xmin, ymin, xmax, ymax = Predictor.get_predict_area(self.record_pos, image_wh, self.resolution, screen_resolution)
-        # crop predict image from screen
-        predict_area = aircv.crop_image(screen, (xmin, ymin, xmax, ymax))
-        if not predict_area.any():
-            return None
-        # keypoint matching in predicted area:
-        ret_in_area = func(image, predict_area, threshold=self.threshold, rgb=self.rgb)
-        # calc cv ret if found
-        if not ret_in_area:
+        The cache key is (filepath, mtime, record resolution, screen resolution, resize method, reduce_factor),
+        so that a modified image file or a different screen will not hit the old cache
+
+        Args:
+            screen: screen image to be matched
+            reduce_factor: the screen is decoded at 1/reduce_factor size
+
+        Returns:
+            TemplateImage
+
+        """
+        resize_method = ST.RESIZE_METHOD
+        filepath = self.filepath
+        try:
+            mtime = os.path.getmtime(filepath)
+        except OSError:
+            mtime = None
+        if mtime is None or not ST.TEMPLATE_CACHE_SIZE:
+            # aircv.imread raises FileNotExistError if the file does not exist
+            return self._load_template_image(screen, resize_method, reduce_factor)
+        key = (os.path.abspath(filepath), mtime, tuple(self.resolution or ()),
+               aircv.get_resolution(screen), resize_method, reduce_factor)
+        TEMPLATE_CACHE.maxsize = ST.TEMPLATE_CACHE_SIZE
+        return TEMPLATE_CACHE.get_or_create(key, lambda: self._load_template_image(screen, resize_method, reduce_factor))
+
+    def _load_template_image(self, screen, resize_method, reduce_factor=1):
+        ori_image = self._imread()
+        image = self._resize_image(ori_image, screen, resize_method)
+        if reduce_factor != 1 and (not self.resolution or resize_method is None):
+            # without record resolution, the template is not fitted to the reduced screen, shrink it in the same ratio
+            h, w = ori_image.shape[:2]
+            image = cv2.resize(ori_image, (max(1, int(w / reduce_factor)), max(1, int(h / reduce_factor))),
+                               interpolation=cv2.INTER_AREA)
+        return TemplateImage(ori_image, image)
+
+    def _find_all_template(self, image, screen):
+        return TemplateMatching(image, screen, threshold=self.threshold, rgb=self.rgb,
+                                prefilter=ST.TEMPLATE_PREFILTER).find_all_results(max_count=ST.FIND_ALL_MAX_COUNT)
+
+    def _get_search_areas(self, screen, image):
+        """
+        Areas to search in order: the area predicted by record_pos, the area expanded by ST.PREDICT_ROI_EXPAND,
+        and None for the full screen
+
+        Args:
+            screen: ScreenContext
+            image: template image fitted to the screen
+
+        Returns:
+            list of (x_min, y_min, x_max, y_max) or None
+
+        """
+        predict_roi = ST.PREDICT_ROI if self.predict_roi is None else self.predict_roi
+        if not predict_roi or not self.record_pos:
+            return [None]
+        screen_resolution = aircv.get_resolution(screen.img)
+        w, h = screen_resolution
+        x_min, y_min, x_max, y_max = Predictor.get_predict_area(self.record_pos, aircv.get_resolution(image),
+                                                                screen_resolution=screen_resolution)
+        x, y = (x_min + x_max) / 2, (y_min + y_max) / 2
+        areas = []
+        for scale in (1, ST.PREDICT_ROI_EXPAND):
+            rx, ry = (x_max - x_min) * scale / 2, (y_max - y_min) * scale / 2
+            area = (int(max(x - rx, 0)), int(max(y - ry, 0)), int(min(x + rx, w)), int(min(y + ry, h)))
+            if area[2] - area[0] >= w and area[3] - area[1] >= h:
+                # as large as the full screen
+                break
+            if area[0] < area[2] and area[1] < area[3] and area not in areas:
+                areas.append(area)
+        return areas + [None]
+
+    def _match_in_area(self, screen, template_image, area, methods=None, stats=None):
+        """
+        Match the template in an area of the screen, the result is mapped back to the full screen
+
+        Multi-scale matching gets the record resolution scaled to the area instead of record_pos
+        """
+        sub = screen.crop(area)
+        (w, h), (sub_w, sub_h) = aircv.get_resolution(screen.img), aircv.get_resolution(sub.img)
+        resolution = (self.resolution[0] * sub_w / w, self.resolution[1] * sub_h / h) if self.resolution else ()
+        # missing in an area does not mean the method cannot find the template, only hits are recorded
+        ret = self._match_strategies(sub, template_image, None, resolution, methods, stats, record_misses=False)
+        if not ret:
             return None
-        ret = deepcopy(ret_in_area)
+        return self._offset_result(ret, *sub.offset)
+
+    @staticmethod
+    def _offset_result(ret, x_offset, y_offset):
+        """move the match result in an area of the screen by the offset of the area"""
+        ret = deepcopy(ret)
+        ret["result"] = (ret["result"][0] + x_offset, ret["result"][1] + y_offset)
         if "rectangle" in ret:
-            for idx, item in enumerate(ret["rectangle"]):
-                ret["rectangle"][idx] = (item[0] + xmin, item[1] + ymin)
-        ret["result"] = (ret_in_area["result"][0] + xmin, ret_in_area["result"][1] + ymin)
+            ret["rectangle"] = [(x + x_offset, y + y_offset) for x, y in ret["rectangle"]]
         return ret
 
     def _resize_image(self, image, screen, resize_method):
@@ -250,6 +682,32 @@ class Template(object):
         return image
 
 
+class TemplateImage(object):
+    """
+    Decoded template image and its resized version for one screen resolution
+
+    The arrays are shared through TEMPLATE_CACHE, so they are set to read-only.
+    """
+
+    def __init__(self, image, resized):
+        self.image = self._freeze(image)
+        self.resized = image if resized is image else self._freeze(resized)
+        self._gray = None
+
+    @property
+    def gray(self):
+        """gray scale of the resized image"""
+        if self._gray is None:
+            self._gray = self._freeze(aircv.utils.img_mat_rgb_2_gray(self.resized))
+        return self._gray
+
+    @staticmethod
+    def _freeze(img):
+        if img is not None:
+            img.flags.writeable = False
+        return img
+
+
 class Predictor(object):
     """
     this class predicts the press_point and the area to search im_search.
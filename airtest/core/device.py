@@ -35,6 +35,29 @@ class Device(with_metaclass(MetaDevice, object)):
     def snapshot(self, *args, **kwargs):
         self._raise_not_implemented_error()
 
+    def snapshot_frame(self, *args, **kwargs):
+        """
+        Take a screenshot as :py:class:`airtest.aircv.frame.Frame`, devices with an encoded screen stream
+        can override it to decode the frame lazily
+
+        Returns:
+            Frame, None if failed
+        """
+        from airtest.aircv.frame import Frame
+        screen = self.snapshot(*args, **kwargs)
+        if screen is None:
+            return None
+        return Frame(img=screen)
+
+    def wait_frame(self, newer_than, timeout):
+        """
+        Wait for a screen frame whose sequence number is greater than `newer_than`, for devices with a frame pump
+
+        Returns:
+            True if a new frame arrived, False if timeout, None if the device cannot wait for frames
+        """
+        return None
+
     def touch(self, target, **kwargs):
         self._raise_not_implemented_error()
 
@@ -36,6 +36,8 @@ class G(object, metaclass=DeviceMetaProperty):
     RECENT_CAPTURE = None
     RECENT_CAPTURE_PATH = None
     CUSTOM_DEVICES = {}
+    # time of the latest touch/swipe/keyevent/text (see delay_after_operation), loop_find polls faster right after it
+    LAST_INPUT_TIME = 0
 
     @classmethod
     def add_device(cls, dev):
@@ -257,4 +259,5 @@ def import_device_cls(platform):
 
 
 def delay_after_operation():
+    G.LAST_INPUT_TIME = time.time()
     time.sleep(ST.OPDELAY)
@@ -13,7 +13,7 @@ import inspect
 import logging
 import traceback
 from logzero import setup_logger
-from functools import wraps
+from functools import wraps, partial
 from urllib.parse import urlparse
 from tidevice._usbmux import Usbmux
 from tidevice._device import BaseDevice
@@ -30,6 +30,7 @@ from airtest.utils.logger import get_logger
 from airtest.core.ios.mjpeg_cap import MJpegcap
 from airtest.core.settings import Settings as ST
 from airtest.aircv.screen_recorder import ScreenRecorder, resize_by_max, get_max_size
+from airtest.aircv.frame import Frame
 from airtest.core.error import LocalDeviceError, AirtestError
 
 
@@ -627,6 +628,22 @@ class IOS(Device):
         raw_value = base64.b64decode(value)
         return raw_value
 
+    def snapshot_frame(self, filename=None, quality=10, max_size=None):
+        """Take snapshot as :py:class:`airtest.aircv.frame.Frame`, which is decoded when its pixels are read.
+
+        Args:
+            filename: save screenshot to filename
+            quality: The image quality, integer in range [1, 99]
+            max_size: the maximum size of the picture, e.g 1200
+
+        Returns:
+            Frame object.
+        """
+        frame = Frame(self._neo_wda_screenshot())
+        if filename:
+            frame.save(filename, quality, max_size=max_size)
+        return frame
+
     def snapshot(self, filename=None, quality=10, max_size=None):
         """Take snapshot.
 
@@ -1294,12 +1311,10 @@ class IOS(Device):
 
         max_size = get_max_size(max_size)
         def get_frame():
+            # decoded by the recorder only when the frame is written
             data = self.get_frame_from_stream()
-            frame = aircv.utils.string_2_img(data)
-            
-            if max_size is not None:
-                frame = resize_by_max(frame, max_size)
-            return frame
+            transform = partial(resize_by_max, max_size=max_size) if max_size is not None else None
+            return Frame(data, transform=transform)
 
         self.recorder = ScreenRecorder(
             save_path, get_frame, fps=fps,
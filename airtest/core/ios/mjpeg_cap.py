@@ -14,32 +14,38 @@ LOGGING = get_logger(__name__)
 
 
 class SocketBuffer(SafeSocket):
+    CHUNK_SIZE = 65536
+
     def __init__(self, sock: socket.socket):
         super(SocketBuffer, self).__init__(sock)
+        self._chunk = bytearray(self.CHUNK_SIZE)
 
     def _drain(self):
-        _data = self.sock.recv(1024)
-        if _data is None or _data == b"":
+        n = self.sock.recv_into(self._chunk)
+        if not n:
             raise IOError("socket closed")
-        self.buf += _data
-        return len(_data)
+        self.buf += memoryview(self._chunk)[:n]
+        return n
 
     def read_until(self, delimeter: bytes) -> bytes:
         """ return without delimeter """
+        start = 0
         while True:
-            index = self.buf.find(delimeter)
+            index = self.buf.find(delimeter, start)
             if index != -1:
-                _return = self.buf[:index]
-                self.buf = self.buf[index + len(delimeter):]
+                _return = bytes(self.buf[:index])
+                del self.buf[:index + len(delimeter)]
                 return _return
+            # the delimeter may be split by two chunks
+            start = max(0, len(self.buf) - len(delimeter) + 1)
             self._drain()
 
     def read_bytes(self, length: int) -> bytes:
-        while length > len(self.buf):
-            self._drain()
+        return bytes(self.recv_view(length))
 
-        _return, self.buf = self.buf[:length], self.buf[length:]
-        return _return
+    def read_view(self, length: int) -> memoryview:
+        """ like read_bytes, but the memoryview reuses the socket buffer and is overwritten by later reads """
+        return self.recv_view(length)
 
     def write(self, data: bytes):
         return self.sock.sendall(data)
@@ -79,8 +85,13 @@ class MJpegcap(object):
             LOGGING.error("mjpegsock connection error")
             raise
 
-    @on_method_ready('setup_stream_server')
     def get_frame_from_stream(self):
+        frame = self._get_frame_data()
+        return bytes(frame) if isinstance(frame, memoryview) else frame
+
+    @on_method_ready('setup_stream_server')
+    def _get_frame_data(self):
+        """ jpg data of one frame, a memoryview reusing the socket buffer if read from the stream """
         if self._is_running is False:
             self.init_sock()
         try:
@@ -92,7 +103,7 @@ class MJpegcap(object):
             while True:
                 if self.buf.read_until(b'\r\n') == b'':
                     break
-            imdata = self.buf.read_bytes(length)
+            imdata = self.buf.read_view(length)
             return imdata
         except IOError:
             # 如果暂停获取mjpegsock的数据一段时间，可能会导致它断开，这里将self.buf关闭并临时返回黑屏图像
@@ -119,7 +130,7 @@ class MJpegcap(object):
         Returns: numpy.ndarray
 
         """
-        screen = self.get_frame_from_stream()
+        screen = self._get_frame_data()
         try:
             screen = aircv.utils.string_2_img(screen)
         except Exception:
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Runtime stats of template matching, used to learn the method order and the search area of each template
+
+    - which method of CVSTRATEGY found the template, how often and how fast
+    - where the template was found last time
+
+Enabled by ST.LEARN_STRATEGY, and saved to match_stats.json if ST.MATCH_STATS_PERSIST is True
+"""
+
+import os
+import json
+import atexit
+import threading
+
+from airtest.aircv.keypoint_cache import image_key
+from airtest.core.settings import Settings as ST
+from airtest.utils.logger import get_logger
+
+LOGGING = get_logger(__name__)
+
+# file name of the stats, saved in ST.PROJECT_ROOT, or ST.LOG_DIR if PROJECT_ROOT is not set
+STATS_FILENAME = "match_stats.json"
+
+
+class TemplateStats(object):
+    """
+    Stats of one template
+
+    Examples:
+        >>> stats = TemplateStats()
+        >>> stats.record("mstpl", False, 1.2)
+        >>> stats.record("tpl", True, 0.05)
+        >>> stats.sort_methods(["mstpl", "tpl", "sift"])
+        ['tpl', 'sift', 'mstpl']
+
+    """
+    # weight of the latest time in the moving average
+    ALPHA = 0.3
+
+    def __init__(self, methods=None, last_hit=None):
+        # {method: {"hits": int, "misses": int, "time": moving average of seconds}}
+        self.methods = methods or {}
+        # (x, y) of the last hit, relative to the screen size
+        self.last_hit = tuple(last_hit) if last_hit else None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<TemplateStats methods=%s last_hit=%s>" % (self.methods, self.last_hit)
+
+    def record(self, method, found, seconds):
+        """record one attempt of `method`"""
+        with self._lock:
+            stat = self.methods.setdefault(method, {"hits": 0, "misses": 0, "time": seconds})
+            stat["hits" if found else "misses"] += 1
+            stat["time"] = self.ALPHA * seconds + (1 - self.ALPHA) * stat["time"]
+
+    def record_hit(self, pos, resolution):
+        """record the position where the template was found"""
+        self.last_hit = (pos[0] / float(resolution[0]), pos[1] / float(resolution[1]))
+
+    def sort_methods(self, methods):
+        """
+        Sort the methods: methods which found the template (higher hit rate first, then faster first),
+        methods never tried, and methods which never found the template; the order in `methods` is kept otherwise
+
+        """
+        def sort_key(item):
+            index, method = item
+            stat = self.methods.get(method)
+            if not stat:
+                return 1, 0, 0, index
+            if not stat["hits"]:
+                return 2, 0, 0, index
+            return 0, -stat["hits"] / float(stat["hits"] + stat["misses"]), stat["time"], index
+
+        with self._lock:
+            return [method for _, method in sorted(enumerate(methods), key=sort_key)]
+
+    def last_hit_area(self, resolution, image_wh, deviation=100):
+        """
+        Area around the last hit
+
+        Args:
+            resolution: (width, height) of the screen
+            image_wh: (width, height) of the template fitted to the screen
+            deviation: margin around the template
+
+        Returns:
+            (x_min, y_min, x_max, y_max), None if never found
+
+        """
+        if not self.last_hit:
+            return None
+        w, h = resolution
+        x, y = self.last_hit[0] * w, self.last_hit[1] * h
+        rx, ry = image_wh[0] / 2 + deviation, image_wh[1] / 2 + deviation
+        return int(max(x - rx, 0)), int(max(y - ry, 0)), int(min(x + rx, w)), int(min(y + ry, h))
+
+    def to_json(self):
+        with self._lock:
+            return {"methods": {k: dict(v) for k, v in self.methods.items()}, "last_hit": self.last_hit}
+
+
+class MatchStats(object):
+    """
+    Stats of all templates, keyed by the content of the template image, so the stats are shared by
+    templates of the same image and survive renaming the file
+
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._loaded_path = None
+        self._atexit = False
+
+    @property
+    def path(self):
+        """path of the json file, None if not persisted"""
+        if not ST.MATCH_STATS_PERSIST:
+            return None
+        dirname = ST.PROJECT_ROOT or ST.LOG_DIR
+        return os.path.join(dirname, STATS_FILENAME) if dirname else None
+
+    def get(self, image):
+        """
+        Get the stats of a template
+
+        Args:
+            image: template image (before resizing)
+
+        Returns:
+            TemplateStats
+
+        """
+        self._load()
+        key = image_key(image)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = TemplateStats()
+            return self._stats[key]
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _load(self):
+        path = self.path
+        if path is None or path == self._loaded_path:
+            return
+        with self._lock:
+            if path == self._loaded_path:
+                return
+            self._loaded_path = path
+            if not self._atexit:
+                atexit.register(self.save)
+                self._atexit = True
+            if not os.path.isfile(path):
+                return
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                for key, value in data.items():
+                    self._stats.setdefault(key, TemplateStats(value.get("methods"), value.get("last_hit")))
+            except Exception as e:
+                LOGGING.warning("failed to load match stats %s: %r" % (path, e))
+
+    def save(self, path=None):
+        """save the stats to `path`, default is self.path"""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            data = {key: stats.to_json() for key, stats in self._stats.items()}
+        try:
+            if not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+                os.makedirs(os.path.dirname(os.path.abspath(path)))
+            # write to a temp file first, other processes may be reading it
+            tmp_path = path + ".%s.tmp" % os.getpid()
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            LOGGING.warning("failed to save match stats %s: %r" % (path, e))
+
+
+MATCH_STATS = MatchStats()
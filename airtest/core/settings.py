@@ -26,3 +26,50 @@ class Settings(object):
     # Image compression size, e.g. 1200, means that the size of the screenshot does not exceed 1200*1200
     IMAGE_MAXSIZE = os.environ.get("IMAGE_MAXSIZE", None)
     SAVE_IMAGE = True
+    # max number of decoded template images cached in memory, 0 to disable the cache
+    TEMPLATE_CACHE_SIZE = 300
+    # android: keep reading the screen stream in a background thread, snapshot returns the latest frame immediately
+    SCREEN_FRAME_PUMP = False
+    # decode jpg screenshots at 1/N size (1, 2, 4 or 8) for matching, the results are mapped back to the full screen
+    MATCH_REDUCE_FACTOR = 1
+    # save keypoints/descriptors of templates as .npz files in __keypoint_cache__ next to the template images,
+    # so that keypoint matching (kaze/sift/...) does not recompute them in later runs
+    KEYPOINT_DISK_CACHE = False
+    # matcher of keypoint matching: None (the default matcher of each method), "bf" (brute force),
+    # "flann" (approximate, KD-tree for kaze/sift/surf and LSH for binary descriptors of orb/brisk/akaze/brief)
+    KEYPOINT_MATCHER = None
+    # find_any/match_many: match the templates against the screen in a thread pool of this size if > 1
+    FIND_ANY_WORKERS = 1
+    # loop_find: skip matching when the screen has not changed since the last attempt, poll faster right after
+    # a touch and back off exponentially while the screen is static, see cv.AdaptivePoller
+    ADAPTIVE_POLL = False
+    # max absolute difference (0-255) of the 64x64 gray thumbnails, below which two screens are the same
+    FRAME_DIFF_THRESHOLD = 8
+    # poll every POLL_FAST_INTERVAL seconds within POLL_FAST_WINDOW seconds after a touch/swipe/keyevent/text
+    POLL_FAST_INTERVAL = 0.1
+    POLL_FAST_WINDOW = 2.0
+    # upper bound of the interval while the screen is static
+    POLL_MAX_INTERVAL = 2.0
+    # templates with record_pos: search the predicted area first, then the area expanded PREDICT_ROI_EXPAND times,
+    # and the full screen at last, for all methods in CVSTRATEGY; can be set for each Template by predict_roi
+    PREDICT_ROI = False
+    PREDICT_ROI_EXPAND = 2.5
+    # learn from the results of each template: try the methods of CVSTRATEGY which found it before first
+    # (higher hit rate, then faster first) and search around its last position first, see airtest.core.match_stats
+    LEARN_STRATEGY = False
+    # save the learned stats to match_stats.json in PROJECT_ROOT (or LOG_DIR), so that they are shared across runs
+    MATCH_STATS_PERSIST = False
+    # race the methods of CVSTRATEGY in a thread pool of this size if > 1, the first result found is returned;
+    # CV_RACE_TOP_N: race only the first N methods (None for all), the rest are tried one by one if they all fail
+    CV_RACE_WORKERS = 1
+    CV_RACE_TOP_N = None
+    # racing only: seconds to wait for each method since it starts, None to wait until it finishes
+    CV_METHOD_DEADLINE = None
+    # tpl/ptpl and find_all: skip the windows whose mean/std/colors do not fit the template before matchTemplate,
+    # saves most of the time on screens with large uniform areas, see TemplateMatching.prefilter
+    TEMPLATE_PREFILTER = False
+    # max number of results of find_all, 0 for no limit
+    FIND_ALL_MAX_COUNT = 10
+    # array backend of multi-scale matching (mstpl/gmstpl): "numpy", or "umat" to keep the data in cv2.UMat
+    # (OpenCV transparent API, runs with OpenCL if available), see airtest.aircv.backend
+    CV_BACKEND = "numpy"
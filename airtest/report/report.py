@@ -6,7 +6,6 @@ import io
 import re
 import six
 import sys
-from PIL import Image
 import shutil
 import jinja2
 import traceback
@@ -21,7 +20,7 @@ except:
 from airtest.aircv import imread, get_resolution
 from airtest.aircv.error import FileNotExistError
 from airtest.core.settings import Settings as ST
-from airtest.aircv.utils import compress_image
+from airtest.aircv.frame import Frame
 from airtest.utils.compat import decode_path, script_dir_name
 from airtest.cli.info import get_script_info
 from airtest.utils.logger import get_logger
@@ -231,8 +230,11 @@ class LogToHtml(object):
         new_path = cls.get_small_name(path)
         if not os.path.isfile(new_path):
             try:
-                img = Image.open(path)
-                compress_image(img, new_path, ST.SNAPSHOT_QUALITY, max_size=300)
+                with open(path, "rb") as f:
+                    frame = Frame(f.read())
+                # jpg screenshots are decoded directly at a reduced size close to the thumbnail
+                if not frame.save(new_path, ST.SNAPSHOT_QUALITY, max_size=300):
+                    LOGGING.error("failed to decode screenshot: %s" % path)
             except Exception:
                 LOGGING.error(traceback.format_exc())
             return new_path
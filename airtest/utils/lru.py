@@ -0,0 +1,113 @@
+# _*_ coding:UTF-8 _*_
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Thread-safe, size-bounded LRU cache with hit/miss counters
+
+    Examples:
+        >>> cache = LRUCache(maxsize=2)
+        >>> cache.put("a", 1)
+        >>> cache.get("a")
+        1
+        >>> cache.info()
+        {'hits': 1, 'misses': 0, 'size': 1, 'maxsize': 2}
+
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        Get the cached value of `key` and mark it as the most recently used one
+
+        Args:
+            key: hashable key
+            default: returned if `key` is not cached
+
+        Returns:
+            cached value or default
+
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Cache `value` with `key`, the least recently used items are dropped if the cache is full
+
+        Args:
+            key: hashable key
+            value: value to be cached
+
+        Returns:
+            None
+
+        """
+        if not self.maxsize or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        """
+        Get the cached value of `key`, or create it with `factory()` and cache it
+
+        Args:
+            key: hashable key
+            factory: function without arguments, called when `key` is not cached
+
+        Returns:
+            cached or created value
+
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        """Drop all cached items and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        Returns:
+            dict of hits, misses, current size and maxsize of the cache
+
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+_MISSING = object()
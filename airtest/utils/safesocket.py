@@ -5,12 +5,17 @@ import errno
 
 class SafeSocket(object):
     """safe and exact recv & send"""
+    RING_SIZE = 4
     def __init__(self, sock=None):
         if sock is None:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         else:
             self.sock = sock
-        self.buf = b""
+        # data received but not consumed yet, e.g. partial data left by a timeout
+        self.buf = bytearray()
+        # reusable buffers for recv_view, a view stays valid until RING_SIZE more views are received
+        self._ring = [bytearray() for _ in range(self.RING_SIZE)]
+        self._ring_index = 0
 
     def __enter__(self):
         try:
@@ -39,18 +44,75 @@ class SafeSocket(object):
             totalsent += sent
 
     def recv(self, size):
-        while len(self.buf) < size:
-            trunk = self.sock.recv(min(size-len(self.buf), 4096))
-            if trunk == b"":
-                raise socket.error("socket connection broken")
-            self.buf += trunk
-        ret, self.buf = self.buf[:size], self.buf[size:]
-        return ret
+        buf = bytearray(size)
+        self.recv_into(buf, size)
+        return bytes(buf)
+
+    def recv_view(self, size):
+        """
+        Receive exactly `size` bytes into a reusable buffer, without extra copies
+
+        The returned memoryview shares memory with the socket's buffer ring, it is overwritten after
+        RING_SIZE more calls, use bytes(view) to keep the data
+
+        Args:
+            size: number of bytes to receive
+
+        Returns:
+            memoryview
+
+        """
+        buf = self._ring[self._ring_index]
+        if len(buf) < size:
+            # grow geometrically, so that frames of similar size do not reallocate every time
+            buf = bytearray(max(size, len(buf) * 3 // 2))
+            self._ring[self._ring_index] = buf
+        view = memoryview(buf)[:size]
+        self.recv_into(view, size)
+        self._ring_index = (self._ring_index + 1) % self.RING_SIZE
+        return view
 
-    def recv_with_timeout(self, size, timeout=2):
+    def recv_into(self, buffer, size=None):
+        """
+        Receive exactly `size` bytes into a writable buffer, e.g. bytearray or memoryview
+
+        If the socket times out, the received part is kept and will be returned by the next recv
+
+        Args:
+            buffer: writable buffer
+            size: number of bytes to receive, default is len(buffer)
+
+        Returns:
+            size
+
+        """
+        view = memoryview(buffer).cast("B")
+        if size is None:
+            size = len(view)
+        got = min(len(self.buf), size)
+        if got:
+            view[:got] = self.buf[:got]
+            del self.buf[:got]
+        try:
+            while got < size:
+                n = self.sock.recv_into(view[got:size], size - got)
+                if n == 0:
+                    raise socket.error("socket connection broken")
+                got += n
+        except (socket.timeout, BlockingIOError):
+            self.buf[:0] = view[:got]
+            raise
+        except socket.error as e:
+            # 10035 WSAEWOULDBLOCK on windows, see recv_nonblocking
+            if e.args and e.args[0] == 10035:
+                self.buf[:0] = view[:got]
+            raise
+        return size
+
+    def recv_with_timeout(self, size, timeout=2, as_view=False):
         self.sock.settimeout(timeout)
         try:
-            ret = self.recv(size)
+            ret = self.recv_view(size) if as_view else self.recv(size)
         except socket.timeout:
             ret = None
         finally:
@@ -5,6 +5,7 @@ import sys
 import stat
 import threading
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 from six import string_types
 from six.moves import queue
 from six.moves.urllib.parse import parse_qsl, urlparse
@@ -196,3 +197,31 @@ def get_absolute_coordinate(coord, dev):
         w, h = dev.get_current_resolution()
         return (int(coord[0] * w), int(coord[1] * h))
     return coord
+
+
+# named thread pools, {name: ThreadPoolExecutor}, see get_executor
+EXECUTORS = {}
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor(max_workers, name):
+    """
+    Thread pool of `name`, recreated if max_workers changes
+
+    Different tasks use different pools, so that tasks waiting for the tasks of another pool do not exhaust it
+
+    Args:
+        max_workers: number of threads
+        name: name of the pool, also the prefix of the thread names
+
+    Returns:
+        ThreadPoolExecutor
+
+    """
+    with _EXECUTOR_LOCK:
+        executor = EXECUTORS.get(name)
+        if executor is None or executor._max_workers != max_workers:
+            if executor is not None:
+                executor.shutdown(wait=False)
+            executor = EXECUTORS[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        return executor
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare the array backends (numpy / umat) of multi-scale template matching.
+
+Usage: python cv_backend.py [rounds]
+"""
+
+import os
+import sys
+import time
+import logging
+
+import cv2
+
+from airtest.aircv import imread
+from airtest.aircv.backend import BACKENDS, opencl_enabled
+from airtest.aircv.multiscale_template_matching import MultiScaleTemplateMatching, MultiScaleTemplateMatchingPre
+
+THISDIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLES = [
+    # (name, search, screen)
+    ("high_dpi", "sample/high_dpi/tpl1551940579340.png", "sample/high_dpi/tpl1551944272194.png"),
+    ("scaled", None, "../tests/matching_images/template_screen.png"),
+]
+
+
+def load_sample(search_file, screen_file):
+    screen = imread(os.path.join(THISDIR, screen_file))
+    if search_file:
+        search = imread(os.path.join(THISDIR, search_file))
+    else:
+        # a part of the screen scaled up by 1.3
+        search = cv2.resize(screen[1000:1060, 600:660], (78, 78))
+    return search, screen
+
+
+def profile(method, search, screen, backend, rounds, warm):
+    """best time of `rounds` runs, the cache of resized templates is cleared before each run if not warm"""
+    times, result = [], None
+    for _ in range(rounds):
+        if not warm:
+            MultiScaleTemplateMatching.TEMPLATE_SCALE_CACHE.clear()
+        start = time.perf_counter()
+        result = method(search, screen, threshold=0.7, rgb=True, backend=backend).find_best_result()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(rounds=5):
+    logging.disable(logging.DEBUG)
+    print("opencv %s, OpenCL %s" % (cv2.__version__, "enabled" if opencl_enabled() else "not available"))
+    print("%-10s %-14s %-7s %-5s %10s  %s" % ("sample", "method", "backend", "cache", "time(ms)", "result"))
+    for name, search_file, screen_file in SAMPLES:
+        search, screen = load_sample(search_file, screen_file)
+        for method in (MultiScaleTemplateMatching, MultiScaleTemplateMatchingPre):
+            if method is MultiScaleTemplateMatchingPre:
+                # MultiScaleTemplateMatchingPre needs the resolution of the screen when the search image was recorded
+                resolution = (screen.shape[1], screen.shape[0])
+                method = _with_resolution(method, resolution)
+            for warm in (False, True):
+                for backend in BACKENDS:
+                    seconds, result = profile(method, search, screen, backend, rounds, warm)
+                    print("%-10s %-14s %-7s %-5s %10.1f  %s" % (
+                        name, method.METHOD_NAME, backend, "warm" if warm else "cold", seconds * 1000,
+                        result and result["result"]))
+
+
+def _with_resolution(method, resolution):
+    class WithResolution(method):
+        def __init__(self, *args, **kwargs):
+            kwargs.setdefault("resolution", resolution)
+            super(WithResolution, self).__init__(*args, **kwargs)
+    return WithResolution
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
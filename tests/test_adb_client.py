@@ -0,0 +1,458 @@
+# encoding=utf-8
+import os
+import re
+import struct
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from six.moves import socketserver
+from airtest.core.android.adb import ADB, AdbError, AdbShellError, DeviceConnectionError
+from airtest.core.android.adb_client import AdbClient
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+    """adb server with one device "fake" (Android 7.0+), whose shell knows a few commands"""
+
+    def handle(self):
+        server = self.server
+        payload = self.read_request()
+        if payload.startswith("host:transport:"):
+            if payload != "host:transport:fake":
+                return self.fail("device '%s' not found" % payload.split(":")[-1])
+            self.okay()
+            self.handle_device(self.read_request())
+            return
+        if not payload.startswith(("host:", "host-serial:fake:")):
+            return self.fail("device '%s' not found" % payload.split(":")[1])
+        request = payload.split(":", 2)[-1] if payload.startswith("host-serial:") else payload[len("host:"):]
+        if request == "devices":
+            self.okay(b"fake\tdevice\n")
+        elif request == "features":
+            self.okay(b"shell_v2,cmd")
+        elif request == "get-state":
+            self.okay(b"device")
+        elif request == "list-forward":
+            self.okay("".join("fake %s %s\n" % item for item in server.forwards.items()).encode())
+        elif request.startswith("forward:"):
+            no_rebind = request.startswith("forward:norebind:")
+            local, remote = request.split(":", 2 if no_rebind else 1)[-1].split(";")
+            self.okay()
+            if no_rebind and local in server.forwards:
+                return self.fail("cannot rebind existing socket")
+            server.forwards[local] = remote
+            self.okay()
+        elif request.startswith("killforward:"):
+            self.okay()
+            if server.forwards.pop(request[len("killforward:"):], None) is None:
+                return self.fail("listener '%s' not found" % request[len("killforward:"):])
+            self.okay()
+        else:
+            self.fail("unknown request %s" % request)
+
+    def handle_device(self, payload):
+        server = self.server
+        if payload.startswith("shell,v2,raw:"):
+            with server.lock:
+                server.running += 1
+                server.max_running = max(server.max_running, server.running)
+            try:
+                stdout, stderr, code = self.run_cmd(payload[len("shell,v2,raw:"):])
+            finally:
+                with server.lock:
+                    server.running -= 1
+            self.okay()
+            for packet_id, data in ((1, stdout), (2, stderr)):
+                if data:
+                    self.request.sendall(struct.pack("<BI", packet_id, len(data)) + data)
+            self.request.sendall(struct.pack("<BIB", 3, 1, code))
+        elif payload == "exec:trickle":
+            # a byte every 0.1s, no single read waits long
+            self.okay()
+            try:
+                for _ in range(5):
+                    time.sleep(0.1)
+                    self.request.sendall(b".")
+            except socket.error:
+                pass
+        elif payload.startswith("exec:"):
+            self.okay()
+            self.request.sendall(self.run_cmd(payload[len("exec:"):])[0])
+        elif payload == "sync:":
+            self.okay()
+            self.handle_sync()
+
+    def run_cmd(self, cmd):
+        with self.server.lock:
+            self.server.cmds.append(cmd)
+        batch = re.findall(r"\((.*?)\); r=\$\?; echo; echo (\S+) \$r", cmd)
+        if batch:
+            # the script of ADB.shell_batch
+            out = b""
+            for sub_cmd, delimiter in batch:
+                stdout, _, code = self.run_cmd(sub_cmd)
+                out += stdout + b"\n" + ("%s %d\n" % (delimiter, code)).encode()
+            return out, b"", 0
+        if cmd in self.server.outputs:
+            return self.server.outputs[cmd], b"", 0
+        if cmd.startswith("echo "):
+            return cmd[len("echo "):].encode() + b"\n", b"", 0
+        if cmd.startswith("exit "):
+            return b"", b"failed\n", int(cmd.split()[1])
+        if cmd == "getprop":
+            return "".join("[%s]: [%s]\n" % item for item in sorted(self.server.props.items())).encode(), b"", 0
+        if cmd.startswith("getprop "):
+            return self.server.props.get(cmd[len("getprop "):], "").encode() + b"\n", b"", 0
+        if cmd == "sleep":
+            time.sleep(0.2)
+            return b"", b"", 0
+        if cmd == "screencap":
+            return self.server.screen, b"", 0
+        return b"", ("%s: not found\n" % cmd).encode(), 127
+
+    def handle_sync(self):
+        files = self.server.files
+        while True:
+            request_id, length = struct.unpack("<4sI", self.read_exact(8))
+            if request_id == b"QUIT":
+                return
+            path = self.read_exact(length).decode()
+            if request_id == b"STAT":
+                if path in self.server.dirs:
+                    mode = 0o40755
+                else:
+                    mode = 0o100644 if path in files else 0
+                self.request.sendall(b"STAT" + struct.pack("<III", mode, len(files.get(path, b"")), 0))
+            elif request_id == b"SEND":
+                path = path.rsplit(",", 1)[0]
+                data = b""
+                while True:
+                    request_id, length = struct.unpack("<4sI", self.read_exact(8))
+                    if request_id == b"DONE":
+                        break
+                    data += self.read_exact(length)
+                files[path] = data
+                self.request.sendall(b"OKAY" + struct.pack("<I", 0))
+            elif request_id == b"RECV":
+                if path not in files:
+                    message = b"remote object '%s' does not exist" % path.encode()
+                    self.request.sendall(b"FAIL" + struct.pack("<I", len(message)) + message)
+                    continue
+                data = files[path]
+                for i in range(0, len(data), 1000):
+                    self.request.sendall(b"DATA" + struct.pack("<I", len(data[i:i + 1000])) + data[i:i + 1000])
+                self.request.sendall(b"DONE" + struct.pack("<I", 0))
+
+    def read_exact(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def read_request(self):
+        return self.read_exact(int(self.read_exact(4), 16)).decode()
+
+    def okay(self, data=None):
+        self.request.sendall(b"OKAY" if data is None else b"OKAY%04x" % len(data) + data)
+
+    def fail(self, message):
+        self.request.sendall(b"FAIL%04x" % len(message) + message.encode())
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ("127.0.0.1", 0), FakeAdbHandler)
+        self.forwards = {}
+        self.files = {}
+        self.dirs = {"/data/local/tmp"}
+        self.screen = b""
+        self.cmds = []
+        # output of the shell commands
+        self.outputs = {
+            "wm size": b"Physical size: 1080x1920\nOverride size: 720x1280\n",
+            "dumpsys SurfaceFlinger": b"Display 0 orientation=1\nGLES: Qualcomm, Adreno (TM) 540, OpenGL ES 3.2 V@1\n",
+            "getevent -p": b"    ABS (0003): 0035  : value 0, min 0, max 1079, fuzz 0, flat 0, resolution 0\n"
+                           b"                0036  : value 0, min 0, max 1919, fuzz 0, flat 0, resolution 0\n",
+            "cat /proc/cpuinfo": b"processor\t: 0\nprocessor\t: 1\nHardware\t: Fake SoC\n",
+            "cat /sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq": b"2450000",
+            "df /data": b"Filesystem  Size Used Avail Use% Mounted on\n/dev/block/dm-0 52G 20G 32G 40% /data\n",
+            "dumpsys meminfo": b"Total RAM: 5,799,768K (status normal)\n",
+        }
+        self.props = {
+            "ro.build.version.sdk": "30",
+            "ro.sf.lcd_density": "480",
+            "ro.product.model": "Fake Phone",
+            "ro.product.manufacturer": "Airtest",
+            "ro.product.cpu.abi": "arm64-v8a",
+            "sys.boot_completed": "1",
+        }
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+
+class TestAdbClient(unittest.TestCase):
+    """ADB methods over the in-process client, with a fake adb server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeAdbServer()
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.port = cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.adb = ADB("fake", adb_path="adb_not_used", server_addr=("127.0.0.1", self.port))
+        self.start_cmd = mock.patch.object(self.adb, "start_cmd", side_effect=AssertionError("adb executable used"))
+        self.start_cmd.start()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.start_cmd.stop()
+        self.adb._forward_local_using = []
+        ADB._instances.remove(self.adb)
+        shutil.rmtree(self.tmpdir)
+
+    def test_shell(self):
+        self.assertEqual(self.adb.sdk_version, 30)
+        self.assertEqual(self.adb.shell("echo hello"), "hello\n")
+        with self.assertRaises(AdbShellError) as cm:
+            self.adb.shell("exit 3")
+        self.assertIn(b"failed", cm.exception.stderr)
+        self.assertEqual(self.adb.cmd("exec-out echo raw", ensure_unicode=False), b"raw\n")
+
+    def test_devices(self):
+        self.assertEqual(self.adb.devices(), [("fake", "device")])
+        self.assertEqual(self.adb.get_status(), "device")
+        adb = ADB("other", adb_path="adb_not_used", server_addr=("127.0.0.1", self.port))
+        ADB._instances.remove(adb)
+        self.assertIsNone(adb.get_status())
+        with self.assertRaises(DeviceConnectionError):
+            adb.shell("echo hello")
+
+    def test_forward(self):
+        self.adb.forward("tcp:11111", "tcp:5001")
+        with self.assertRaises(AdbError):
+            self.adb.forward("tcp:11111", "tcp:5002")
+        self.assertEqual(list(self.adb.get_forwards()), [("fake", "tcp:11111", "tcp:5001")])
+        self.adb.remove_forward("tcp:11111")
+        self.assertEqual(list(self.adb.get_forwards()), [])
+        # ignored if already removed
+        self.adb.remove_forward("tcp:11111")
+
+    def test_push_pull(self):
+        local = os.path.join(self.tmpdir, "test.bin")
+        data = os.urandom(200 * 1024)
+        with open(local, "wb") as f:
+            f.write(data)
+        self.assertEqual(self.adb.push(local, "/data/local/tmp"), '"/data/local/tmp/test.bin"')
+        self.assertEqual(self.server.files["/data/local/tmp/test.bin"], data)
+        self.adb.pull("/data/local/tmp/test.bin", os.path.join(self.tmpdir, "pulled.bin"))
+        with open(os.path.join(self.tmpdir, "pulled.bin"), "rb") as f:
+            self.assertEqual(f.read(), data)
+        # into the directory
+        os.mkdir(os.path.join(self.tmpdir, "dir"))
+        self.adb.pull("/data/local/tmp/test.bin", os.path.join(self.tmpdir, "dir"))
+        self.assertTrue(os.path.isfile(os.path.join(self.tmpdir, "dir", "test.bin")))
+        # local errors are reported like the adb executable
+        with self.assertRaises(AdbError):
+            self.adb.pull("/data/local/tmp/test.bin", os.path.join(self.tmpdir, "missing", "pulled.bin"))
+
+    def test_timeout(self):
+        # the timeout is for the whole command, not each read
+        with self.assertRaises(RuntimeError):
+            self.adb.cmd("exec-out trickle", timeout=0.3)
+        self.assertEqual(self.adb.cmd("exec-out trickle", timeout=5, ensure_unicode=False), b"." * 5)
+
+    def test_screencap_raw(self):
+        self.server.screen = struct.pack("<III", 2, 2, 1) + os.urandom(16)
+        buffer, size = self.adb.screencap_raw()
+        self.assertEqual(buffer[:size].tobytes(), self.server.screen)
+
+    def test_shell_batch(self):
+        del self.server.cmds[:]
+        outputs = self.adb.shell_batch(["echo hello", ["echo", "a", "b"], "exit 2",
+                                        "cat /sys/devices/system/cpu/cpu0/cpufreq/cpuinfo_max_freq"])
+        self.assertEqual(outputs, ["hello\n", "a b\n", None, "2450000"])
+        self.assertEqual(len(self.server.cmds), 5)
+        self.assertEqual(self.adb.shell_batch([]), [])
+
+    def test_display_info(self):
+        self.adb._sdk_version = 30
+        del self.server.cmds[:]
+        self.assertEqual(self.adb.get_display_info(), {
+            "width": 720, "height": 1280, "density": 3.0, "orientation": 1, "rotation": 90,
+            "max_x": 1079, "max_y": 1919})
+        # one adb shell
+        self.assertEqual(len([cmd for cmd in self.server.cmds if "; r=$?;" in cmd]), 1)
+        self.assertEqual(self.adb.getPhysicalDisplayInfo(), {"width": 720, "height": 1280, "density": 3.0})
+
+    def test_device_info(self):
+        self.adb._sdk_version = None
+        del self.server.cmds[:]
+        info = self.adb.get_device_info()
+        self.assertEqual(len([cmd for cmd in self.server.cmds if "; r=$?;" in cmd]), 1)
+        self.assertEqual(info, {
+            "platform": "Android", "serialno": "fake", "memory": "6G", "storage": "64G",
+            "display": {"width": 720, "height": 1280, "density": 3.0},
+            "cpuinfo": {"cpuNum": 2, "cpuName": "Fake SoC"}, "cpufreq": "2.5GHz", "cpuabi": "arm64-v8a",
+            "sdkversion": 30, "gpu": {"gpuModel": "Adreno (TM) 540", "opengl": "OpenGL ES 3.2"},
+            "model": "Fake Phone", "manufacturer": "Airtest"})
+        self.assertEqual(self.adb._sdk_version, 30)
+        self.assertEqual(self.adb._get_device_info_one_by_one(), info)
+
+    def test_getprop_cache(self):
+        self.adb.invalidate(include_ro=True)
+        del self.server.cmds[:]
+        self.assertEqual(self.adb.getprop("ro.product.model"), "Fake Phone")
+        self.assertEqual(self.adb.getprop("ro.product.manufacturer"), "Airtest")
+        self.assertEqual(self.adb.sdk_version, 30)
+        # one getprop for all ro.* properties
+        self.assertEqual(self.server.cmds, ["getprop"])
+        # the others are queried each time
+        self.assertEqual(self.adb.getprop("sys.boot_completed"), "1")
+        self.server.props["sys.boot_completed"] = "0"
+        self.assertEqual(self.adb.getprop("sys.boot_completed"), "0")
+        self.assertEqual(self.adb.getprop("not.set"), "")
+        self.assertEqual(self.adb.getprop("ro.not.set"), "")
+        self.assertEqual(self.server.cmds[1:], ["getprop sys.boot_completed", "getprop sys.boot_completed",
+                                                "getprop not.set", "getprop ro.not.set"])
+        # the raw output is not cached
+        self.assertEqual(self.adb.getprop("ro.product.model", strip=False), "Fake Phone\n")
+        self.assertEqual(self.server.cmds[-1], "getprop ro.product.model")
+        # ro.* properties are kept until invalidate(include_ro=True)
+        self.server.props["ro.product.model"] = "Other Phone"
+        self.adb.invalidate()
+        self.assertEqual(self.adb.getprop("ro.product.model"), "Fake Phone")
+        self.adb.invalidate("ro.product.model")
+        self.assertEqual(self.adb.getprop("ro.product.model"), "Other Phone")
+        self.server.props["ro.product.model"] = "Fake Phone"
+        self.adb.invalidate(include_ro=True)
+        self.assertEqual(self.adb.getprop("ro.product.model"), "Fake Phone")
+        self.server.props["sys.boot_completed"] = "1"
+
+    def test_getprop_snapshot(self):
+        self.adb.invalidate(include_ro=True)
+        self.adb.PROP_CACHE_TTL = 10
+        try:
+            del self.server.cmds[:]
+            self.assertEqual(self.adb.getprop("sys.boot_completed"), "1")
+            self.assertEqual(self.adb.getprop("ro.product.model"), "Fake Phone")
+            self.assertEqual(self.adb.getprop("not.set"), "")
+            self.assertEqual(self.server.cmds, ["getprop"])
+
+            self.server.props["sys.boot_completed"] = "0"
+            self.assertEqual(self.adb.getprop("sys.boot_completed"), "1")
+            # only the property invalidated is queried again
+            self.adb.invalidate("sys.boot_completed")
+            del self.server.cmds[:]
+            self.assertEqual(self.adb.getprop("sys.boot_completed"), "0")
+            self.assertEqual(self.adb.getprop("sys.boot_completed"), "0")
+            self.assertEqual(self.server.cmds, ["getprop sys.boot_completed"])
+            # the snapshot expires
+            self.adb._props_time -= self.adb.PROP_CACHE_TTL + 1
+            self.server.props["sys.boot_completed"] = "1"
+            self.assertEqual(self.adb.getprop("sys.boot_completed"), "1")
+        finally:
+            del self.adb.PROP_CACHE_TTL
+            self.server.props["sys.boot_completed"] = "1"
+            self.adb.invalidate(include_ro=True)
+
+    def test_getprop_lock(self):
+        # invalidate() waits for the dump in progress, instead of being overwritten by the old values
+        self.adb.PROP_CACHE_TTL = 10
+        dumping, resume = threading.Event(), threading.Event()
+        raw_shell = self.adb.raw_shell
+
+        def slow_raw_shell(cmds, *args, **kwargs):
+            output = raw_shell(cmds, *args, **kwargs)
+            if cmds == ["getprop"]:
+                dumping.set()
+                resume.wait(5)
+            return output
+
+        try:
+            with mock.patch.object(self.adb, "raw_shell", side_effect=slow_raw_shell):
+                dump = threading.Thread(target=self.adb.getprops, kwargs={"refresh": True})
+                dump.start()
+                self.assertTrue(dumping.wait(5))
+                self.server.props["sys.boot_completed"] = "0"
+                invalidate = threading.Thread(target=self.adb.invalidate, args=("sys.boot_completed",))
+                invalidate.start()
+                invalidate.join(0.2)
+                self.assertTrue(invalidate.is_alive())
+                resume.set()
+                dump.join(5)
+                invalidate.join(5)
+                self.assertEqual(self.adb.getprop("sys.boot_completed"), "0")
+        finally:
+            resume.set()
+            del self.adb.PROP_CACHE_TTL
+            self.server.props["sys.boot_completed"] = "1"
+            self.adb.invalidate(include_ro=True)
+
+    def test_getprops_multiline(self):
+        self.server.props["persist.sys.multiline"] = "first\nsecond]\n[third"
+        try:
+            props = self.adb.getprops(refresh=True)
+        finally:
+            del self.server.props["persist.sys.multiline"]
+        self.assertEqual(props["persist.sys.multiline"], "first\nsecond]\n[third")
+        self.assertEqual(props["ro.product.model"], "Fake Phone")
+        self.assertEqual(len(props), len(self.server.props) + 1)
+        # the line breaks of a pty
+        self.adb._update_props("[a]: [1\r\n2]\r\n[b]: []\r\n")
+        self.assertEqual(self.adb._props, {"a": "1\n2", "b": ""})
+        self.adb.invalidate(include_ro=True)
+
+    def test_pool(self):
+        client = AdbClient("127.0.0.1", self.port)
+        client.POOL_SIZE = 1
+        self.server.max_running = 0
+        threads = [threading.Thread(target=client.shell, args=("fake", "sleep")) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.server.max_running, 1)
+
+    def test_fallback(self):
+        # commands not supported by the client use the adb executable
+        self.start_cmd.stop()
+        with mock.patch.object(self.adb, "start_cmd") as start_cmd:
+            start_cmd.return_value.communicate.return_value = (b"Android Debug Bridge version 1.0.41\n", b"")
+            start_cmd.return_value.returncode = 0
+            self.assertIn("1.0.41", self.adb.version())
+            start_cmd.assert_called_once_with("version", False)
+            # and all commands if the adb server is not running
+            start_cmd.reset_mock()
+            start_cmd.return_value.communicate.return_value = (b"hello\n", b"")
+            sock = socket.socket()
+            sock.bind(("127.0.0.1", 0))
+            self.adb.port = sock.getsockname()[1]
+            sock.close()
+            self.assertEqual(self.adb.cmd("shell echo hello"), "hello\n")
+            self.assertEqual(start_cmd.call_count, 1)
+        self.start_cmd.start()
+
+
+if __name__ == '__main__':
+    unittest.main()
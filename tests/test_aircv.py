@@ -4,11 +4,22 @@
 """Unittest for aircv."""
 
 
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 from airtest.aircv import imread
+from airtest.aircv.cal_confidence import cal_rgb_confidence, prepare_rgb_search
+from airtest.aircv.screen_context import ScreenContext
+from airtest.aircv.utils import img_mat_rgb_2_gray
+from airtest.aircv.keypoint_base import filter_good_matches, get_match_points
+from airtest.aircv.keypoint_cache import KEYPOINT_CACHE, SCREEN_INDEX_CACHE, CACHE_DIRNAME, image_key, get_keypoints
 from airtest.aircv.keypoint_matching import *  # noqa
 from airtest.aircv.keypoint_matching_contrib import *  # noqa
 from airtest.aircv.template_matching import *  # noqa
+from airtest.aircv.pyramid_template_matching import PyramidTemplateMatching
+from airtest.aircv.multiscale_template_matching import MultiScaleTemplateMatching
 from airtest.aircv.sift import find_sift
 from airtest.aircv.template import find_template, find_all_template
 
@@ -45,6 +56,153 @@ class TestAircv(unittest.TestCase):
         result = TemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_all_results()
         self.assertIsInstance(result, list)
 
+    def test_template_prefilter(self):
+        """Windows whose statistics do not fit the template are skipped."""
+        import numpy as np
+        # large uniform areas
+        screen = np.full_like(self.template_src, 30)
+        screen[1400:1700, 200:900] = self.template_src[1400:1700, 200:900]
+        h, w = self.template_sch.shape[:2]
+        screen[800:800 + h, 400:400 + w] = self.template_sch
+        for rgb in (True, False):
+            matching = TemplateMatching(self.template_sch, screen, threshold=self.THRESHOLD, rgb=rgb, prefilter=True)
+            res = matching._get_template_result_matrix()
+            self.assertGreater(np.mean(res == -1), 0.5)
+            expected = TemplateMatching(self.template_sch, screen, threshold=self.THRESHOLD, rgb=rgb).find_all_results()
+            results = matching.find_all_results()
+            self.assertEqual([r["result"] for r in results], [r["result"] for r in expected])
+            for result, expected_result in zip(results, expected):
+                self.assertAlmostEqual(result["confidence"], expected_result["confidence"], places=4)
+            self.assertEqual(matching.find_best_result()["result"], (400 + int(w / 2), 800 + int(h / 2)))
+        # nothing is skipped on the textured screen
+        results = TemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_all_results(prefilter=True)
+        self.assertEqual(sorted(r["result"] for r in results), sorted(r["result"] for r in TemplateMatching(
+            self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_all_results()))
+
+    def test_find_all_template_many(self):
+        """All instances are found, the number of results is limited by max_count."""
+        import cv2
+        import numpy as np
+        icon = cv2.resize(self.template_sch, (70, 70), interpolation=cv2.INTER_AREA)
+        screen = np.clip(np.random.RandomState(1).normal(120, 10, (1920, 1080, 3)), 0, 255).astype(np.uint8)
+        positions = set()
+        for row in range(10):
+            for col in range(8):
+                x, y = 40 + col * 130, 100 + row * 170
+                screen[y:y + 70, x:x + 70] = icon
+                positions.add((x + 35, y + 35))
+        for rgb in (True, False):
+            matching = TemplateMatching(icon, screen, threshold=self.THRESHOLD, rgb=rgb)
+            results = matching.find_all_results(max_count=0)
+            self.assertEqual(set(r["result"] for r in results), positions)
+            self.assertEqual(len(matching.find_all_results()), TemplateMatching.MAX_RESULT_COUNT)
+            results = find_all_template(screen, icon, threshold=self.THRESHOLD, rgb=rgb, max_count=0)
+            self.assertEqual(set(r["result"] for r in results), positions)
+            self.assertEqual(len(find_all_template(screen, icon, threshold=self.THRESHOLD, rgb=rgb, max_count=5)), 5)
+
+    def test_find_all_template_repetitive(self):
+        """A repetitive texture has countless maxima, the cost stays bounded by the results taken."""
+        import time
+        import numpy as np
+        ys, xs = np.mgrid[:1920, :1080]
+        screen = np.zeros((1920, 1080, 3), dtype=np.uint8)
+        screen[(ys // 10 + xs // 10) % 2 == 1] = 255
+        tile = screen[100:120, 100:120].copy()
+        for rgb in (True, False):
+            start = time.time()
+            results = TemplateMatching(tile, screen, threshold=self.THRESHOLD, rgb=rgb).find_all_results()
+            self.assertLess(time.time() - start, 2)
+            self.assertEqual(len(results), TemplateMatching.MAX_RESULT_COUNT)
+            # the results do not overlap
+            centers = [r["result"] for r in results]
+            for i, (x1, y1) in enumerate(centers):
+                for x2, y2 in centers[i + 1:]:
+                    self.assertTrue(abs(x1 - x2) > 10 or abs(y1 - y2) > 10)
+            self.assertEqual(len(find_all_template(screen, tile, threshold=self.THRESHOLD, rgb=rgb, max_count=3)), 3)
+
+    def test_prepare_rgb_search(self):
+        """The precomputed template gives the same confidence as the raw one."""
+        h, w = self.template_sch.shape[:2]
+        results = TemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_all_results()
+        search = prepare_rgb_search(self.template_sch)
+        self.assertIs(prepare_rgb_search(self.template_sch.copy()), search)
+        for r in results:
+            x, y = r["rectangle"][0]
+            crop = self.template_src[y:y + h, x:x + w]
+            self.assertEqual(cal_rgb_confidence(crop, search), cal_rgb_confidence(crop, self.template_sch))
+            self.assertEqual(cal_rgb_confidence(crop, search), r["confidence"])
+        small = self.template_sch[:20, :30]
+        self.assertAlmostEqual(cal_rgb_confidence(small.copy(), small), 1, places=4)
+
+    def test_screen_context(self):
+        """The gray screen is computed once and shared by all methods."""
+        screen = ScreenContext(self.template_src)
+        expected = TemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_all_results()
+        with mock.patch("airtest.aircv.screen_context.img_mat_rgb_2_gray", wraps=img_mat_rgb_2_gray) as to_gray:
+            for cls in (TemplateMatching, PyramidTemplateMatching, MultiScaleTemplateMatching):
+                result = cls(self.template_sch, screen, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+                distance = min(abs(result["result"][0] - r["result"][0]) + abs(result["result"][1] - r["result"][1]) for r in expected)
+                self.assertLess(distance, 5)
+            self.assertEqual(to_gray.call_count, 1)
+        self.assertEqual(len(screen.gray_pyramid(2)), 3)
+        with self.assertRaises(AssertionError):
+            img_mat_rgb_2_gray(screen.gray)
+
+    def test_find_pyramid_template(self):
+        """Coarse-to-fine pyramid template matching."""
+        result = PyramidTemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        expected = TemplateMatching(self.template_sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_all_results()
+        self.assertIsInstance(result, dict)
+        self.assertIn(result["result"], [r["result"] for r in expected])
+        self.assertEqual(len(result["rectangle"]), 4)
+
+    def test_find_pyramid_template_not_found(self):
+        """Pyramid template matching with a template not in the screen."""
+        import numpy as np
+        noise = np.random.RandomState(0).randint(0, 255, (80, 80, 3)).astype(np.uint8)
+        result = PyramidTemplateMatching(noise, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        self.assertIsNone(result)
+
+    def test_find_multiscale_template(self):
+        """Multi-scale template matching with a scaled template, resized templates are reused in the next search."""
+        import cv2
+        sch = cv2.resize(self.template_src[1000:1060, 600:660], (78, 78))
+        MultiScaleTemplateMatching.TEMPLATE_SCALE_CACHE.clear()
+        result = MultiScaleTemplateMatching(sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        self.assertIsInstance(result, dict)
+        self.assertAlmostEqual(result["result"][0], 630, delta=3)
+        self.assertAlmostEqual(result["result"][1], 1030, delta=3)
+        misses = MultiScaleTemplateMatching.TEMPLATE_SCALE_CACHE.misses
+        result2 = MultiScaleTemplateMatching(sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        self.assertEqual(result2["result"], result["result"])
+        self.assertEqual(MultiScaleTemplateMatching.TEMPLATE_SCALE_CACHE.misses, misses)
+
+    def test_multiscale_workers(self):
+        """The thread pool follows MAX_WORKERS."""
+        import cv2
+        from airtest.utils.snippet import EXECUTORS
+        sch = cv2.resize(self.template_src[1000:1060, 600:660], (78, 78))
+        expected = MultiScaleTemplateMatching(sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        for workers in (2, 3):
+            with mock.patch.object(MultiScaleTemplateMatching, "MAX_WORKERS", workers):
+                result = MultiScaleTemplateMatching(sch, self.template_src, threshold=self.THRESHOLD,
+                                                    rgb=self.RGB).find_best_result()
+            self.assertEqual(result["result"], expected["result"])
+            self.assertEqual(EXECUTORS["mstpl"]._max_workers, workers)
+
+    def test_multiscale_umat_backend(self):
+        """The umat backend gives the same result as numpy, unknown backends are rejected."""
+        import cv2
+        sch = cv2.resize(self.template_src[1000:1060, 600:660], (78, 78))
+        expected = MultiScaleTemplateMatching(sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+        matching = MultiScaleTemplateMatching(sch, self.template_src, threshold=self.THRESHOLD, rgb=self.RGB, backend="umat")
+        self.assertEqual(matching.backend, "umat")
+        result = matching.find_best_result()
+        self.assertEqual(result["result"], expected["result"])
+        self.assertAlmostEqual(result["confidence"], expected["confidence"], places=4)
+        with self.assertRaises(ValueError):
+            MultiScaleTemplateMatching(sch, self.template_src, backend="gpu")
+
     def test_find_kaze(self):
         """KAZE matching."""
         # 较慢,稍微稳定一点.
@@ -69,6 +227,73 @@ class TestAircv(unittest.TestCase):
         result = ORBMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
         self.assertIsInstance(result, dict)
 
+    def test_keypoint_cache(self):
+        """Template keypoints are computed once, detectors are reused in the same thread."""
+        KEYPOINT_CACHE.clear()
+        result = KAZEMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB)
+        result.find_best_result()
+        self.assertEqual(KEYPOINT_CACHE.misses, 1)
+        again = KAZEMatching(self.keypoint_sch.copy(), self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB)
+        self.assertEqual(again.find_best_result()["result"], result.find_best_result()["result"])
+        self.assertEqual(KEYPOINT_CACHE.misses, 1)
+        self.assertIs(again.detector, result.detector)
+
+    def test_keypoint_npz_cache(self):
+        """Template keypoints are saved and loaded with .npz files."""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            KEYPOINT_CACHE.clear()
+            result = BRISKMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB, cache_dir=tmpdir).find_best_result()
+            self.assertEqual(len(os.listdir(os.path.join(tmpdir, CACHE_DIRNAME))), 1)
+            kp, des = KEYPOINT_CACHE.get((image_key(self.keypoint_sch), "BRISK"))
+            # load from the file instead of computing again
+            KEYPOINT_CACHE.clear()
+            with mock.patch.object(BRISKMatching, "get_keypoints_and_descriptors", side_effect=AssertionError):
+                kp2, des2 = get_keypoints(self.keypoint_sch, "BRISK", None, cache_dir=tmpdir)
+            self.assertEqual([k.pt for k in kp2], [k.pt for k in kp])
+            self.assertTrue((des2 == des).all())
+            ret = BRISKMatching(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB, cache_dir=tmpdir).find_best_result()
+            self.assertEqual(ret["result"], result["result"])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_keypoint_matcher_backend(self):
+        """The screen index is built once and shared, with brute force or approximate matchers."""
+        for cls in (KAZEMatching, BRISKMatching):
+            expected = cls(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB).find_best_result()
+            for backend in ("bf", "flann"):
+                SCREEN_INDEX_CACHE.clear()
+                result = cls(self.keypoint_sch, self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB, matcher_backend=backend).find_best_result()
+                self.assertIsInstance(result, dict)
+                self.assertLess(abs(result["result"][0] - expected["result"][0]) + abs(result["result"][1] - expected["result"][1]), 5)
+                # another template queried against the same screen reuses the index
+                cls(self.keypoint_sch[10:-10, 10:-10], self.keypoint_src, threshold=self.THRESHOLD, rgb=self.RGB, matcher_backend=backend).find_best_result()
+                self.assertEqual(SCREEN_INDEX_CACHE.info()["size"], 1)
+                self.assertEqual(SCREEN_INDEX_CACHE.hits, 1)
+        with self.assertRaises(ValueError):
+            KAZEMatching(self.keypoint_sch, self.keypoint_src, matcher_backend="unknown")
+
+    def test_filter_good_matches(self):
+        """Ratio test and dedup by integer source coordinates."""
+        kp_src = [cv2.KeyPoint(1.2, 2.7, 1), cv2.KeyPoint(1.9, 2.1, 1), cv2.KeyPoint(5, 6, 1)]
+        matches = [
+            (cv2.DMatch(0, 2, 1), cv2.DMatch(0, 1, 10)),
+            (cv2.DMatch(1, 0, 1), cv2.DMatch(1, 2, 10)),
+            # same integer coordinate as the previous one
+            (cv2.DMatch(2, 1, 1), cv2.DMatch(2, 2, 10)),
+            # not distinct enough
+            (cv2.DMatch(3, 0, 9), cv2.DMatch(3, 1, 10)),
+            # fewer than 2 neighbours
+            (cv2.DMatch(4, 1, 1),),
+        ]
+        good = filter_good_matches(matches, kp_src, 0.59)
+        self.assertEqual([(m.queryIdx, m.trainIdx) for m in good], [(0, 2), (1, 0)])
+        kp_sch = [cv2.KeyPoint(i, i, 1) for i in range(5)]
+        sch_pts, src_pts = get_match_points(kp_sch, kp_src, good)
+        self.assertEqual(sch_pts.shape, (2, 1, 2))
+        self.assertEqual(src_pts[:, 0].tolist(), [[5, 6], [kp_src[0].pt[0], kp_src[0].pt[1]]])
+        self.assertEqual(filter_good_matches([], kp_src, 0.59), [])
+
     def test_contrib_find_sift(self):
         """SIFT matching (----need OpenCV contrib module----)."""
         # 慢,最稳定
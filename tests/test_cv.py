@@ -0,0 +1,358 @@
+# encoding=utf-8
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import cv2
+import numpy as np
+from unittest import mock
+from airtest.core import cv
+from airtest.aircv import imread
+from airtest.aircv.frame import Frame
+from airtest.aircv.screen_context import as_screen_context
+from airtest.core.cv import Template, TEMPLATE_CACHE, MATCHING_METHODS, Predictor, loop_find, loop_find_any, match_many, AdaptivePoller
+from airtest.core.error import TargetNotFoundError
+from airtest.core.device import Device
+from airtest.core.helper import G
+from airtest.core.match_stats import MATCH_STATS, MatchStats, TemplateStats
+from airtest.core.settings import Settings as ST
+from airtest.utils.snippet import EXECUTORS
+
+THISDIR = os.path.dirname(__file__)
+TEMPLATE_SEARCH = os.path.join(THISDIR, "matching_images/template_search.png")
+TEMPLATE_SCREEN = os.path.join(THISDIR, "matching_images/template_screen.png")
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.screen = imread(TEMPLATE_SCREEN)
+
+    def setUp(self):
+        TEMPLATE_CACHE.clear()
+
+    def test_cache_hit(self):
+        tpl = Template(TEMPLATE_SEARCH)
+        first = tpl._get_template_image(self.screen)
+        second = Template(TEMPLATE_SEARCH)._get_template_image(self.screen)
+        self.assertIs(first, second)
+        self.assertEqual(TEMPLATE_CACHE.info()["hits"], 1)
+        self.assertEqual(TEMPLATE_CACHE.info()["misses"], 1)
+        self.assertFalse(first.image.flags.writeable)
+        self.assertEqual(first.gray.ndim, 2)
+
+    def test_cache_key_resolution(self):
+        tpl = Template(TEMPLATE_SEARCH, resolution=(1920, 1080))
+        tpl._get_template_image(self.screen)
+        small_screen = self.screen[:self.screen.shape[0] // 2, :self.screen.shape[1] // 2]
+        resized = tpl._get_template_image(small_screen).resized
+        self.assertEqual(TEMPLATE_CACHE.info()["misses"], 2)
+        self.assertLess(resized.shape[0], imread(TEMPLATE_SEARCH).shape[0])
+
+    def test_cache_mtime(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filepath = os.path.join(tmpdir, "tpl.png")
+            shutil.copy(TEMPLATE_SEARCH, filepath)
+            tpl = Template(filepath)
+            tpl._get_template_image(self.screen)
+            stat = os.stat(filepath)
+            os.utime(filepath, (stat.st_atime, stat.st_mtime + 10))
+            tpl._get_template_image(self.screen)
+            self.assertEqual(TEMPLATE_CACHE.info()["misses"], 2)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_cache_disabled(self):
+        cache_size = ST.TEMPLATE_CACHE_SIZE
+        ST.TEMPLATE_CACHE_SIZE = 0
+        try:
+            tpl = Template(TEMPLATE_SEARCH)
+            self.assertIsNot(tpl._get_template_image(self.screen), tpl._get_template_image(self.screen))
+            self.assertEqual(len(TEMPLATE_CACHE), 0)
+        finally:
+            ST.TEMPLATE_CACHE_SIZE = cache_size
+
+    def test_match_in_reduced_frame(self):
+        data = cv2.imencode(".jpg", self.screen, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+        tpl = Template(TEMPLATE_SEARCH)
+        # the template appears several times in the screen
+        expected = [r["result"] for r in tpl.match_all_in(self.screen)]
+        reduce_factor = ST.MATCH_REDUCE_FACTOR
+        ST.MATCH_REDUCE_FACTOR = 2
+        try:
+            frame = Frame(data)
+            pos = tpl.match_in(frame)
+            self.assertFalse(frame.decoded)
+        finally:
+            ST.MATCH_REDUCE_FACTOR = reduce_factor
+        self.assertIsNotNone(pos)
+        self.assertTrue(any(abs(pos[0] - x) <= 3 and abs(pos[1] - y) <= 3 for x, y in expected))
+
+    def test_match_in(self):
+        tpl = Template(TEMPLATE_SEARCH)
+        pos = tpl.match_in(self.screen)
+        self.assertEqual(pos, tpl.match_in(self.screen))
+        self.assertIsNotNone(pos)
+        self.assertGreaterEqual(TEMPLATE_CACHE.info()["hits"], 1)
+
+
+class FakeDevice(Device):
+
+    def __init__(self, screen):
+        super(FakeDevice, self).__init__()
+        self.screen = screen
+
+    def snapshot(self, filename=None, quality=10, max_size=None):
+        return self.screen
+
+
+class TestLoopFind(unittest.TestCase):
+
+    def setUp(self):
+        self._device = G._DEVICE
+        G.DEVICE = FakeDevice(imread(TEMPLATE_SCREEN))
+
+    def tearDown(self):
+        G.DEVICE = self._device
+
+    def test_snapshot_frame(self):
+        frame = G.DEVICE.snapshot_frame()
+        self.assertIsInstance(frame, Frame)
+        self.assertIs(frame.img, G.DEVICE.screen)
+
+    def test_loop_find(self):
+        pos = loop_find(Template(TEMPLATE_SEARCH), timeout=1)
+        self.assertEqual(pos, Template(TEMPLATE_SEARCH).match_in(G.DEVICE.screen))
+
+    def test_loop_find_static_screen(self):
+        # the screen does not change, so it is matched only once
+        query = Template(TEMPLATE_SEARCH)
+        with mock.patch.object(query, "match_in", return_value=None) as match_in:
+            with mock.patch.object(G.DEVICE, "snapshot", wraps=G.DEVICE.snapshot) as snapshot:
+                with mock.patch.object(ST, "ADAPTIVE_POLL", True):
+                    with self.assertRaises(TargetNotFoundError):
+                        loop_find(query, timeout=0.3, interval=0.05)
+        self.assertEqual(match_in.call_count, 1)
+        self.assertGreater(snapshot.call_count, 1)
+        # matched on every attempt by default
+        with mock.patch.object(query, "match_in", return_value=None) as match_in:
+            with self.assertRaises(TargetNotFoundError):
+                loop_find(query, timeout=0.3, interval=0.05)
+        self.assertGreater(match_in.call_count, 1)
+
+    def test_adaptive_poller(self):
+        screen = G.DEVICE.screen
+        poller = AdaptivePoller(0.1)
+        self.assertTrue(poller.changed(Frame(img=screen)))
+        self.assertFalse(poller.changed(Frame(img=screen.copy())))
+        self.assertFalse(poller.changed(Frame(img=screen.copy())))
+        self.assertAlmostEqual(poller.delay, 0.4)
+        changed = screen.copy()
+        changed[100:130, 100:130] = 255 - changed[100:130, 100:130]
+        self.assertTrue(poller.changed(Frame(img=changed)))
+        self.assertEqual(poller.delay, 0.1)
+        # same sequence number of the frame pump, not decoded again
+        frame = Frame(img=screen, seq=1)
+        poller.changed(frame)
+        self.assertFalse(poller.changed(Frame(img=changed, seq=1)))
+
+    def test_adaptive_poller_after_input(self):
+        poller = AdaptivePoller(1)
+        G.LAST_INPUT_TIME = time.time()
+        try:
+            self.assertEqual(poller.next_delay(), ST.POLL_FAST_INTERVAL)
+        finally:
+            G.LAST_INPUT_TIME = 0
+        self.assertEqual(poller.next_delay(), 1)
+
+
+class TestMatchMany(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.missing = os.path.join(cls.tmpdir, "missing.png")
+        cv2.imwrite(cls.missing, np.random.RandomState(0).randint(0, 255, (40, 40, 3)).astype(np.uint8))
+        cls.screen = imread(TEMPLATE_SCREEN)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def setUp(self):
+        self._device = G._DEVICE
+        self._strategy = ST.CVSTRATEGY
+        ST.CVSTRATEGY = ["tpl"]
+        G.DEVICE = FakeDevice(self.screen)
+
+    def tearDown(self):
+        G.DEVICE = self._device
+        ST.CVSTRATEGY = self._strategy
+
+    def test_match_many(self):
+        queries = [Template(self.missing), Template(TEMPLATE_SEARCH)]
+        expected = Template(TEMPLATE_SEARCH).match_in(self.screen)
+        self.assertEqual(match_many(queries, self.screen), (1, expected))
+        self.assertEqual(match_many(queries, Frame(img=self.screen), best=True), (1, expected))
+        self.assertEqual(match_many(queries, self.screen, max_workers=2), (1, expected))
+        self.assertIsNone(match_many(queries[:1], self.screen))
+
+    def test_match_many_first(self):
+        queries = [Template(TEMPLATE_SEARCH, target_pos=1), Template(TEMPLATE_SEARCH)]
+        self.assertEqual(match_many(queries, self.screen)[0], 0)
+
+    def test_loop_find_any(self):
+        queries = [Template(self.missing), Template(TEMPLATE_SEARCH)]
+        index, pos = loop_find_any(queries, timeout=1)
+        self.assertEqual(index, 1)
+        with self.assertRaises(TargetNotFoundError):
+            loop_find_any(queries[:1], timeout=0.1, interval=0.05)
+
+
+class TestPredictRoi(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.screen = imread(TEMPLATE_SCREEN)
+        cls.resolution = (cls.screen.shape[1], cls.screen.shape[0])
+        cls.positions = [r["result"] for r in Template(TEMPLATE_SEARCH).match_all_in(cls.screen)]
+
+    def setUp(self):
+        self._strategy = ST.CVSTRATEGY
+
+    def tearDown(self):
+        ST.CVSTRATEGY = self._strategy
+
+    def test_predict_roi(self):
+        # the template shows up several times, each one is found in the area predicted by its record_pos
+        self.assertGreater(len(self.positions), 1)
+        for strategy in (["tpl"], ["mstpl"], ["kaze"]):
+            ST.CVSTRATEGY = strategy
+            for pos in self.positions:
+                record_pos = Predictor.count_record_pos(pos, self.resolution)
+                template = Template(TEMPLATE_SEARCH, record_pos=record_pos, resolution=self.resolution, predict_roi=True)
+                ret = template._cv_match(self.screen)
+                self.assertLess(max(abs(ret["result"][0] - pos[0]), abs(ret["result"][1] - pos[1])), 5, strategy)
+                for x, y in ret["rectangle"]:
+                    self.assertTrue(0 <= x <= self.resolution[0] and 0 <= y <= self.resolution[1])
+
+    def test_predict_roi_fallback(self):
+        # nothing in the predicted area, fall back to the full screen
+        ST.CVSTRATEGY = ["tpl"]
+        template = Template(TEMPLATE_SEARCH, record_pos=(0.4, 0.8), resolution=self.resolution, predict_roi=True)
+        areas = template._get_search_areas(as_screen_context(self.screen), template._get_template_image(self.screen).resized)
+        self.assertEqual(len(areas), 3)
+        self.assertIsNone(areas[-1])
+        self.assertEqual(template._cv_match(self.screen)["result"], Template(TEMPLATE_SEARCH)._cv_match(self.screen)["result"])
+        template.predict_roi = False
+        self.assertEqual(template._get_search_areas(as_screen_context(self.screen), None), [None])
+
+
+class TestLearnStrategy(unittest.TestCase):
+
+    def setUp(self):
+        self._settings = ST.CVSTRATEGY, ST.LEARN_STRATEGY, ST.MATCH_STATS_PERSIST, ST.PROJECT_ROOT
+        self.screen = imread(TEMPLATE_SCREEN)
+        MATCH_STATS.clear()
+
+    def tearDown(self):
+        ST.CVSTRATEGY, ST.LEARN_STRATEGY, ST.MATCH_STATS_PERSIST, ST.PROJECT_ROOT = self._settings
+        MATCH_STATS.clear()
+
+    def test_sort_methods(self):
+        stats = TemplateStats()
+        stats.record("mstpl", False, 1.2)
+        stats.record("tpl", True, 0.1)
+        stats.record("kaze", True, 0.3)
+        self.assertEqual(stats.sort_methods(["mstpl", "tpl", "sift", "kaze"]), ["tpl", "kaze", "sift", "mstpl"])
+        stats.record("kaze", True, 0.3)
+        stats.record("tpl", False, 0.1)
+        self.assertEqual(stats.sort_methods(["mstpl", "tpl", "sift", "kaze"]), ["kaze", "tpl", "sift", "mstpl"])
+
+    def test_learn_strategy(self):
+        # mstpl cannot find a template without record resolution
+        ST.CVSTRATEGY = ["mstpl", "tpl"]
+        ST.LEARN_STRATEGY = True
+        template = Template(TEMPLATE_SEARCH)
+        ret = template._cv_match(self.screen)
+        stats = MATCH_STATS.get(template._get_template_image(self.screen).image)
+        self.assertEqual(stats.sort_methods(ST.CVSTRATEGY), ["tpl", "mstpl"])
+        self.assertEqual(stats.methods["mstpl"]["misses"], 1)
+        # searched around the last hit with tpl first
+        with mock.patch.object(Template, "_match_in_area", wraps=template._match_in_area) as match_in_area:
+            self.assertEqual(template._cv_match(self.screen)["result"], ret["result"])
+        self.assertEqual(match_in_area.call_count, 1)
+        self.assertEqual(match_in_area.call_args[0][3], ["tpl", "mstpl"])
+        self.assertEqual(stats.methods["tpl"]["hits"], 2)
+        self.assertEqual(stats.methods["mstpl"]["misses"], 1)
+
+    def test_persist(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        ST.MATCH_STATS_PERSIST = True
+        ST.PROJECT_ROOT = tmpdir
+        store = MatchStats()
+        store.get(self.screen).record("tpl", True, 0.1)
+        store.get(self.screen).record_hit((540, 960), (1080, 1920))
+        store.save()
+        self.assertTrue(os.path.isfile(os.path.join(tmpdir, "match_stats.json")))
+        stats = MatchStats().get(self.screen)
+        self.assertEqual(stats.methods["tpl"]["hits"], 1)
+        self.assertEqual(stats.last_hit, (0.5, 0.5))
+
+
+class SlowMatching(object):
+    """finds a fake result after 1s"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def find_best_result(self):
+        time.sleep(1)
+        return {"result": (0, 0), "rectangle": [(0, 0)] * 4, "confidence": 1.0}
+
+
+@mock.patch.dict(MATCHING_METHODS, {"slow": SlowMatching, "slow2": SlowMatching})
+class TestStrategyRacing(unittest.TestCase):
+
+    def setUp(self):
+        self._settings = ST.CVSTRATEGY, ST.CV_RACE_WORKERS, ST.CV_RACE_TOP_N, ST.CV_METHOD_DEADLINE
+        ST.CV_RACE_WORKERS = 2
+        self.screen = imread(TEMPLATE_SCREEN)
+
+    def tearDown(self):
+        ST.CVSTRATEGY, ST.CV_RACE_WORKERS, ST.CV_RACE_TOP_N, ST.CV_METHOD_DEADLINE = self._settings
+        # wait for the ignored methods still running in the pool
+        executor = EXECUTORS.pop("cv_race", None)
+        if executor:
+            executor.shutdown(wait=True)
+
+    def test_race(self):
+        # the faster method wins
+        ST.CVSTRATEGY = ["tpl"]
+        expected = Template(TEMPLATE_SEARCH)._cv_match(self.screen)
+        ST.CVSTRATEGY = ["slow", "tpl"]
+        start = time.time()
+        ret = Template(TEMPLATE_SEARCH)._cv_match(self.screen)
+        self.assertLess(time.time() - start, 0.9)
+        self.assertEqual(ret["result"], expected["result"])
+
+    def test_deadline(self):
+        ST.CVSTRATEGY = ["slow", "slow2"]
+        ST.CV_METHOD_DEADLINE = 0.1
+        start = time.time()
+        self.assertIsNone(Template(TEMPLATE_SEARCH)._cv_match(self.screen))
+        self.assertLess(time.time() - start, 0.9)
+
+    def test_top_n(self):
+        # only "slow" is raced, tpl is tried after it
+        ST.CVSTRATEGY = ["slow", "tpl"]
+        ST.CV_RACE_TOP_N = 1
+        self.assertEqual(Template(TEMPLATE_SEARCH)._cv_match(self.screen)["result"], (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
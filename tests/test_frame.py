@@ -0,0 +1,136 @@
+# encoding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+import struct
+import cv2
+from airtest import aircv
+from airtest.aircv.frame import Frame, RawFrame, parse_jpeg_header, parse_screencap_header
+from airtest.core.cv import try_log_screen
+from airtest.core.settings import Settings as ST
+
+THISDIR = os.path.dirname(__file__)
+SCREEN = os.path.join(THISDIR, "matching_images/template_screen.png")
+
+
+class TestFrame(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.img = aircv.imread(SCREEN)
+        cls.height, cls.width = cls.img.shape[:2]
+        cls.jpg = {q: cv2.imencode(".jpg", cls.img, [cv2.IMWRITE_JPEG_QUALITY, q])[1].tobytes() for q in (10, 50, 80)}
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parse_jpeg_header(self):
+        for q, data in self.jpg.items():
+            resolution, quality = parse_jpeg_header(data)
+            self.assertEqual(resolution, (self.width, self.height))
+            self.assertAlmostEqual(quality, q, delta=1)
+        self.assertEqual(parse_jpeg_header(b"not a jpg"), (None, None))
+
+    def test_lazy_decode(self):
+        frame = Frame(memoryview(self.jpg[80]), seq=1)
+        self.assertIsInstance(frame.data, bytes)
+        self.assertEqual(frame.resolution, (self.width, self.height))
+        self.assertFalse(frame.decoded)
+        img = frame.img
+        self.assertTrue(frame.decoded)
+        self.assertEqual(img.shape, self.img.shape)
+        self.assertIs(frame.img, img)
+
+    def test_reduced_decode(self):
+        frame = Frame(self.jpg[80])
+        for factor in (2, 4, 8):
+            img = frame.decode(factor)
+            self.assertEqual(img.shape[0], -(-self.height // factor))
+            self.assertEqual(img.shape[1], -(-self.width // factor))
+        self.assertFalse(frame.decoded)
+        self.assertEqual(frame.get_reduce_factor(max(self.width, self.height) // 3), 2)
+        self.assertEqual(frame.get_reduce_factor(1), 8)
+        self.assertEqual(frame.get_reduce_factor(None), 1)
+        # decoded images are not reduced
+        self.assertEqual(Frame(img=self.img).decode(4).shape, self.img.shape)
+
+    def test_save_reduced(self):
+        frame = Frame(self.jpg[80])
+        filename = os.path.join(self.tmpdir, "thumbnail.jpg")
+        self.assertTrue(frame.save(filename, quality=10, max_size=100))
+        self.assertFalse(frame.decoded)
+        self.assertEqual(max(aircv.get_resolution(aircv.imread(filename))), 100)
+
+    def test_png(self):
+        data = cv2.imencode(".png", self.img)[1].tobytes()
+        frame = Frame(data)
+        self.assertEqual(frame.resolution, (self.width, self.height))
+        self.assertFalse(frame.can_save_raw(quality=99))
+
+    def test_bad_data(self):
+        frame = Frame(b"broken")
+        self.assertIsNone(frame.img)
+        self.assertFalse(frame.save(os.path.join(self.tmpdir, "a.jpg")))
+
+    def test_save_raw(self):
+        frame = Frame(self.jpg[50])
+        filename = os.path.join(self.tmpdir, "raw.jpg")
+        self.assertTrue(frame.save(filename, quality=60))
+        self.assertFalse(frame.decoded)
+        with open(filename, "rb") as f:
+            self.assertEqual(f.read(), self.jpg[50])
+
+    def test_save_reencode(self):
+        frame = Frame(self.jpg[80])
+        # the quality is higher than required
+        self.assertFalse(frame.can_save_raw(quality=10))
+        # the size is larger than max_size
+        self.assertFalse(frame.can_save_raw(quality=90, max_size=100))
+        filename = os.path.join(self.tmpdir, "small.jpg")
+        frame.save(filename, quality=90, max_size=100)
+        self.assertEqual(max(aircv.get_resolution(aircv.imread(filename))), 100)
+
+    def test_transform(self):
+        frame = Frame(self.jpg[10], transform=lambda img: aircv.rotate(img, 90))
+        self.assertFalse(frame.can_save_raw(quality=90))
+        self.assertEqual(frame.resolution, (self.height, self.width))
+
+    def test_raw_frame(self):
+        rgba = cv2.cvtColor(self.img, cv2.COLOR_BGR2RGBA).tobytes()
+        for header in (struct.pack("<III", self.width, self.height, 1),
+                       struct.pack("<IIII", self.width, self.height, 1, 0)):
+            data = header + rgba
+            self.assertEqual(parse_screencap_header(data), (self.width, self.height, 1, len(header)))
+            frame = RawFrame(memoryview(data))
+            self.assertEqual(frame.resolution, (self.width, self.height))
+            self.assertFalse(frame.decoded)
+            self.assertTrue((frame.img == self.img).all())
+            self.assertEqual(frame.decode(4).shape[:2], (-(-self.height // 4), -(-self.width // 4)))
+        # rgb565 loses the low bits
+        rgb565 = cv2.cvtColor(self.img, cv2.COLOR_BGR2BGR565).tobytes()
+        img = RawFrame(struct.pack("<III", self.width, self.height, 4) + rgb565).img
+        self.assertLessEqual(cv2.absdiff(img, self.img).max(), 8)
+        self.assertIsNone(parse_screencap_header(self.jpg[10]))
+        # png/jpg output is decoded as usual
+        self.assertEqual(RawFrame(self.jpg[10]).resolution, (self.width, self.height))
+
+    def test_try_log_screen(self):
+        log_dir = ST.LOG_DIR
+        ST.LOG_DIR = self.tmpdir
+        try:
+            ret = try_log_screen(Frame(self.jpg[10]), quality=10)
+            self.assertEqual(ret["resolution"], (self.width, self.height))
+            with open(os.path.join(self.tmpdir, ret["screen"]), "rb") as f:
+                self.assertEqual(f.read(), self.jpg[10])
+            ret = try_log_screen(Frame(img=self.img), quality=10)
+            self.assertTrue(os.path.isfile(os.path.join(self.tmpdir, ret["screen"])))
+        finally:
+            ST.LOG_DIR = log_dir
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# encoding=utf-8
+import os
+import socket
+import threading
+import unittest
+from airtest.utils.safesocket import SafeSocket
+from airtest.core.ios.mjpeg_cap import SocketBuffer, MJpegcap
+
+
+class TestSafeSocket(unittest.TestCase):
+
+    def setUp(self):
+        self.local, self.remote = socket.socketpair()
+        self.sock = SafeSocket(self.local)
+
+    def tearDown(self):
+        self.sock.close()
+        self.remote.close()
+
+    def _send_later(self, data):
+        t = threading.Thread(target=self.remote.sendall, args=(data,))
+        t.daemon = True
+        t.start()
+        return t
+
+    def test_recv(self):
+        data = os.urandom(3 * 1024 * 1024)
+        t = self._send_later(data)
+        ret = self.sock.recv(len(data))
+        t.join()
+        self.assertIsInstance(ret, bytes)
+        self.assertEqual(ret, data)
+
+    def test_recv_view(self):
+        frames = [os.urandom(size) for size in (1000, 200000, 500, 300000)]
+        t = self._send_later(b"".join(frames))
+        for frame in frames:
+            view = self.sock.recv_view(len(frame))
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual(view, frame)
+        t.join()
+
+    def test_recv_view_ring(self):
+        self.remote.sendall(b"abcd" * SafeSocket.RING_SIZE)
+        views = [self.sock.recv_view(4) for _ in range(SafeSocket.RING_SIZE)]
+        self.assertEqual([v.tobytes() for v in views], [b"abcd"] * SafeSocket.RING_SIZE)
+        # the ring wraps around and reuses the first buffer
+        self.remote.sendall(b"efgh")
+        self.sock.recv_view(4)
+        self.assertEqual(views[0], b"efgh")
+
+    def test_recv_with_timeout_keeps_partial_data(self):
+        self.remote.sendall(b"12345")
+        self.assertIsNone(self.sock.recv_with_timeout(10, timeout=0.1))
+        self.remote.sendall(b"67890")
+        self.assertEqual(self.sock.recv_with_timeout(10, timeout=1, as_view=True), b"1234567890")
+
+    def test_connection_broken(self):
+        self.remote.sendall(b"123")
+        self.remote.close()
+        with self.assertRaises(socket.error):
+            self.sock.recv(10)
+
+
+class TestSocketBuffer(unittest.TestCase):
+
+    def test_read(self):
+        local, remote = socket.socketpair()
+        buf = SocketBuffer(local)
+        frame = os.urandom(500000)
+        header = b"HTTP/1.0 200 OK\r\nContent-Length: %d\r\n\r\n" % len(frame)
+        t = threading.Thread(target=remote.sendall, args=(header + frame + header,))
+        t.daemon = True
+        t.start()
+        self.assertEqual(buf.read_until(b"\r\n"), b"HTTP/1.0 200 OK")
+        self.assertEqual(buf.read_until(b"\r\n\r\n"), b"Content-Length: %d" % len(frame))
+        self.assertEqual(buf.read_bytes(len(frame)), frame)
+        self.assertEqual(buf.read_until(b"\r\n"), b"HTTP/1.0 200 OK")
+        t.join()
+        buf.close()
+        remote.close()
+
+    def test_frames_kept(self):
+        # frames returned by get_frame_from_stream are not overwritten by later frames
+        local, remote = socket.socketpair()
+        cap = MJpegcap()
+        cap.buf = SocketBuffer(local)
+        cap._is_running = True
+        cap._setup_stream_server_ready = True
+        frames = [os.urandom(1000) for _ in range(SafeSocket.RING_SIZE * 2)]
+        data = b"".join(b"--BoundaryString\r\nContent-Length: %d\r\n\r\n" % len(f) + f + b"\r\n" for f in frames)
+        t = threading.Thread(target=remote.sendall, args=(data,))
+        t.daemon = True
+        t.start()
+        kept = [cap.get_frame_from_stream() for _ in frames]
+        t.join()
+        self.assertTrue(all(isinstance(f, bytes) for f in kept))
+        self.assertEqual(kept, frames)
+        cap.buf.close()
+        remote.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
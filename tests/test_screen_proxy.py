@@ -4,6 +4,9 @@ from airtest.core.android.cap_methods.screen_proxy import ScreenProxy
 from airtest.core.android.cap_methods.minicap import Minicap
 from airtest.aircv.utils import string_2_img
 from numpy import ndarray
+import os
+import time
+import threading
 import unittest
 import warnings
 warnings.simplefilter("always")
@@ -96,3 +99,310 @@ class TestScreenProxy(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         cls.dev.rotation_watcher.teardown()
+
+
+class TestFramePump(unittest.TestCase):
+    """frame pump tests with a fake screen stream, no device needed"""
+
+    def setUp(self):
+        import cv2
+        import numpy as np
+        from airtest.core.android.cap_methods.base_cap import BaseCap
+
+        class FakeCap(BaseCap):
+            FRAME_PUMP_INTERVAL = 0
+
+            def __init__(self, *args, **kwargs):
+                super(FakeCap, self).__init__(*args, **kwargs)
+                self.count = 0
+                self.threads = set()
+                self.blocked = threading.Event()
+
+            def get_frame_from_stream(self):
+                self.threads.add(threading.current_thread().name)
+                if self.blocked.is_set():
+                    time.sleep(0.05)
+                    return None
+                self.count += 1
+                img = np.full((20, 10, 3), self.count % 256, dtype=np.uint8)
+                return memoryview(cv2.imencode(".png", img)[1].tobytes())
+
+            def snapshot(self, ensure_orientation=True, projection=None):
+                return super(FakeCap, self).snapshot(ensure_orientation)
+
+        self.cap = FakeCap(None)
+        self.screen_proxy = ScreenProxy(self.cap)
+
+    def tearDown(self):
+        self.screen_proxy.teardown_stream()
+
+    def test_snapshot_without_pump(self):
+        self.assertEqual(self.screen_proxy.frame_seq, 0)
+        self.assertIsNone(self.screen_proxy.get_latest_frame())
+        img = self.screen_proxy.snapshot()
+        self.assertEqual(img.shape, (20, 10, 3))
+        self.assertEqual(self.cap.count, 1)
+
+    def test_latest_frame(self):
+        self.screen_proxy.start_frame_pump()
+        frame = self.screen_proxy.get_latest_frame(timeout=5)
+        self.assertIsInstance(frame.data, bytes)
+        self.assertGreater(frame.seq, 0)
+        newer = self.screen_proxy.get_latest_frame(newer_than=frame.seq + 2, timeout=5)
+        self.assertGreater(newer.seq, frame.seq + 2)
+        self.assertGreaterEqual(newer.timestamp, frame.timestamp)
+
+        seq = self.screen_proxy.frame_seq
+        img = self.screen_proxy.snapshot(newer_than=seq, timeout=5)
+        self.assertIsInstance(img, ndarray)
+        self.assertEqual(img.shape, (20, 10, 3))
+
+    def test_stop_pump(self):
+        pump = self.screen_proxy.start_frame_pump()
+        self.assertTrue(pump.running)
+        self.screen_proxy.stop_frame_pump()
+        self.assertFalse(pump.running)
+        self.assertIsNone(self.screen_proxy.frame_pump)
+        count = self.cap.count
+        self.assertIsInstance(self.screen_proxy.snapshot(), ndarray)
+        self.assertEqual(self.cap.count, count + 1)
+
+    def test_no_fallback_while_pumping(self):
+        # only the pump thread reads the stream, even if no frame comes in time
+        pump = self.screen_proxy.start_frame_pump()
+        self.assertIsNotNone(self.screen_proxy.get_latest_frame(timeout=5))
+        self.cap.blocked.set()
+        # let the frame being captured through
+        time.sleep(0.1)
+        seq = self.screen_proxy.frame_seq
+        self.assertIsNone(self.screen_proxy.snapshot(newer_than=seq, timeout=0.2))
+        self.assertIsNone(self.screen_proxy.snapshot_frame(newer_than=seq, timeout=0.2))
+        self.assertEqual(self.screen_proxy.frame_seq, seq)
+        self.assertEqual(self.cap.threads, {pump.name})
+        # the pump is paused for the arguments it cannot serve
+        self.cap.blocked.clear()
+        self.assertIsInstance(self.screen_proxy.snapshot(projection=(10, 20)), ndarray)
+        self.assertIn(threading.current_thread().name, self.cap.threads)
+        self.assertTrue(pump.running)
+
+    def test_pump_interval(self):
+        self.cap.FRAME_PUMP_INTERVAL = 0.1
+        self.screen_proxy.start_frame_pump()
+        time.sleep(0.5)
+        self.screen_proxy.stop_frame_pump()
+        self.assertLessEqual(self.cap.count, 6)
+
+
+class TestAutoSetup(unittest.TestCase):
+    """auto_setup fallback order with fake screen methods, no device needed"""
+
+    def setUp(self):
+        from collections import OrderedDict
+        from unittest import mock
+        from airtest.core.android.cap_methods.base_cap import BaseCap
+        from airtest.core.error import ScreenError
+        self.tried = []
+        self.working = set()
+        test = self
+
+        def fake_cap(name):
+            class FakeCap(BaseCap):
+                def __init__(self, *args, **kwargs):
+                    super(FakeCap, self).__init__(*args, **kwargs)
+                    test.tried.append(name)
+
+                def get_frame_from_stream(self):
+                    if name not in test.working:
+                        raise ScreenError("%s is not available" % name)
+                    return b"frame"
+            return FakeCap
+
+        # same registration order as register_screen
+        methods = OrderedDict((name, fake_cap(name)) for name in ("RAWCAP", "ADBCAP", "JAVACAP", "MINICAP"))
+        patcher = mock.patch.object(ScreenProxy, "SCREEN_METHODS", methods)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fallback_order(self):
+        from airtest.core.error import ScreenError
+        self.working = {"ADBCAP"}
+        screen_proxy = ScreenProxy.auto_setup(None)
+        self.assertEqual(self.tried, ["MINICAP", "JAVACAP", "ADBCAP"])
+        self.assertEqual(screen_proxy.method_name, "FAKECAP")
+        # RAWCAP is never a fallback
+        self.tried, self.working = [], set()
+        with self.assertRaises(ScreenError):
+            ScreenProxy.auto_setup(None)
+        self.assertEqual(self.tried, ["MINICAP", "JAVACAP", "ADBCAP"])
+
+    def test_default_method(self):
+        self.working = {"RAWCAP"}
+        ScreenProxy.auto_setup(None, default_method="rawcap")
+        self.assertEqual(self.tried, ["RAWCAP"])
+        # the failed default method is not tried again
+        self.tried, self.working = [], {"ADBCAP"}
+        ScreenProxy.auto_setup(None, default_method="javacap")
+        self.assertEqual(self.tried, ["JAVACAP", "MINICAP", "ADBCAP"])
+
+
+# fake `adb shell sh`: writes the raw output for screencap, and the argument of echo
+FAKE_SHELL = """
+import sys
+for line in sys.stdin:
+    if line.startswith("screencap"):
+        sys.stdout.buffer.write(open(sys.argv[1], "rb").read())
+    sys.stdout.buffer.write(line.split("echo ")[-1].strip().strip("'").encode() + b"\\n")
+    sys.stdout.flush()
+"""
+# fake `adb exec-out screencap`
+FAKE_EXEC_OUT = "import sys; sys.stdout.buffer.write(open(sys.argv[1], 'rb').read())"
+
+
+class TestAdbCap(unittest.TestCase):
+    """ADBCAP/RAWCAP tests with a fake adb, no device needed"""
+
+    def setUp(self):
+        import struct
+        import sys
+        import subprocess
+        import tempfile
+        import cv2
+        import numpy as np
+        from airtest.core.android.adb import ADB
+
+        self.img = np.random.randint(0, 256, (40, 30, 3), dtype=np.uint8)
+        self.pixels = cv2.cvtColor(self.img, cv2.COLOR_BGR2RGBA).tobytes()
+        fd, self.raw_file = tempfile.mkstemp()
+        os.close(fd)
+        self.set_raw(struct.pack("<IIII", 30, 40, 1, 0) + self.pixels)
+        fd, self.png_file = tempfile.mkstemp()
+        os.close(fd)
+        with open(self.png_file, "wb") as f:
+            f.write(cv2.imencode(".png", self.img)[1].tobytes())
+        self.adb = ADB("fake", adb_path=sys.executable)
+        self.adb._sdk_version = 30
+        # the fake adb works as the adb executable
+        self.adb.NATIVE_CLIENT = False
+        self.cmds = []
+        self.procs = []
+
+        def start_cmd(cmds, device=True):
+            self.cmds.append(cmds)
+            script = FAKE_SHELL if cmds == ["shell", "sh"] else FAKE_EXEC_OUT
+            cmdline = cmds if isinstance(cmds, str) else " ".join(cmds)
+            output_file = self.png_file if cmdline.endswith(" -p") else self.raw_file
+            proc = subprocess.Popen([sys.executable, "-c", script, output_file],
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.procs.append(proc)
+            return proc
+        self.adb.start_cmd = start_cmd
+
+    def tearDown(self):
+        os.remove(self.raw_file)
+        os.remove(self.png_file)
+
+    def set_raw(self, raw):
+        self.raw = raw
+        with open(self.raw_file, "wb") as f:
+            f.write(raw)
+
+    def test_screencap_raw(self):
+        import numpy as np
+        # the buffer grows if it is too small
+        buffer, size = self.adb.screencap_raw(np.empty(100, dtype=np.uint8))
+        self.assertGreaterEqual(len(buffer), len(self.raw))
+        self.assertEqual(buffer[:size].tobytes(), self.raw)
+        # and is reused if it is large enough
+        self.assertIs(self.adb.screencap_raw(buffer)[0], buffer)
+
+    def test_screencap_shell(self):
+        import struct
+        from airtest.core.android.cap_methods.adbcap import ScreencapShell
+        shell = ScreencapShell(self.adb)
+        try:
+            buffer, size = shell.capture()
+            self.assertEqual(buffer[:size].tobytes(), self.raw)
+            # the session and the buffer are reused
+            self.assertIs(shell.capture(buffer)[0], buffer)
+            self.assertEqual(self.cmds, [["shell", "sh"]])
+            # the header without colorspace
+            self.set_raw(struct.pack("<III", 30, 40, 1) + self.pixels)
+            buffer, size = shell.capture(buffer)
+            self.assertEqual(buffer[:size].tobytes(), self.raw)
+            # restarted if the session is closed
+            shell.proc.kill()
+            shell.proc.wait()
+            buffer, size = shell.capture(buffer)
+            self.assertEqual(buffer[:size].tobytes(), self.raw)
+            self.assertEqual(len(self.cmds), 2)
+        finally:
+            shell.close()
+
+    def test_adbcap(self):
+        from airtest.aircv.frame import RawFrame
+        screen_proxy = ScreenProxy.auto_setup(self.adb, default_method="ADBCAP")
+        try:
+            self.assertEqual(screen_proxy.method_name, "ADBCAP")
+            self.assertTrue((screen_proxy.snapshot() == self.img).all())
+            frame = screen_proxy.snapshot_frame()
+            self.assertIsInstance(frame, RawFrame)
+            self.assertEqual(frame.resolution, (30, 40))
+            self.assertEqual([cmds for cmds in self.cmds if cmds == ["shell", "sh"]], [["shell", "sh"]])
+            # the public method returns png data, which can be kept
+            data = screen_proxy.get_frame_from_stream()
+            self.assertIsInstance(data, bytes)
+            self.assertTrue((string_2_img(data) == self.img).all())
+        finally:
+            screen_proxy.teardown_stream()
+
+    def test_adbcap_frame_pump(self):
+        screen_proxy = ScreenProxy.auto_setup(self.adb, default_method="ADBCAP")
+        try:
+            # check_frame of auto_setup uses `screencap -p`
+            del self.cmds[:]
+            screen_proxy.start_frame_pump()
+            self.assertTrue((screen_proxy.snapshot(timeout=5) == self.img).all())
+            # the pump reads the raw output over the shell session, no `screencap -p` process
+            self.assertEqual(self.cmds, [["shell", "sh"]])
+            data = screen_proxy.get_frame_from_stream()
+            self.assertTrue((string_2_img(data) == self.img).all())
+        finally:
+            screen_proxy.teardown_stream()
+
+    def test_rawcap(self):
+        screen_proxy = ScreenProxy.auto_setup(self.adb, default_method="RAWCAP")
+        try:
+            data = screen_proxy.get_frame_from_stream()
+            # a copy of the raw output, not overwritten by the next capture
+            self.assertIsInstance(data, bytes)
+            self.assertTrue((screen_proxy.snapshot(ensure_orientation=False) == self.img).all())
+            self.assertEqual(data, self.raw)
+        finally:
+            screen_proxy.teardown_stream()
+
+    def test_setup_failed(self):
+        from collections import OrderedDict
+        from unittest import mock
+        from airtest.core.android.cap_methods.adbcap import RawCap
+        from airtest.core.error import ScreenError
+        # screencap outputs nothing
+        self.set_raw(b"")
+        with mock.patch.object(ScreenProxy, "SCREEN_METHODS", OrderedDict([("RAWCAP", RawCap)])):
+            with self.assertRaises(ScreenError):
+                ScreenProxy.auto_setup(self.adb, default_method="RAWCAP")
+        # the shell session of the failed method is closed
+        self.assertEqual(self.cmds, [["shell", "sh"]])
+        self.assertIsNotNone(self.procs[0].poll())
+
+    def test_rawcap_exec_out(self):
+        from airtest.core.android.cap_methods.adbcap import RawCap
+        self.adb._sdk_version = 23
+        screen_proxy = ScreenProxy.auto_setup(self.adb, default_method="RAWCAP")
+        self.assertIsInstance(screen_proxy.screen_method, RawCap)
+        self.assertTrue((screen_proxy.snapshot(ensure_orientation=False) == self.img).all())
+        self.assertNotIn(["shell", "sh"], self.cmds)
+
+    def test_old_sdk(self):
+        from airtest.core.android.cap_methods.adbcap import RawCap
+        self.adb._sdk_version = 19
+        self.assertFalse(ScreenProxy.check_frame(RawCap(self.adb)))